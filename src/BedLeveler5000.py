@@ -3,15 +3,25 @@
 from Common import Common
 from Common.Points import NamedPoint3F
 from Common.CommonArgumentParser import CommonArgumentParser
+from Common.MeshCoordinatesCache import MeshCoordinatesCache
+from Common.MeshCoordinatesCache import defaultFile as defaultMeshCoordinatesCacheFile
+from Common.ThermalMonitor import Heater
+from Common.ThermalMonitor import ThermalMonitor
 from Widgets.BedLeveler5000.ManualWidget import ManualWidget
 from Widgets.BedLeveler5000.MeshWidget import MeshWidget
 from Common.PrinterInfo import ConnectionMode
+from Printers.CommandPrinter import CommandPrinter
+from Printers.CommandPrinter import ProbeOrder
 from Printers.Marlin2.Marlin2Printer import Marlin2Printer
 from Printers.Moonraker.MoonrakerPrinter import MoonrakerPrinter
+from Printers.Marlin2 import WireTap
+from Common import Tracer
+from Common import LogSink
 from Widgets.BedLeveler5000.TemperatureControlsWidget import TemperatureControlsWidget
 from Widgets.BedLeveler5000.StatusBar import StatusBar
 from Widgets.PrinterConnectWidget import PrinterConnectWidget
 from Dialogs.BedLeveler5000.CancellableStatusDialog import CancellableStatusDialog
+from Dialogs.BedLeveler5000.MetricsDialog import MetricsDialog
 from Dialogs.AboutDialog import AboutDialog
 from Dialogs.WarningDialog import WarningDialog
 from Dialogs.ErrorDialog import ErrorDialog
@@ -23,6 +33,7 @@ from PySide6 import QtWidgets
 from PySide6 import QtSerialPort
 import argparse
 from enum import StrEnum
+import functools
 import json
 import logging
 import pathlib
@@ -41,15 +52,17 @@ class MainWindow(QtWidgets.QMainWindow):
         INITIALIZING_MESH = 'Initializing mesh'
         CONNECTED = 'Connected'
         HOMING = 'Homing'
+        WAITING_FOR_TEMPERATURE = 'Waiting for temperature'
         MANUAL_PROBE = 'Manually probing point'
         UPDATING_MESH = 'Updating mesh'
 
     class Dialog(StrEnum):
         INITIALIZING = 'Initializing'
         HOMING = 'Homing'
+        TEMPERATURE = 'Temperature'
         PROBE = 'Probe'
 
-    def __init__(self, *args, printersDir, printer=None, host=None, port=None, noTemperatureReporting=False, **kwargs):
+    def __init__(self, *args, printersDir, printer=None, host=None, port=None, noTemperatureReporting=False, pipelineDepth=1, reliableTransport=False, serialThread=True, websocket=False, nativeMesh=False, meshCoordinatesCacheFile=None, probeSampleCount=None, probeMaxSampleCount=None, probeTolerance=None, probeClearance=None, preheatBedTemperature=None, preheatNozzleTemperature=None, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.setWindowTitle(QtCore.QCoreApplication.applicationName())
@@ -68,6 +81,24 @@ class MainWindow(QtWidgets.QMainWindow):
         self.meshCoordinates = None
         self.printerQtConnections = []
         self.noTemperatureReporting = noTemperatureReporting
+        self.pipelineDepth = pipelineDepth
+        self.reliableTransport = reliableTransport
+        self.serialThread = serialThread
+        self.websocket = websocket
+        self.nativeMesh = nativeMesh
+        self.meshCoordinatesCacheFile = meshCoordinatesCacheFile
+        self.probeSampleCount = probeSampleCount
+        self.probeMaxSampleCount = probeMaxSampleCount
+        self.probeTolerance = probeTolerance
+        self.probeClearance = probeClearance
+        self.preheatBedTemperature = preheatBedTemperature
+        self.preheatNozzleTemperature = preheatNozzleTemperature
+
+        # Probing waits for the temperatures to settle
+        self.thermalMonitor = ThermalMonitor(parent=self)
+        self.thermalMonitor.targetReached.connect(lambda heater, seconds: self.logger.info(f'{heater} reached its target temperature in {seconds:.0f} s'))
+        self.thermalMonitor.settled.connect(self._startPendingProbe)
+        self.pendingProbe = None
         self.printerConnectWidget.loadPrinters(printersDir, desiredPrinter=printer, desiredHost=host, desiredPort=port)
         self.updateState(self.State.DISCONNECTED)
 
@@ -127,7 +158,19 @@ class MainWindow(QtWidgets.QMainWindow):
         self.settingsMenu = QtWidgets.QMenu('Settings', self)
         self.menuBar().addMenu(self.settingsMenu)
 
+        self.debugMenu = QtWidgets.QMenu('Debug', self)
+        self.metricsAction = QtGui.QAction('Metrics', self)
+        self.metricsAction.setStatusTip('Show command latencies and counters')
+        self.metricsAction.triggered.connect(lambda : self.metricsDialog.show())
+        self.debugMenu.addAction(self.metricsAction)
+        self.menuBar().addMenu(self.debugMenu)
+
         self.helpMenu = QtWidgets.QMenu('Help', self)
+        self.saveRecentLogAction = QtGui.QAction('Save Recent Log...', self)
+        self.saveRecentLogAction.setStatusTip('Save the recent log to attach it to a bug report')
+        self.saveRecentLogAction.triggered.connect(self.saveRecentLog)
+        self.helpMenu.addAction(self.saveRecentLogAction)
+        self.helpMenu.addSeparator()
         self.aboutAction = QtGui.QAction('About', self)
         self.aboutAction.triggered.connect(lambda : AboutDialog(DESCRIPTION).exec())
         self.helpMenu.addAction(self.aboutAction)
@@ -142,10 +185,13 @@ class MainWindow(QtWidgets.QMainWindow):
     def __createDialogs(self):
         self.dialogs = {self.Dialog.INITIALIZING: CancellableStatusDialog(text='Initializing printer', parent=self),
                         self.Dialog.HOMING: CancellableStatusDialog(text='Homing', parent=self),
+                        self.Dialog.TEMPERATURE: CancellableStatusDialog(text='Waiting for temperatures to settle', parent=self),
                         self.Dialog.PROBE: CancellableStatusDialog(text='Manually probing (x, y)', parent=self)}
+        self.metricsDialog = MetricsDialog(parent=self)
 
         self.dialogs[self.Dialog.INITIALIZING].rejected.connect(self.disconnectFromPrinter)
         self.dialogs[self.Dialog.HOMING].rejected.connect(self._cancel)
+        self.dialogs[self.Dialog.TEMPERATURE].rejected.connect(self._cancel)
         self.dialogs[self.Dialog.PROBE].rejected.connect(self._cancel)
 
     def __createTimers(self):
@@ -154,6 +200,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.temperatureTimer.setInterval(1000) # TODO: Make the interval configurable
         self.temperatureTimer.timeout.connect(self.getTemperatures)
 
+        # Time since the printer last reported its temperatures on its own,
+        # polling only resumes once the reports stop
+        self.temperatureReportTimer = QtCore.QElapsedTimer()
+
     def _createId(self, base):
         self.currentId += 1
         return f'{base}-{self.currentId}'
@@ -164,10 +214,20 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Create the printer and determine open arguments
         if self.printerConnectWidget.connectionMode() == ConnectionMode.MARLIN_2:
-            self.printer = Marlin2Printer(self.printerConnectWidget.printerInfo(), parent=self)
+            meshCoordinatesCache = None
+            if self.meshCoordinatesCacheFile is not None:
+                meshCoordinatesCache = MeshCoordinatesCache(self.meshCoordinatesCacheFile,
+                                                            self.printerConnectWidget.printerPath(),
+                                                            self.printerConnectWidget.port())
+            self.printer = Marlin2Printer(self.printerConnectWidget.printerInfo(),
+                                          pipelineDepth=self.pipelineDepth,
+                                          reliable=self.reliableTransport,
+                                          meshCoordinatesCache=meshCoordinatesCache,
+                                          threaded=self.serialThread,
+                                          parent=self)
             kwargs = {'port': self.printerConnectWidget.port()}
         elif self.printerConnectWidget.connectionMode() == ConnectionMode.MOONRAKER:
-            self.printer = MoonrakerPrinter(self.printerConnectWidget.printerInfo(), parent=self)
+            self.printer = MoonrakerPrinter(self.printerConnectWidget.printerInfo(), websocket=self.websocket, nativeMesh=self.nativeMesh, parent=self)
             kwargs = {'host': self.printerConnectWidget.host()}
         else:
             raise RuntimeError('Invalid connection mode')
@@ -178,7 +238,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.printerQtConnections.append(self.printer.homed.connect(self._finishHoming))
         self.printerQtConnections.append(self.printer.gotTemperatures.connect(self.updateTemperatures))
         self.printerQtConnections.append(self.printer.gotMeshCoordinates.connect(self._initializeMesh))
-        self.printerQtConnections.append(self.printer.probed.connect(self._processProbe))
+        self.printerQtConnections.append(self.printer.probedPoint.connect(self._processProbe))
+        self.printerQtConnections.append(self.printer.probedMany.connect(self._finishProbing))
+        self.printerQtConnections.append(self.printer.probedMesh.connect(self._processMesh))
 
         # Open the printer
         self.printer.open(**kwargs)
@@ -187,12 +249,24 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Set the temperature controls to off
         self.temperatureControlsWidget.resetButtons()
+        self.thermalMonitor.clear()
 
         # Start the temperature timer
         self.temperatureJobPending = False
+        self.temperatureReportTimer.invalidate()
         if not self.noTemperatureReporting:
             self.temperatureTimer.start()
 
+        self.printer.setProbeClearance(self.probeClearance)
+
+        # Preheat while homing and initializing
+        if self.preheatBedTemperature is not None:
+            self.temperatureControlsWidget.setBedTemperature(self.preheatBedTemperature)
+            self.setBedTemperature(True, self.preheatBedTemperature)
+        if self.preheatNozzleTemperature is not None:
+            self.temperatureControlsWidget.setNozzleTemperature(self.preheatNozzleTemperature)
+            self.setNozzleTemperature(True, self.preheatNozzleTemperature)
+
         # Initialize the printer
         self.updateState(self.State.INITIALIZING)
         self.printer.init(self._createId('init'))
@@ -204,6 +278,7 @@ class MainWindow(QtWidgets.QMainWindow):
         # Stop the temperature timer
         self.temperatureJobPending = False
         self.temperatureTimer.stop()
+        self.pendingProbe = None
 
         # Close the printer
         self.printerConnectWidget.setDisconnected()
@@ -251,16 +326,62 @@ class MainWindow(QtWidgets.QMainWindow):
         self.statusBar().setState(self.state)
 
     def getTemperatures(self):
+        if self.temperatureReportTimer.isValid() and \
+           self.temperatureReportTimer.elapsed() < 2.5 * self.temperatureTimer.interval():
+            return
+
         if not self.temperatureJobPending:
             self.temperatureJobPending = True
             self.printer.getTemperatures(self._createId('getTemperatures'))
 
     def updateTemperatures(self, id_, context, result):
-        self.temperatureJobPending = False
+        if id_ == CommandPrinter.TEMPERATURE_AUTO_REPORT_ID:
+            self.temperatureReportTimer.start()
+        else:
+            self.temperatureJobPending = False
+
         self.statusBar().setBedTemp(actual=result.bedActual, desired=result.bedDesired, power=result.bedPower)
         self.statusBar().setNozzleTemp(actual=result.toolActual, desired=result.toolDesired, power=result.toolPower)
+        self.thermalMonitor.update(result)
+
+        if self.pendingProbe is not None:
+            self.dialogs[self.Dialog.TEMPERATURE].setText(f'Waiting for temperatures to settle ({self.thermalMonitor.describe()})')
+
+    def _startPendingProbe(self):
+        if self.pendingProbe is not None:
+            pendingProbe = self.pendingProbe
+            self.pendingProbe = None
+            self.dialogs[self.Dialog.TEMPERATURE].accept()
+            pendingProbe()
+
+    def _waitForStableTemperatures(self, probe):
+        """ Returns True if probe will be called once the temperatures are
+            stable, False if it can be called now. """
+
+        if self.noTemperatureReporting or self.thermalMonitor.stable():
+            return False
+
+        self.pendingProbe = probe
+        self.dialogs[self.Dialog.TEMPERATURE].setText(f'Waiting for temperatures to settle ({self.thermalMonitor.describe()})')
+        self.updateState(self.State.WAITING_FOR_TEMPERATURE)
+        self.dialogs[self.Dialog.TEMPERATURE].show()
+        return True
 
     def _processInitResults(self, id_, context):
+        # Init restores the printer's default probe settings
+        if self.probeSampleCount is not None:
+            self.printer.setProbeSampleCount(self.probeSampleCount)
+        try:
+            self.printer.setProbeAdaptiveSampling(self.probeMaxSampleCount, self.probeTolerance)
+        except ValueError as exception:
+            self.printer.setProbeAdaptiveSampling(None, None)
+            self._warning(f'Adaptive probe sampling disabled: {exception}')
+
+        # Prefer temperatures reported by the printer over polling for them
+        if not self.noTemperatureReporting and \
+           self.printer.startTemperatureAutoReport(self.temperatureTimer.interval() / 1000):
+            self.logger.info('Using temperature auto reporting')
+
         for point in self.printerInfo.manualProbePoints:
             if not self.printer.isProbeable(x=point.x, y=point.y):
                 probeBounds = self.printer.probeBounds()
@@ -293,6 +414,12 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.meshWidget.resizeMesh(result.rowCount,
                                    result.columnCount)
+
+        # Show the printer's current mesh until it is probed again
+        if result.storedMesh is not None:
+            self.meshWidget.setMesh(result.storedMesh)
+            if self.printer.probeClearancePlanner() is not None:
+                self.printer.probeClearancePlanner().addMesh(self.meshCoordinates, result.storedMesh)
         self.updateState(self.State.CONNECTED)
         self.dialogs[self.Dialog.INITIALIZING].accept()
 
@@ -310,81 +437,120 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def manualProbe(self, command, pointList):
         assert(len(pointList) > 0)
+        if self._waitForStableTemperatures(functools.partial(self.manualProbe, command, pointList)):
+            return
+
+        order = self.printer.resolveProbeOrder(pointList, ProbeOrder.SHORTEST)
         context={'type': self.State.MANUAL_PROBE,
                  'command': command,
                  'pointList': pointList,
-                 'resultList': []}
+                 'order': order,
+                 'probedCount': 0}
 
-        point = pointList[0]
-        self.printer.probe(self._createId(f'probe_{point.x}_{point.y}'), context=context, x=point.x, y=point.y)
+        point = pointList[order[0]]
+        self.printer.probeMany(self._createId('manualProbe'), context=context, points=pointList, order=order)
         self.dialogs[self.Dialog.PROBE].setText(f'Manually probing at ({point.x}, {point.y})')
         self.updateState(self.State.MANUAL_PROBE)
         self.dialogs[self.Dialog.PROBE].show()
 
-    def updateMesh(self, row=0, column=0):
-        if row == 0 and column == 0:
-            self.meshWidget.clear()
+    def updateMesh(self):
+        if self._waitForStableTemperatures(self.updateMesh):
+            return
 
-        coordinate = self.meshCoordinates[row][column]
-        self.printer.probe(self._createId('updateMesh'),
-                           context = {'type': self.State.UPDATING_MESH,
-                                      'row': row,
-                                      'column': column},
-                           x=coordinate.x,
-                           y=coordinate.y)
+        self.meshWidget.clear()
+
+        if self.printer.hasNativeMeshProbing():
+            self.printer.probeMesh(self._createId('updateMesh'), context={'type': self.State.UPDATING_MESH})
+            self.updateState(self.State.UPDATING_MESH)
+            self.dialogs[self.Dialog.PROBE].setText('Probing mesh using the printer\'s mesh calibration')
+            self.dialogs[self.Dialog.PROBE].show()
+            return
+
+        # Plan the probing order to minimize travel
+        columnCount = len(self.meshCoordinates[0])
+        points = [coordinate for row in self.meshCoordinates for coordinate in row]
+        order = self.printer.resolveProbeOrder(points, ProbeOrder.SHORTEST)
+
+        context = {'type': self.State.UPDATING_MESH,
+                   'columnCount': columnCount,
+                   'order': order,
+                   'probedCount': 0}
+        self.printer.probeMany(self._createId('updateMesh'), context=context, points=points, order=order)
 
         self.updateState(self.State.UPDATING_MESH)
-        self.dialogs[self.Dialog.PROBE].setText(f'Probing mesh at row: {row}, column: {column} (x: {coordinate.x:.3f}, y: {coordinate.y:.3f})')
+        self._setMeshProbeText(context)
         self.dialogs[self.Dialog.PROBE].show()
 
-    def _processProbe(self, id_, context, response):
+    def _setMeshProbeText(self, context):
+        row, column = divmod(context['order'][context['probedCount']], context['columnCount'])
+        coordinate = self.meshCoordinates[row][column]
+        self.dialogs[self.Dialog.PROBE].setText(f'Probing mesh at row: {row}, column: {column} (x: {coordinate.x:.3f}, y: {coordinate.y:.3f})')
+
+    def _processProbe(self, id_, context, index, response):
         if 'type' not in context:
             self._error('Detected a printer response mismatch.')
-        elif context['type'] == self.State.MANUAL_PROBE:
-            assert(self.state == self.State.MANUAL_PROBE)
+            return
+
+        context['probedCount'] += 1
+        self.logger.debug('Probed (%s, %s): %s from %s sample(s), spread: %s', response.x, response.y, response.z, response.sampleCount, response.spread)
 
-            # Move the current point from the point list to the result list
-            point = context['pointList'].pop(0)
-            context['resultList'].append(NamedPoint3F(point.name, response.x, response.y, response.z))
+        if context['type'] == self.State.MANUAL_PROBE:
+            assert(self.state == self.State.MANUAL_PROBE)
 
-            if len(context['pointList']) > 0:
-                point = context['pointList'][0]
-                self.printer.probe(self._createId(f'probe_{point.x}_{point.y}'), context=context, x=point.x, y=point.y)
+            if context['probedCount'] < len(context['pointList']):
+                point = context['pointList'][context['order'][context['probedCount']]]
                 self.dialogs[self.Dialog.PROBE].setText(f'Manually probing at ({point.x}, {point.y})')
-            else:
-                self.manualWidget.reportProbe(context['command'], context['resultList'])
-                self.dialogs[self.Dialog.PROBE].accept()
-                self.updateState(self.State.CONNECTED)
         else:
             assert(context['type'] == self.State.UPDATING_MESH and self.state == self.State.UPDATING_MESH)
-            row = context['row']
-            column = context['column']
+            row, column = divmod(index, context['columnCount'])
 
             self.meshWidget.setPoint(row=row,
                                      column=column,
                                      z=response.z)
 
-            if row % 2 == 0:
-                column += 1
-                if column >= len(self.meshCoordinates[0]):
-                    column = len(self.meshCoordinates[0]) - 1
-                    row += 1
-            else:
-                column -= 1
-                if column < 0:
-                    column = 0
-                    row += 1
-
-            if row >= len(self.meshCoordinates):
-                self.dialogs[self.Dialog.PROBE].accept()
-                self.updateState(self.State.CONNECTED)
-            else:
-                self.updateMesh(row, column)
+            if context['probedCount'] < len(context['order']):
+                self._setMeshProbeText(context)
+
+    def _processMesh(self, id_, context, result):
+        if context.get('type') != self.State.UPDATING_MESH:
+            self._error('Detected a printer response mismatch.')
+            return
+
+        assert(self.state == self.State.UPDATING_MESH)
+
+        if result.rowCount != len(self.meshCoordinates) or result.columnCount != len(self.meshCoordinates[0]):
+            self._error(f'Probed mesh size ({result.rowCount} x {result.columnCount}) does not match the expected mesh size ' \
+                        f'({len(self.meshCoordinates)} x {len(self.meshCoordinates[0])}).')
+            return
+
+        self.meshWidget.setMesh(result.z)
+        self.dialogs[self.Dialog.PROBE].accept()
+        self.updateState(self.State.CONNECTED)
+
+    def _finishProbing(self, id_, context, results):
+        if 'type' not in context:
+            self._error('Detected a printer response mismatch.')
+            return
+
+        if context['type'] == self.State.MANUAL_PROBE:
+            resultList = [NamedPoint3F(point.name, result.x, result.y, result.z) for point, result in zip(context['pointList'], results)]
+            self.manualWidget.reportProbe(context['command'], resultList)
+
+        clearancePlanner = self.printer.probeClearancePlanner()
+        if clearancePlanner is not None:
+            metrics = clearancePlanner.metrics()
+            self.logger.info(f'Probe Z travel this session: {metrics.zTravel:.1f} mm instead of {metrics.fullZTravel:.1f} mm ' \
+                             f'over {metrics.moveCount} moves ({metrics.saved():.1f} mm saved)')
+
+        self.dialogs[self.Dialog.PROBE].accept()
+        self.updateState(self.State.CONNECTED)
 
     def setBedTemperature(self, state, temp):
+        self.thermalMonitor.setTarget(Heater.BED, temp if state else 0.0)
         self.printer.setBedTemperature(self._createId('setBedTemperature'), temperature=temp if state else 0)
 
     def setNozzleTemperature(self, state, temp):
+        self.thermalMonitor.setTarget(Heater.NOZZLE, temp if state else 0.0)
         self.printer.setNozzleTemperature(self._createId('setNozzleTemperature'), temperature=temp if state else 0)
 
     def _cancel(self):
@@ -395,12 +561,31 @@ class MainWindow(QtWidgets.QMainWindow):
             dialog.reject()
             dialog.blockSignals(False)
 
+        self.pendingProbe = None
         self.printer.abort()
         self.updateState(self.State.CONNECTED)
 
     def reportPrinterError(self, type_, id_, context, message):
         self._error(message)
 
+    def saveRecentLog(self):
+        sink = LogSink.defaultSink()
+        if sink is None or sink.ring is None:
+            self._warning('The recent log is disabled, restart with --recent-log-minutes greater than 0.')
+            return
+
+        filePath, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Save recent log', 'recent-log.txt', 'Log (*.txt)')
+        if not filePath:
+            return
+
+        try:
+            lineCount = sink.saveRecent(filePath)
+        except OSError as exception:
+            self.logger.error('Failed to save the recent log: %s', exception)
+            ErrorDialog(self, f'Failed to save the recent log: {exception}')
+            return
+        self.statusBar().showMessage(f'Saved {lineCount} log lines to {filePath}', 5000)
+
     def _fatalError(self, message):
         self.logger.critical(message)
         self.disconnectFromPrinter()
@@ -440,10 +625,27 @@ if __name__ == '__main__':
     # Parse command line arguments
     parser = CommonArgumentParser(description=DESCRIPTION)
     parser.add_argument('--no-temperature-reporting', action='store_true', help='disable temperature reporting')
+    parser.add_argument('--preheat-bed', type=float, help='bed temperature set when connecting, before homing')
+    parser.add_argument('--preheat-nozzle', type=float, help='nozzle temperature set when connecting, before homing')
+    parser.add_argument('--pipeline-depth', default=1, type=int, help='maximum number of in-flight Marlin 2 commands (requires ADVANCED_OK)')
+    parser.add_argument('--reliable-transport', action='store_true', help='send Marlin 2 commands with line numbers and checksums, resending corrupted lines')
+    parser.add_argument('--no-serial-thread', action='store_true', help='run Marlin 2 serial I/O and response parsing on the GUI thread')
+    parser.add_argument('--websocket', action='store_true', help='talk to Moonraker printers over a persistent WebSocket instead of HTTP requests')
+    parser.add_argument('--mesh-cache', type=pathlib.Path, help='file caching the measured mesh coordinates of Marlin 2 printers (default: in the user cache directory)')
+    parser.add_argument('--no-mesh-cache', action='store_true', help='measure the mesh coordinates of Marlin 2 printers on every connect')
+    parser.add_argument('--probe-samples', type=int, help='number of samples taken per probed point, the minimum with --probe-tolerance')
+    parser.add_argument('--probe-max-samples', default=5, type=int, help='maximum number of samples taken per probed point with --probe-tolerance (default: %(default)s)')
+    parser.add_argument('--probe-tolerance', type=float, help='stop sampling a Marlin 2 probe point once the standard error of its mean is within this many millimeters')
+    parser.add_argument('--probe-clearance', type=float, help='travel between probe points this many millimeters above the highest known nearby bed height instead of at the full probe height')
+    parser.add_argument('--native-mesh', action='store_true', help='probe the mesh of Moonraker printers with BED_MESH_CALIBRATE instead of point by point')
     args = parser.parse_args()
+    if args.probe_tolerance is not None and args.probe_samples is not None and args.probe_max_samples < args.probe_samples:
+        parser.error('argument --probe-max-samples: must be at least --probe-samples')
 
     # Configure logging
-    Common.configureLogging(level=args.log_level, console=args.log_console, file=args.log_file)
+    Common.configureLogging(**parser.loggingOptions(args))
+    WireTap.configure(file=args.wire_capture, ringSize=args.wire_capture_ring)
+    Tracer.configure(file=args.trace)
     logging.getLogger(QtCore.QCoreApplication.applicationName()).info(f'Starting {app.applicationName()}')
 
     # Verify the printers directory exists
@@ -455,7 +657,19 @@ if __name__ == '__main__':
                                 printer=args.printer,
                                 host=args.host,
                                 port=args.port,
-                                noTemperatureReporting=args.no_temperature_reporting)
+                                noTemperatureReporting=args.no_temperature_reporting,
+                                pipelineDepth=max(1, args.pipeline_depth),
+                                reliableTransport=args.reliable_transport,
+                                serialThread=not args.no_serial_thread,
+                                websocket=args.websocket,
+                                nativeMesh=args.native_mesh,
+                                probeSampleCount=None if args.probe_samples is None else max(1, args.probe_samples),
+                                probeMaxSampleCount=max(1, args.probe_max_samples),
+                                probeTolerance=args.probe_tolerance,
+                                probeClearance=args.probe_clearance,
+                                preheatBedTemperature=args.preheat_bed,
+                                preheatNozzleTemperature=args.preheat_nozzle,
+                                meshCoordinatesCacheFile=None if args.no_mesh_cache else (args.mesh_cache or defaultMeshCoordinatesCacheFile()))
         mainWindow.show()
         sys.exit(app.exec())
     except KeyboardInterrupt:
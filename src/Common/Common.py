@@ -1,3 +1,4 @@
+from . import LogSink
 import logging
 import pathlib
 import sys
@@ -29,29 +30,65 @@ def toArgumentString(args, kwargs):
 
     return arguments
 
-def configureLogging(level=None, console=False, file=None):
+def parseLevel(level):
+    """ Returns the numeric value of a level name, 'all' and 'none' included. """
+
+    if isinstance(level, int):
+        return level
+
+    upper = level.upper()
+    if upper == 'ALL':
+        return LOG_ALL
+    elif upper == 'NONE':
+        return LOG_NONE
+
+    value = logging.getLevelName(upper)
+    if not isinstance(value, int):
+        raise ValueError(f'Unknown logging level: {level}')
+    return value
+
+def configureLogging(level=None, console=False, file=None, *, levels=None, maxBytes=0, interval=None,
+                     backupCount=5, compression=None, ringSeconds=None, ringLevel=logging.WARNING):
+    """ Logs through a background writer thread (see LogSink), so logging
+        never waits for the console or the disk. levels maps logger names to
+        levels overriding level. The log file is rotated after maxBytes or
+        interval seconds. With ringSeconds, records of at least ringLevel
+        are kept in memory for that long, whatever level is, so the recent
+        log can be saved for a bug report. The loggers emit records down
+        to the lower of level and ringLevel, so a low ringLevel slows down
+        every logging call at that level. """
+
     LOGGING_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
-    if level is None:
-        logLevelValue = LOG_NONE
-    elif isinstance(level, int):
-        logLevelValue = level
-    else:
-        if level.upper() == 'ALL':
-            logLevelValue = LOG_ALL
-        else:
-            logLevelValue = getattr(logging, level.upper())
-
-    logger = logging.getLogger()
-    logger.setLevel(logLevelValue)
+    logLevelValue = LOG_NONE if level is None else parseLevel(level)
+    levels = {name: parseLevel(value) for name, value in (levels or {}).items()}
+    ringLevelValue = LOG_NONE if ringSeconds is None else parseLevel(ringLevel)
+
+    # The loggers emit what any handler needs, the handlers filter by level
+    logging.getLogger().setLevel(min(logLevelValue, ringLevelValue))
+    for name, value in levels.items():
+        logging.getLogger(name).setLevel(min(value, ringLevelValue))
+
     formatter = logging.Formatter(LOGGING_FORMAT)
+    thresholdFilter = LogSink.ThresholdFilter(logLevelValue, levels)
+    handlers = []
 
-    consoleHandler = logging.StreamHandler()
-    consoleHandler.setLevel(logLevelValue if console else LOG_NONE)
-    consoleHandler.setFormatter(formatter)
-    logger.addHandler(consoleHandler)
+    if console:
+        consoleHandler = logging.StreamHandler()
+        handlers.append(consoleHandler)
 
     if file is not None:
-        fileHandler = logging.FileHandler(file)
-        fileHandler.setFormatter(formatter)
-        logger.addHandler(fileHandler)
\ No newline at end of file
+        fileHandler = LogSink.RotatingFileHandler(file, maxBytes=maxBytes, interval=interval,
+                                                  backupCount=backupCount, compression=compression)
+        handlers.append(fileHandler)
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(thresholdFilter)
+
+    ring = None
+    if ringSeconds is not None:
+        ring = LogSink.SessionRing(ringSeconds, level=ringLevelValue)
+        ring.setFormatter(formatter)
+
+    LogSink.configure(handlers, ring=ring)
\ No newline at end of file
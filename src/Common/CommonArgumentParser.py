@@ -1,4 +1,6 @@
 from Common import Common
+from Common import Log
+from Common import LogSink
 
 from PySide6 import QtCore
 from PySide6 import QtGui
@@ -13,6 +15,7 @@ import os
 class CommonArgumentParser(argparse.ArgumentParser):
     def __init__(self, *args, addPrinters=True, **kwargs):
         super().__init__(*args, **kwargs)
+        self.addPrinters = addPrinters
         self.showDialog = platform.system() == 'Windows'
         self.errorColumnCount = 40
         self.helpColumnCount = 80
@@ -21,6 +24,14 @@ class CommonArgumentParser(argparse.ArgumentParser):
         self.add_argument('--log-level', choices=['all', 'debug', 'info', 'warning', 'error', 'critical'], default=None, help='logging level')
         self.add_argument('--log-console', action='store_true', help='log to the console')
         self.add_argument('--log-file', type=pathlib.Path, default=None, help='log file')
+        self.add_argument('--log-levels', type=self._logLevels, default=None, metavar='NAME=LEVEL[,...]',
+                          help=f'logging levels of subsystems ({", ".join(Log.SUBSYSTEMS)}) or loggers, overriding --log-level')
+        self.add_argument('--log-max-size', type=int, default=10000000, metavar='BYTES', help='rotate the log file once it reaches BYTES, 0 to never rotate by size (default: %(default)s)')
+        self.add_argument('--log-rotate-interval', type=float, default=None, metavar='SECONDS', help='also rotate the log file every SECONDS')
+        self.add_argument('--log-backups', type=int, default=5, help='number of rotated log files kept (default: %(default)s)')
+        self.add_argument('--log-compression', choices=LogSink.COMPRESSIONS, default='gzip', help='compression of rotated log files (default: %(default)s)')
+        self.add_argument('--recent-log-minutes', type=float, default=10, metavar='MINUTES', help='minutes of recent log kept in memory for bug reports, 0 to disable (default: %(default)s)')
+        self.add_argument('--recent-log-level', choices=['all', 'debug', 'info', 'warning', 'error', 'critical'], default='warning', help='logging level of the recent log, levels below --log-level slow down logging (default: %(default)s)')
 
         if addPrinters:
             self.add_argument('--printers-dir', default=Common.printersDir(), type=pathlib.Path, help='printer information directory')
@@ -30,6 +41,42 @@ class CommonArgumentParser(argparse.ArgumentParser):
             printerSpecificGroup.add_argument('--port', default=None, help='port to use for Marlin2 connection')
             printerSpecificGroup.add_argument('--host', default=None, help='host to use for Moonraker connection')
 
+            self.add_argument('--wire-capture', type=pathlib.Path, default=None, help='capture raw serial traffic to a file')
+            self.add_argument('--wire-capture-ring', type=int, default=None, metavar='BYTES', help='only keep the last BYTES of the wire capture, written on exit')
+            self.add_argument('--trace', type=pathlib.Path, default=None, help='record machine states, G-code commands and serial lines to a Chrome trace file, written on exit')
+
+    def parse_args(self, *args, **kwargs):
+        args = super().parse_args(*args, **kwargs)
+
+        if self.addPrinters and args.wire_capture_ring is not None and args.wire_capture is None:
+            self.error('argument --wire-capture-ring: requires --wire-capture')
+
+        return args
+
+    def loggingOptions(self, args):
+        """ Returns the Common.configureLogging arguments of the parsed args. """
+
+        if not LogSink.compressionAvailable(args.log_compression):
+            self.error(f'{args.log_compression} compression requires the zstandard package')
+
+        return {'level': args.log_level,
+                'console': args.log_console,
+                'file': args.log_file,
+                'levels': args.log_levels,
+                'maxBytes': max(0, args.log_max_size),
+                'interval': args.log_rotate_interval,
+                'backupCount': max(0, args.log_backups),
+                'compression': args.log_compression,
+                'ringSeconds': args.recent_log_minutes * 60 if args.recent_log_minutes > 0 else None,
+                'ringLevel': args.recent_log_level}
+
+    @staticmethod
+    def _logLevels(text):
+        try:
+            return Log.parseLevels(text)
+        except ValueError as exception:
+            raise argparse.ArgumentTypeError(str(exception))
+
     def _showMessage(self, message, errorCode=0):
         # Create the messagebox
         icon = QtWidgets.QMessageBox.Icon.Information if errorCode == 0 else QtWidgets.QMessageBox.Icon.Critical
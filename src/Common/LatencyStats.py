@@ -0,0 +1,23 @@
+class LatencyStats:
+    """ Running count, mean and maximum of latencies in seconds. """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def mean(self):
+        return None if self.count == 0 else self.total / self.count
+
+    def __str__(self):
+        if self.count == 0:
+            return 'no samples'
+        return f'{self.count} samples, mean {self.mean() * 1000:.2f} ms, max {self.maximum * 1000:.2f} ms'
\ No newline at end of file
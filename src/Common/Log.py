@@ -0,0 +1,53 @@
+from .Common import parseLevel
+import logging
+
+# Short names of the main subsystems accepted by setLevels
+SUBSYSTEMS = {'printers': 'Printers',
+              'marlin2': 'Printers.Marlin2',
+              'moonraker': 'Printers.Moonraker',
+              'common': 'Common',
+              'widgets': 'Widgets',
+              'dialogs': 'Dialogs'}
+
+_loggers = {} # class or name: logging.Logger
+
+def qualifiedName(module, name):
+    """ Returns the logger name of a class in a module. Modules are named
+        after their main class, so its loggers are named after the module
+        and its other classes are children of it, e.g. Printers.Marlin2 ->
+        Printers.Marlin2.Marlin2Printer -> Printers.Marlin2.Marlin2Printer.InitMachine. """
+
+    if module == '__main__' or len(module) == 0:
+        return name
+    elif module.rpartition('.')[2] == name:
+        return module
+    return f'{module}.{name}'
+
+def getLogger(owner):
+    """ Returns the cached logger of a class, an instance or a logger name. """
+
+    key = owner if isinstance(owner, (str, type)) else type(owner)
+    logger = _loggers.get(key)
+    if logger is None:
+        name = key if isinstance(key, str) else qualifiedName(key.__module__, key.__name__)
+        logger = _loggers[key] = logging.getLogger(name)
+    return logger
+
+def parseLevels(text):
+    """ Parses comma separated NAME=LEVEL pairs, where NAME is a subsystem
+        (see SUBSYSTEMS) or a logger name. """
+
+    levels = {}
+    for item in text.split(','):
+        name, equals, level = item.partition('=')
+        if len(name.strip()) == 0 or len(equals) == 0:
+            raise ValueError(f'Expected NAME=LEVEL instead of: {item}')
+        levels[SUBSYSTEMS.get(name.strip().lower(), name.strip())] = parseLevel(level.strip())
+    return levels
+
+def setLevels(levels):
+    """ Sets the level of each logger name in levels, these override the
+        root level for the logger and its children. """
+
+    for name, level in (levels or {}).items():
+        logging.getLogger(name).setLevel(parseLevel(level))
\ No newline at end of file
@@ -0,0 +1,237 @@
+import atexit
+import collections
+import enum
+import gzip
+import logging
+import logging.handlers
+import os
+import pathlib
+import queue
+import shutil
+import threading
+import time
+
+try:
+    from compression import zstd # Python 3.14+
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+COMPRESSIONS = ['none', 'gzip', 'zstd']
+
+def compressionAvailable(compression):
+    return compression in ('none', 'gzip') or (compression == 'zstd' and zstd is not None)
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """ Rotates the log file once it reaches maxBytes or after interval
+        seconds, keeping backupCount older segments (log.txt.1 is the
+        newest). Rotated segments are compressed with gzip or zstd when
+        compression is set. """
+
+    SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, filename, *, maxBytes=0, interval=None, backupCount=5, compression=None, encoding='utf-8'):
+        if compression == 'none':
+            compression = None
+        if compression is not None and not compressionAvailable(compression):
+            raise ValueError(f'{compression} compression is not available, install the zstandard package.')
+
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)
+
+        self.interval = interval
+        self.compression = compression
+        self.rolloverAt = None if interval is None else time.time() + interval
+        if compression is not None:
+            self.namer = self._compressedName
+            self.rotator = self._compress
+
+    def _compressedName(self, name):
+        return name + self.SUFFIXES[self.compression]
+
+    def _compress(self, source, destination):
+        if not os.path.exists(source):
+            return
+
+        if self.compression == 'gzip':
+            with open(source, 'rb') as input_, gzip.open(destination, 'wb') as output:
+                shutil.copyfileobj(input_, output)
+        else:
+            with open(source, 'rb') as input_:
+                data = input_.read()
+            with open(destination, 'wb') as output:
+                output.write(zstd.compress(data) if hasattr(zstd, 'compress') else zstd.ZstdCompressor().compress(data))
+        os.remove(source)
+
+    def shouldRollover(self, record):
+        if self.rolloverAt is not None and time.time() >= self.rolloverAt:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.interval is not None:
+            self.rolloverAt = time.time() + self.interval
+
+class SessionRing(logging.Handler):
+    """ Keeps the formatted records of the last seconds of the session in
+        memory, limited to maxRecords, so they can be saved on request. """
+
+    def __init__(self, seconds, *, maxRecords=100000, level=logging.NOTSET):
+        super().__init__(level)
+
+        assert(seconds > 0)
+
+        self.seconds = seconds
+        self._records = collections.deque(maxlen=maxRecords) # (created, text)
+
+    def emit(self, record):
+        try:
+            text = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        with self.lock:
+            self._records.append((record.created, text))
+            self._prune(record.created)
+
+    def _prune(self, now):
+        while len(self._records) > 0 and self._records[0][0] < now - self.seconds:
+            self._records.popleft()
+
+    def lines(self, seconds=None):
+        """ Returns the lines of the last seconds, by default all kept lines. """
+
+        now = time.time()
+        with self.lock:
+            self._prune(now)
+            startTime = now - (self.seconds if seconds is None else seconds)
+            return [text for created, text in self._records if created >= startTime]
+
+    def save(self, path, seconds=None):
+        lines = self.lines(seconds)
+        pathlib.Path(path).write_text(''.join(line + '\n' for line in lines), encoding='utf-8')
+        return len(lines)
+
+class ThresholdFilter(logging.Filter):
+    """ Drops records below the level configured for their logger or its
+        closest configured parent. Lets a handler keep the configured levels
+        while the loggers emit lower levels for the session ring. """
+
+    def __init__(self, level, levels=None):
+        super().__init__()
+
+        self.levels = {'': level, **(levels or {})}
+        self._cache = {} # logger name: level
+
+    def threshold(self, name):
+        level = self._cache.get(name)
+        if level is None:
+            parent = name
+            while parent not in self.levels:
+                parent = parent.rpartition('.')[0]
+            level = self._cache[name] = self.levels[parent]
+        return level
+
+    def filter(self, record):
+        return record.levelno >= self.threshold(record.name)
+
+# Logged arguments of these types are converted to text on the listener thread
+IMMUTABLE_TYPES = (str, bytes, int, float, complex, bool, type(None), enum.Enum)
+
+def _isImmutable(value):
+    if isinstance(value, tuple):
+        return all(_isImmutable(item) for item in value)
+    return isinstance(value, IMMUTABLE_TYPES)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Unlike the stock QueueHandler, messages are only formatted here
+        # when the message, an argument or the mapping of named arguments
+        # may change before the listener formats it
+        if not isinstance(record.msg, str) or \
+           (record.args and (isinstance(record.args, dict) or not all(_isImmutable(arg) for arg in record.args))):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+class _QueueListener(logging.handlers.QueueListener):
+    def handle(self, record):
+        # Flush markers of LogSink.flush are completed instead of written
+        flushed = getattr(record, 'flushed', None)
+        if flushed is not None:
+            flushed.set()
+        else:
+            super().handle(record)
+
+class LogSink:
+    """ Non-blocking log pipeline. Loggers only put records on a queue,
+        a background thread formats them and writes them to the handlers. """
+
+    def __init__(self, handlers, *, ring=None):
+        self.ring = ring
+        self.handlers = list(handlers) + ([] if ring is None else [ring])
+        self.queue = queue.SimpleQueue()
+        self.queueHandler = _QueueHandler(self.queue)
+        self.listener = _QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self._stopped = threading.Event()
+
+    def start(self):
+        self.listener.start()
+
+    def stop(self):
+        """ Writes the queued records and closes the handlers. """
+
+        if self._stopped.is_set():
+            return
+
+        self._stopped.set()
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+    def flush(self):
+        """ Waits until the records queued so far have been written. """
+
+        if self._stopped.is_set():
+            return
+
+        flushed = threading.Event()
+        self.queue.put(logging.makeLogRecord({'flushed': flushed}))
+        flushed.wait(5)
+        for handler in self.handlers:
+            handler.flush()
+
+    def saveRecent(self, path, seconds=None):
+        """ Saves the session ring to path and returns the number of lines. """
+
+        if self.ring is None:
+            raise RuntimeError('The recent log is disabled.')
+
+        self.flush()
+        return self.ring.save(path, seconds)
+
+_defaultSink = None
+
+def defaultSink():
+    return _defaultSink
+
+def configure(handlers, *, ring=None):
+    """ Replaces the sink of the root logger by one writing to handlers and
+        ring, the sink is stopped on exit. """
+
+    global _defaultSink
+
+    rootLogger = logging.getLogger()
+    if _defaultSink is not None:
+        rootLogger.removeHandler(_defaultSink.queueHandler)
+        atexit.unregister(_defaultSink.stop)
+        _defaultSink.stop()
+
+    _defaultSink = LogSink(handlers, ring=ring)
+    _defaultSink.start()
+    rootLogger.addHandler(_defaultSink.queueHandler)
+    atexit.register(_defaultSink.stop)
+    return _defaultSink
\ No newline at end of file
@@ -1,31 +1,89 @@
 from .Common import LOG_ALL
+from .Common import LOG_NONE
 from .Common import toArgumentString
+from .Log import getLogger
+from .Log import parseLevel
+from .Log import qualifiedName
 import functools
+import inspect
 import logging
-import types
 
 def loggedFunction(helper=None, level=logging.INFO):
+    """ Logs each call of the decorated function with its arguments. The
+        arguments are only formatted when the level is enabled. Methods log
+        to the logger of their instance's class, other functions to the
+        logger of the class they are defined in. """
+
     assert callable(helper) or helper is None
-    if level is None:
-        level == LOG_ALL
-    elif isinstance(level, str):
-        upper = level.upper()
-        level = LOG_ALL if upper == 'ALL' else getattr(logging, upper)
+    level = LOG_ALL if level is None else parseLevel(level)
 
     def wrap(function):
+        className, dot, functionName = function.__qualname__.rpartition('.')
+        parameters = list(inspect.signature(function).parameters)
+        argsStart = 1 if len(parameters) > 0 and parameters[0] in ('self', 'cls') else 0
+        functionLogger = getLogger(qualifiedName(function.__module__, className) if className else function.__module__)
+
         @functools.wraps(function)
         def logFunction(*args, **kwargs):
-            className, dot, functionName = function.__qualname__.rpartition('.')
-            logger = logging.getLogger(className)
-            argsStart = 0 if isinstance(function, types.FunctionType) == 0 else 1
-            argumentString = toArgumentString(args[argsStart:], kwargs)
-            logger.log(level, f'{functionName}({argumentString})')
+            logger = getLogger(args[0]) if argsStart == 1 else functionLogger
+            if logger.isEnabledFor(level):
+                logger.log(level, '%s(%s)', functionName, toArgumentString(args[argsStart:], kwargs))
             return function(*args, **kwargs)
         return logFunction
     return wrap(helper) if callable(helper) else wrap
 
 if __name__ == '__main__':
+    # Main only imports
     from .Common import configureLogging
+    import argparse
+    import io
+    import sys
+    import timeit
+
+    parser = argparse.ArgumentParser(description='loggedFunction test app')
+    parser.add_argument('--benchmark', action='store_true', help='measure the overhead per CommandPrinter.probe() call')
+    parser.add_argument('--calls', type=int, default=200000, help='benchmark: calls per measurement (default: %(default)s)')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        # Main only imports
+        from Printers.CommandPrinter import CommandPrinter
+
+        def eagerLoggedFunction(function, level=logging.INFO):
+            """ The previous implementation, which formatted every call. """
+
+            @functools.wraps(function)
+            def logFunction(*args, **kwargs):
+                className, dot, functionName = function.__qualname__.rpartition('.')
+                logger = logging.getLogger(className)
+                argumentString = toArgumentString(args[1:], kwargs)
+                logger.log(level, f'{functionName}({argumentString})')
+                return function(*args, **kwargs)
+            return logFunction
+
+        class BenchmarkPrinter(CommandPrinter):
+            plainProbe = inspect.unwrap(CommandPrinter.probe)
+            eagerProbe = eagerLoggedFunction(inspect.unwrap(CommandPrinter.probe))
+
+            def _probe(self, id_, *, context, x, y):
+                pass
+
+        printer = BenchmarkPrinter()
+        rootLogger = logging.getLogger()
+        rootLogger.addHandler(logging.StreamHandler(io.StringIO()))
+
+        def measure(method):
+            seconds = min(timeit.repeat(lambda: method('probe', x=100.0, y=100.0), number=args.calls, repeat=3))
+            return seconds / args.calls * 1e9 # ns
+
+        for levelName, level in [('disabled', LOG_NONE), ('enabled', logging.INFO)]:
+            rootLogger.setLevel(level)
+            plain = measure(printer.plainProbe)
+            eager = measure(printer.eagerProbe)
+            lazy = measure(printer.probe)
+            print(f'logging {levelName:8}: probe() {plain:7.0f} ns, '
+                  f'overhead before {eager - plain:7.0f} ns, after {lazy - plain:7.0f} ns')
+        sys.exit()
 
     configureLogging(level='debug', console='True')
 
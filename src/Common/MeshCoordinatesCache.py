@@ -0,0 +1,78 @@
+from Printers.CommandPrinter import CommandPrinter
+from Common.Log import getLogger
+from PySide6 import QtCore
+import json
+import os
+import pathlib
+
+VERSION = 1
+
+def defaultFile():
+    cacheDir = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.CacheLocation)
+    return pathlib.Path(cacheDir) / 'MeshCoordinates.json'
+
+class MeshCoordinatesCache:
+    """ Persistent cache of the mesh coordinates measured for one printer
+        connection, identified by its printer info file and port or host.
+
+        Entries are looked up by a fingerprint of the printer's mesh (its grid
+        size), so the coordinates are only measured again after the mesh
+        changes. All printers share a single JSON file. """
+
+    def __init__(self, file, printerInfoPath, specific):
+        self.logger = getLogger(self)
+        self.file = pathlib.Path(file)
+        self.prefix = f'{pathlib.Path(printerInfoPath).resolve()}|{specific}|'
+
+    def get(self, fingerprint):
+        entry = self._load().get(self.prefix + fingerprint)
+        if entry is None:
+            return None
+
+        try:
+            return CommandPrinter.calculateMeshCoordinates(rowCount = int(entry['rowCount']),
+                                                           columnCount = int(entry['columnCount']),
+                                                           minX = float(entry['minX']),
+                                                           maxX = float(entry['maxX']),
+                                                           minY = float(entry['minY']),
+                                                           maxY = float(entry['maxY']))
+        except (KeyError, TypeError, ValueError, ZeroDivisionError):
+            self.logger.warning(f'Ignoring invalid mesh coordinates cache entry: {entry}')
+            return None
+
+    def put(self, fingerprint, result):
+        entries = self._load()
+        entries[self.prefix + fingerprint] = {'rowCount': result.rowCount,
+                                              'columnCount': result.columnCount,
+                                              'minX': result.minX,
+                                              'maxX': result.maxX,
+                                              'minY': result.minY,
+                                              'maxY': result.maxY}
+
+        # Replace the file atomically so a crash never leaves it truncated
+        try:
+            self.file.parent.mkdir(parents=True, exist_ok=True)
+            temporaryFile = self.file.with_name(self.file.name + '.tmp')
+            temporaryFile.write_text(json.dumps({'version': VERSION, 'entries': entries}, indent=4))
+            os.replace(temporaryFile, self.file)
+        except OSError as exception:
+            self.logger.warning(f'Failed to write mesh coordinates cache {self.file}: {exception}')
+
+    def _load(self):
+        try:
+            data = json.loads(self.file.read_text())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exception:
+            self.logger.warning(f'Ignoring unreadable mesh coordinates cache {self.file}: {exception}')
+            return {}
+
+        if not isinstance(data, dict) or data.get('version') != VERSION or not isinstance(data.get('entries'), dict):
+            self.logger.warning(f'Ignoring mesh coordinates cache {self.file} with an unsupported format.')
+            return {}
+
+        return data['entries']
+
+    @staticmethod
+    def fingerprint(storedMesh):
+        return f'{len(storedMesh[0])}x{len(storedMesh)}'
@@ -0,0 +1,246 @@
+import copy
+import json
+import math
+import re
+import threading
+
+class Histogram:
+    """ Fixed memory log-linear histogram of durations in the style of
+        HdrHistogram. Durations are stored as whole microseconds, values
+        below 2**precision microseconds are exact and larger values keep a
+        relative error below 2**(1 - precision). Durations longer than
+        maximum seconds are clamped to the last bucket. """
+
+    def __init__(self, *, precision=7, maximum=3600.0):
+        assert(precision >= 1)
+
+        self.precision = precision
+        self._subBucketCount = 1 << precision
+        self._halfCount = self._subBucketCount >> 1
+        self._maximumValue = max(self._subBucketCount, round(maximum * 1e6))
+        self.counts = [0] * (self._index(self._maximumValue) + 1)
+        self.clear()
+
+    def clear(self):
+        self.counts[:] = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def _index(self, value):
+        if value < self._subBucketCount:
+            return value
+
+        shift = value.bit_length() - self.precision
+        return self._subBucketCount + (shift - 1) * self._halfCount + (value >> shift) - self._halfCount
+
+    def _range(self, index):
+        """ Returns the [low, high) microsecond range of a bucket. """
+
+        if index < self._subBucketCount:
+            return index, index + 1
+
+        shift, offset = divmod(index - self._subBucketCount, self._halfCount)
+        top = self._halfCount + offset
+        return top << (shift + 1), (top + 1) << (shift + 1)
+
+    def record(self, seconds):
+        value = min(max(0, round(seconds * 1e6)), self._maximumValue)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += seconds
+        self.minimum = seconds if self.minimum is None else min(self.minimum, seconds)
+        self.maximum = seconds if self.maximum is None else max(self.maximum, seconds)
+
+    def copy(self):
+        histogram = copy.copy(self)
+        histogram.counts = list(self.counts)
+        return histogram
+
+    def mean(self):
+        return None if self.count == 0 else self.total / self.count
+
+    def percentiles(self, *percents):
+        """ Returns the upper bound of the bucket holding each of the
+            ascending percents in seconds, clamped to the recorded range. """
+
+        if self.count == 0:
+            return [None] * len(percents)
+
+        results = []
+        seen = 0
+        buckets = self.buckets()
+        for percent in percents:
+            rank = max(1, math.ceil(percent / 100 * self.count))
+            while seen < rank:
+                _, high, count = next(buckets)
+                seen += count
+            results.append(min(max((round(high * 1e6) - 1) / 1e6, self.minimum), self.maximum))
+        return results
+
+    def percentile(self, percent):
+        return self.percentiles(percent)[0]
+
+    def cumulativeCounts(self, bounds):
+        """ Returns the number of durations whose bucket lies at or below
+            each of the ascending bounds in seconds, used to export coarser
+            cumulative buckets. """
+
+        results = []
+        total = 0
+        buckets = list(self.buckets())
+        position = 0
+        for bound in bounds:
+            while position < len(buckets) and round(buckets[position][1] * 1e6) - 1 <= bound * 1e6:
+                total += buckets[position][2]
+                position += 1
+            results.append(total)
+        return results
+
+    def buckets(self):
+        """ Yields (low, high, count) of each non-empty bucket in seconds. """
+
+        for index, count in enumerate(self.counts):
+            if count > 0:
+                low, high = self._range(index)
+                yield low / 1e6, high / 1e6, count
+
+    def __str__(self):
+        if self.count == 0:
+            return 'no samples'
+        return f'{self.count} samples, mean {self.mean() * 1000:.2f} ms, ' \
+               f'p50 {self.percentile(50) * 1000:.2f} ms, p99 {self.percentile(99) * 1000:.2f} ms, ' \
+               f'max {self.maximum * 1000:.2f} ms'
+
+class Metrics:
+    """ Thread safe registry of duration histograms and counters, each
+        series is identified by a name and a set of labels. """
+
+    # Cumulative bucket bounds in seconds used for OpenMetrics output
+    EXPORT_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                     0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+    def __init__(self, *, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {} # (name, labels) -> Histogram
+        self._counters = {} # (name, labels) -> value
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled or seconds is None:
+            return
+
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.record(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histogram(self, name, **labels):
+        with self._lock:
+            return self._histograms.get(self._key(name, labels))
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """ Returns a dict of plain values which is safe to use on any thread. """
+
+        # Only copy while locked so the recording threads are not held up
+        with self._lock:
+            histogramItems = [(key, histogram.copy()) for key, histogram in sorted(self._histograms.items())]
+            counterItems = sorted(self._counters.items())
+
+        histograms = []
+        for (name, labels), histogram in histogramItems:
+            p50, p90, p99, p999 = histogram.percentiles(50, 90, 99, 99.9)
+            histograms.append({'name': name,
+                               'labels': dict(labels),
+                               'count': histogram.count,
+                               'sum': histogram.total,
+                               'min': histogram.minimum,
+                               'max': histogram.maximum,
+                               'mean': histogram.mean(),
+                               'p50': p50,
+                               'p90': p90,
+                               'p99': p99,
+                               'p999': p999,
+                               'buckets': list(histogram.buckets()),
+                               'cumulative': list(zip(self.EXPORT_BOUNDS, histogram.cumulativeCounts(self.EXPORT_BOUNDS)))})
+        counters = [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in counterItems]
+        return {'histograms': histograms, 'counters': counters}
+
+    def toJson(self, **kwargs):
+        snapshot = self.snapshot()
+        for histogram in snapshot['histograms']:
+            del histogram['cumulative']
+        return json.dumps(snapshot, **kwargs)
+
+    @staticmethod
+    def _metricName(name):
+        return re.sub(r'[^a-zA-Z0-9_:]', '_', name)
+
+    @staticmethod
+    def _labelText(labels, **extra):
+        labels = {**labels, **extra}
+        if len(labels) == 0:
+            return ''
+
+        def escape(value):
+            return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+    def toOpenMetrics(self):
+        """ Returns the metrics in the OpenMetrics text exposition format. """
+
+        snapshot = self.snapshot()
+        lines = []
+
+        previousName = None
+        for histogram in snapshot['histograms']:
+            name = self._metricName(histogram['name'])
+            if name != previousName:
+                lines.append(f'# TYPE {name} histogram')
+                lines.append(f'# UNIT {name} seconds')
+                previousName = name
+
+            labels = histogram['labels']
+            for bound, count in histogram['cumulative']:
+                lines.append(f'{name}_bucket{self._labelText(labels, le=repr(bound))} {count}')
+            lines.append(f'{name}_bucket{self._labelText(labels, le="+Inf")} {histogram["count"]}')
+            lines.append(f'{name}_sum{self._labelText(labels)} {histogram["sum"]!r}')
+            lines.append(f'{name}_count{self._labelText(labels)} {histogram["count"]}')
+
+        previousName = None
+        for counter in snapshot['counters']:
+            name = self._metricName(counter['name'])
+            if name != previousName:
+                lines.append(f'# TYPE {name} counter')
+                previousName = name
+            lines.append(f'{name}_total{self._labelText(counter["labels"])} {counter["value"]}')
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+# Registry shared by the printers and the metrics dialog
+metrics = Metrics()
\ No newline at end of file
@@ -0,0 +1,87 @@
+from Common.Points import Point2F
+from typing import NamedTuple
+import math
+
+NO_OFFSET = Point2F(0.0, 0.0)
+
+class ClearanceMetrics(NamedTuple):
+    moveCount: int
+    zTravel: float     # Hopping at the planned heights
+    fullZTravel: float # Hopping at the full probe height
+
+    def saved(self):
+        return self.fullZTravel - self.zTravel
+
+class ProbeClearancePlanner:
+    """ Picks the lowest safe Z height for the travel move to each probe point.
+
+        Bed heights are learned from probed points or a previously probed
+        mesh. A move is made margin above the highest known height near the
+        paths of the probe and the nozzle, or at the full probe height when
+        part of either path is further than coverageRadius from every known
+        height. The margin must cover how far the probe reaches below the
+        nozzle. Heights are machine Z coordinates, as reported by probing. """
+
+    DEFAULT_COVERAGE_RADIUS = 100.0
+
+    def __init__(self, margin, coverageRadius=DEFAULT_COVERAGE_RADIUS):
+        if margin < 0.0 or coverageRadius <= 0.0:
+            raise ValueError('The clearance margin can\'t be negative and the coverage radius must be positive.')
+
+        self.margin = margin
+        self.coverageRadius = coverageRadius
+        self.heights = {} # (x, y): z
+        self.resetMetrics()
+
+    def clear(self):
+        self.heights = {}
+
+    def resetMetrics(self):
+        self._metrics = ClearanceMetrics(moveCount=0, zTravel=0.0, fullZTravel=0.0)
+
+    def metrics(self):
+        return self._metrics
+
+    def addHeight(self, x, y, z):
+        self.heights[(x, y)] = z
+
+    def addMesh(self, coordinates, mesh):
+        """ Adds the heights of a mesh given as [row][column] coordinates and
+            heights, unknown heights being None. """
+
+        for coordinateRow, meshRow in zip(coordinates, mesh):
+            for coordinate, z in zip(coordinateRow, meshRow):
+                if z is not None:
+                    self.addHeight(coordinate.x, coordinate.y, z)
+
+    def hopHeight(self, start, end, fullHeight, *, probeOffset=NO_OFFSET):
+        """ Returns the Z height to move the probe from the probe point start
+            (None when unknown) to the probe point end at. """
+
+        height = fullHeight
+        if start is not None:
+            nozzleStart = Point2F(start.x - probeOffset.x, start.y - probeOffset.y)
+            nozzleEnd = Point2F(end.x - probeOffset.x, end.y - probeOffset.y)
+            highest = self._highestKnownHeight(self._pathSamples(start, end) + self._pathSamples(nozzleStart, nozzleEnd))
+            if highest is not None:
+                height = min(fullHeight, highest + self.margin)
+
+        # Each hop rises from the bed and descends back to it
+        self._metrics = ClearanceMetrics(moveCount = self._metrics.moveCount + 1,
+                                         zTravel = self._metrics.zTravel + 2 * height,
+                                         fullZTravel = self._metrics.fullZTravel + 2 * fullHeight)
+        return height
+
+    def _pathSamples(self, start, end):
+        # Close enough that every point of the path is near a sample
+        count = max(1, math.ceil(math.dist(start, end) / (self.coverageRadius / 4)))
+        return [Point2F(start.x + (end.x - start.x) * step / count, start.y + (end.y - start.y) * step / count) for step in range(count + 1)]
+
+    def _highestKnownHeight(self, samples):
+        highest = None
+        for sample in samples:
+            near = [z for (x, y), z in self.heights.items() if math.dist(sample, (x, y)) <= self.coverageRadius]
+            if len(near) == 0:
+                return None
+            highest = max(near) if highest is None else max(highest, max(near))
+        return highest
@@ -0,0 +1,120 @@
+from Common import Common
+from Common.Points import Point2F
+import math
+
+NO_OFFSET = Point2F(0.0, 0.0)
+
+def nozzlePositions(points, probeOffset=NO_OFFSET):
+    """ Returns the nozzle position used to probe each point. """
+    return [Point2F(point.x - probeOffset.x, point.y - probeOffset.y) for point in points]
+
+def travelDistance(points, order, *, probeOffset=NO_OFFSET, start=None):
+    """ Returns the XY distance travelled by the nozzle to probe points in the
+        given order, starting at the nozzle position start if known. """
+
+    positions = nozzlePositions(points, probeOffset)
+    path = ([] if start is None else [start]) + [positions[index] for index in order]
+    return sum(math.dist(a, b) for a, b in zip(path, path[1:]))
+
+def planProbeOrder(points, *, probeOffset=NO_OFFSET, start=None):
+    """ Returns the indices of points in the order minimizing the estimated
+        travel time of the nozzle, starting at the nozzle position start or,
+        if it is unknown, at whichever point gives the shortest path.
+
+        Probe moves all use the same XY speed, so travel time is estimated by
+        travel distance. The order is built nearest neighbour first and then
+        improved with 2-opt until no reversal shortens it. """
+
+    positions = nozzlePositions(points, probeOffset)
+    if len(positions) < 3 and start is None:
+        return list(range(len(positions)))
+
+    if start is None:
+        # Good open paths start at an extreme point, so only those are tried
+        firstIndices = set()
+        for xSign, ySign in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
+            firstIndices.add(min(range(len(positions)), key=lambda index: xSign * positions[index].x + ySign * positions[index].y))
+        candidates = [_nearestNeighbour(positions, [first]) for first in sorted(firstIndices)]
+    else:
+        candidates = [_nearestNeighbour(positions, [], start)]
+
+    order = min(candidates, key=lambda candidate: travelDistance(points, candidate, probeOffset=probeOffset, start=start))
+    _twoOpt(positions, order, start)
+    return order
+
+def _nearestNeighbour(positions, order, start=None):
+    unvisited = set(range(len(positions))) - set(order)
+    current = positions[order[-1]] if len(order) > 0 else start
+    while len(unvisited) > 0:
+        # Ties are broken by index to keep the plan deterministic
+        nearest = min(unvisited, key=lambda index: (math.dist(current, positions[index]), index))
+        unvisited.remove(nearest)
+        order.append(nearest)
+        current = positions[nearest]
+    return order
+
+def _twoOpt(positions, order, start):
+    """ Reverses sections of order in place while that shortens the path. The
+        path is open, so the last point is free and so is the first one when
+        start is None. """
+
+    def distance(a, b):
+        return 0.0 if a is None or b is None else math.dist(a, b)
+
+    count = len(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(count - 1):
+            before = start if i == 0 else positions[order[i-1]]
+            for j in range(i + 1, count):
+                first = positions[order[i]]
+                last = positions[order[j]]
+                after = positions[order[j+1]] if j + 1 < count else None
+                if distance(before, last) + distance(first, after) < distance(before, first) + distance(last, after) - 1e-9:
+                    order[i:j+1] = reversed(order[i:j+1])
+                    improved = True
+
+def _serpentineOrder(rowCount, columnCount):
+    order = []
+    for row in range(rowCount):
+        columns = range(columnCount) if row % 2 == 0 else reversed(range(columnCount))
+        order += [row * columnCount + column for column in columns]
+    return order
+
+if __name__ == '__main__':
+    from Common import PrinterInfo
+    import time
+
+    # Reports the travel saved on every bundled printer, starting at the
+    # homed position (0, 0) with no probe offset
+    MESH_SIZE = 5
+    start = Point2F(0.0, 0.0)
+    totalBefore = 0.0
+    totalAfter = 0.0
+    for filePath in sorted(Common.printersDir().glob('*.json')):
+        printerInfo = PrinterInfo.fromFile(filePath)
+        points = [Point2F(point.x, point.y) for point in printerInfo.manualProbePoints]
+
+        # A mesh spanning the manual probe points, probed in a serpentine order
+        minX = min(point.x for point in points)
+        maxX = max(point.x for point in points)
+        minY = min(point.y for point in points)
+        maxY = max(point.y for point in points)
+        mesh = [Point2F(minX + column * (maxX - minX) / (MESH_SIZE - 1), minY + row * (maxY - minY) / (MESH_SIZE - 1))
+                for row in range(MESH_SIZE) for column in range(MESH_SIZE)]
+
+        for name, pointList, defaultOrder in [('manual', points, list(range(len(points)))),
+                                              ('mesh', mesh, _serpentineOrder(MESH_SIZE, MESH_SIZE))]:
+            startTime = time.perf_counter()
+            order = planProbeOrder(pointList, start=start)
+            elapsed = time.perf_counter() - startTime
+
+            before = travelDistance(pointList, defaultOrder, start=start)
+            after = travelDistance(pointList, order, start=start)
+            totalBefore += before
+            totalAfter += after
+            print(f'{filePath.stem:<40} {name:<6} {before:9.1f} mm -> {after:9.1f} mm ' \
+                  f'({100 * (before - after) / before:5.1f}% saved, planned in {1000 * elapsed:.2f} ms)')
+
+    print(f'Total: {totalBefore:.1f} mm -> {totalAfter:.1f} mm ({100 * (totalBefore - totalAfter) / totalBefore:.1f}% saved)')
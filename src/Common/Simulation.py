@@ -0,0 +1,57 @@
+import math
+
+class BedSurface:
+    """ Synthetic bed height map in probe coordinates (mm): a tilted plane, a
+        bowl centered on the bed and a gentle waviness. """
+
+    def __init__(self, *, center=(100.0, 100.0), tiltX=0.0010, tiltY=-0.0006, bowl=-4e-6, waviness=0.02, wavelength=120.0):
+        self.center = center
+        self.tiltX = tiltX
+        self.tiltY = tiltY
+        self.bowl = bowl
+        self.waviness = waviness
+        self.wavelength = wavelength
+
+    def __call__(self, x, y):
+        dx = x - self.center[0]
+        dy = y - self.center[1]
+        wave = math.sin(2 * math.pi * x / self.wavelength) * math.cos(2 * math.pi * y / self.wavelength)
+        return self.tiltX * dx + self.tiltY * dy + self.bowl * (dx * dx + dy * dy) + self.waviness * wave
+
+class Heater:
+    """ First order heater model, times are simulated seconds. """
+
+    def __init__(self, timeConstant, ambient=25.0):
+        self.timeConstant = timeConstant
+        self.ambient = ambient
+        self.target = 0.0
+        self.start = ambient
+        self.startTime = 0.0
+
+    def temperature(self, now):
+        """ now is None when heating is instant. """
+
+        goal = self.ambient if self.target == 0 else self.target
+        if now is None:
+            return goal
+        return goal + (self.start - goal) * math.exp(-(now - self.startTime) / self.timeConstant)
+
+    def power(self, now):
+        if self.target == 0:
+            return 0
+        return max(0, min(127, round((self.target - self.temperature(now)) * 12.7)))
+
+    def setTarget(self, target, now):
+        self.start = self.temperature(now)
+        self.startTime = 0.0 if now is None else now
+        self.target = target
+
+def trapezoidTime(distance, speed, acceleration):
+    """ Time to travel distance with a trapezoidal velocity profile starting
+        and ending at standstill. """
+
+    if distance <= 0:
+        return 0.0
+    if distance >= speed * speed / acceleration:
+        return distance / speed + speed / acceleration
+    return 2 * math.sqrt(distance / acceleration)
@@ -0,0 +1,15 @@
+from Common.CommonArgumentParser import CommonArgumentParser
+import pytest
+
+def createParser():
+    parser = CommonArgumentParser()
+    parser.showDialog = False
+    return parser
+
+def test_wireCaptureRing(tmp_path):
+    args = createParser().parse_args(['--wire-capture', str(tmp_path / 'capture.bin'), '--wire-capture-ring', '1000'])
+    assert(args.wire_capture_ring == 1000)
+
+    # The ring is only written to a capture file
+    with pytest.raises(SystemExit):
+        createParser().parse_args(['--wire-capture-ring', '1000'])
\ No newline at end of file
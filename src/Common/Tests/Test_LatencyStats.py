@@ -0,0 +1,21 @@
+from Common.LatencyStats import LatencyStats
+import pytest
+
+def test_empty():
+    stats = LatencyStats()
+    assert(stats.count == 0)
+    assert(stats.mean() is None)
+    assert(str(stats) == 'no samples')
+
+def test_add():
+    stats = LatencyStats()
+    for seconds in [0.001, 0.004, 0.002]:
+        stats.add(seconds)
+
+    assert(stats.count == 3)
+    assert(stats.mean() == pytest.approx(0.007 / 3))
+    assert(stats.maximum == 0.004)
+    assert(str(stats) == '3 samples, mean 2.33 ms, max 4.00 ms')
+
+    stats.clear()
+    assert(stats.count == 0)
\ No newline at end of file
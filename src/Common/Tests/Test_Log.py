@@ -0,0 +1,42 @@
+from Common import Log
+from Common.Common import LOG_ALL
+from Common.Common import LOG_NONE
+from Printers.Marlin2.CommandConnection import CommandConnection
+from Printers.Marlin2.Marlin2Printer import InitMachine
+from dataclasses import dataclass
+import logging
+import pytest
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    text: str
+    levels: dict
+
+testPoints = [
+    TestPoint(text = 'marlin2=debug',                         levels = {'Printers.Marlin2': logging.DEBUG}),
+    TestPoint(text = 'Moonraker=all, Common.Tracer=WARNING',  levels = {'Printers.Moonraker': LOG_ALL, 'Common.Tracer': logging.WARNING}),
+    TestPoint(text = 'printers=none',                         levels = {'Printers': LOG_NONE}),
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_parseLevels(testPoint):
+    assert(Log.parseLevels(testPoint.text) == testPoint.levels)
+
+@pytest.mark.parametrize('text', ['marlin2', '=debug', 'marlin2=loud'])
+def test_parseLevelsInvalid(text):
+    with pytest.raises(ValueError):
+        Log.parseLevels(text)
+
+def test_getLogger():
+    assert(Log.getLogger(CommandConnection).name == 'Printers.Marlin2.CommandConnection')
+    assert(Log.getLogger(InitMachine).name == 'Printers.Marlin2.Marlin2Printer.InitMachine')
+    assert(Log.getLogger(InitMachine) is Log.getLogger(InitMachine))
+    assert(Log.getLogger('Name') is logging.getLogger('Name'))
+
+def test_setLevels():
+    Log.setLevels({'Printers.Marlin2': 'debug'})
+    try:
+        assert(Log.getLogger(InitMachine).isEnabledFor(logging.DEBUG))
+    finally:
+        Log.setLevels({'Printers.Marlin2': logging.NOTSET})
\ No newline at end of file
@@ -0,0 +1,150 @@
+from Common import LogSink
+from dataclasses import dataclass
+import gzip
+import logging
+import pytest
+import threading
+import time
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    name: str
+    level: int
+    passed: bool
+
+testPoints = [
+    TestPoint(name = 'root',                                  level = logging.INFO,    passed = True),
+    TestPoint(name = 'root',                                  level = logging.DEBUG,   passed = False),
+    TestPoint(name = 'Printers.Marlin2.SerialConnection',     level = logging.DEBUG,   passed = True),
+    TestPoint(name = 'Printers.Marlin2Printer',               level = logging.DEBUG,   passed = False),
+    TestPoint(name = 'Printers.Moonraker.MoonrakerPrinter',   level = logging.INFO,    passed = False),
+    TestPoint(name = 'Printers.Moonraker.MoonrakerPrinter',   level = logging.WARNING, passed = True),
+    ]
+
+def makeRecord(message, *, name='test', level=logging.INFO, created=None):
+    record = logging.makeLogRecord({'name': name, 'levelno': level, 'levelname': logging.getLevelName(level), 'msg': message})
+    if created is not None:
+        record.created = created
+    return record
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_thresholdFilter(testPoint):
+    thresholdFilter = LogSink.ThresholdFilter(logging.INFO, {'Printers.Marlin2': logging.DEBUG,
+                                                             'Printers.Moonraker': logging.WARNING})
+    assert(thresholdFilter.filter(makeRecord('text', name=testPoint.name, level=testPoint.level)) == testPoint.passed)
+
+def test_sizeRotation(tmp_path):
+    path = tmp_path / 'log.txt'
+    handler = LogSink.RotatingFileHandler(path, maxBytes=100, backupCount=2, compression='gzip')
+    for index in range(12):
+        handler.emit(makeRecord(f'{index:02} ' + 'x' * 30))
+    handler.close()
+
+    assert(sorted(file.name for file in tmp_path.iterdir()) == ['log.txt', 'log.txt.1.gz', 'log.txt.2.gz'])
+    assert(path.read_text().splitlines() == [f'{index:02} ' + 'x' * 30 for index in range(10, 12)])
+    assert(gzip.decompress((tmp_path / 'log.txt.1.gz').read_bytes()).decode().splitlines()[0].startswith('08 '))
+
+def test_intervalRotation(tmp_path):
+    path = tmp_path / 'log.txt'
+    handler = LogSink.RotatingFileHandler(path, interval=60, compression='none')
+    handler.emit(makeRecord('first'))
+    handler.rolloverAt = time.time() - 1
+    handler.emit(makeRecord('second'))
+    handler.close()
+
+    assert((tmp_path / 'log.txt.1').read_text() == 'first\n')
+    assert(path.read_text() == 'second\n')
+    assert(handler.rolloverAt > time.time())
+
+def test_zstdUnavailable(tmp_path, monkeypatch):
+    monkeypatch.setattr(LogSink, 'zstd', None)
+    assert(not LogSink.compressionAvailable('zstd'))
+    with pytest.raises(ValueError):
+        LogSink.RotatingFileHandler(tmp_path / 'log.txt', compression='zstd')
+
+def test_sessionRing(tmp_path):
+    ring = LogSink.SessionRing(60, maxRecords=3)
+    now = time.time()
+    ring.handle(makeRecord('old', created=now - 120))
+    for index in range(4):
+        ring.handle(makeRecord(f'recent {index}', created=now - 10 + index))
+
+    assert(ring.lines() == ['recent 1', 'recent 2', 'recent 3'])
+    assert(ring.lines(8.5) == ['recent 2', 'recent 3'])
+    assert(ring.save(tmp_path / 'recent.txt') == 3)
+    assert((tmp_path / 'recent.txt').read_text() == 'recent 1\nrecent 2\nrecent 3\n')
+
+def test_sink(tmp_path):
+    fileHandler = LogSink.RotatingFileHandler(tmp_path / 'log.txt')
+    fileHandler.setLevel(logging.WARNING)
+    sink = LogSink.LogSink([fileHandler], ring=LogSink.SessionRing(60))
+    sink.start()
+
+    logger = logging.getLogger('Test_LogSink')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(sink.queueHandler)
+    try:
+        threads = []
+        for index in range(4):
+            threads.append(threading.Thread(target=logger.warning, args=('warning %d', index)))
+            threads[-1].start()
+        for thread in threads:
+            thread.join()
+        logger.debug('debug')
+
+        assert(sink.saveRecent(tmp_path / 'recent.txt') == 5)
+        assert(sorted((tmp_path / 'log.txt').read_text().splitlines()) == [f'warning {index}' for index in range(4)])
+        assert((tmp_path / 'recent.txt').read_text().splitlines()[-1] == 'debug')
+    finally:
+        logger.removeHandler(sink.queueHandler)
+        sink.stop()
+        sink.stop()
+
+    assert(fileHandler.stream is None)
+
+def test_sinkWithoutRing(tmp_path):
+    sink = LogSink.LogSink([])
+    with pytest.raises(RuntimeError):
+        sink.saveRecent(tmp_path / 'recent.txt')
+
+def test_formattedOnListenerThread(tmp_path):
+    class Argument:
+        def __init__(self):
+            self.threads = []
+
+        def __str__(self):
+            self.threads.append(threading.current_thread())
+            return 'argument'
+
+    sink = LogSink.LogSink([], ring=LogSink.SessionRing(60))
+    sink.start()
+
+    logger = logging.getLogger('Test_LogSink.formatted')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(sink.queueHandler)
+    try:
+        # Immutable arguments are formatted by the listener, others when logged
+        argument = Argument()
+        values = [1]
+        logger.info('%s %s', 'text', 1.5)
+        logger.info('value %s', argument)
+        logger.info('values %s', values)
+        values.append(2)
+        sink.flush()
+
+        assert(sink.ring.lines() == ['text 1.5', 'value argument', 'values [1]'])
+        assert(argument.threads == [threading.current_thread()])
+    finally:
+        logger.removeHandler(sink.queueHandler)
+        sink.stop()
+
+def test_prepare():
+    queueHandler = LogSink.LogSink([]).queueHandler
+    record = queueHandler.prepare(logging.makeLogRecord({'msg': '%s %s', 'args': (('x', 1), None)}))
+    assert(record.args == (('x', 1), None))
+
+    record = queueHandler.prepare(logging.LogRecord('test', logging.INFO, __file__, 0, '%(x)s', ({'x': 1},), None))
+    assert((record.msg, record.args) == ('1', None))
\ No newline at end of file
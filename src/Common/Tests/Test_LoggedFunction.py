@@ -0,0 +1,56 @@
+from Common.Common import LOG_ALL
+from Common.LoggedFunction import loggedFunction
+import logging
+
+class Argument:
+    def __init__(self):
+        self.formatCount = 0
+
+    def __str__(self):
+        self.formatCount += 1
+        return 'argument'
+
+class Recorder(logging.Handler):
+    def __init__(self):
+        super().__init__(LOG_ALL)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.name, record.levelno, record.getMessage()))
+
+class Base:
+    @loggedFunction
+    def method(self, value, *, key=None):
+        return value
+
+    @staticmethod
+    @loggedFunction(level=None)
+    def function(value):
+        return value
+
+class Derived(Base):
+    pass
+
+def test_loggedFunction():
+    recorder = Recorder()
+    logger = logging.getLogger(__name__)
+    logger.addHandler(recorder)
+    argument = Argument()
+
+    try:
+        logger.setLevel(logging.WARNING)
+        assert(Derived().method(argument, key=1) is argument)
+        assert(Base.function(argument) is argument)
+        assert(argument.formatCount == 0)
+        assert(recorder.messages == [])
+
+        logger.setLevel(LOG_ALL)
+        Derived().method(argument, key=1)
+        Base.function(argument)
+    finally:
+        logger.removeHandler(recorder)
+        logger.setLevel(logging.NOTSET)
+
+    assert(argument.formatCount == 2)
+    assert(recorder.messages == [(f'{__name__}.Derived', logging.INFO, 'method(argument, key=1)'),
+                                 (f'{__name__}.Base', LOG_ALL, 'function(argument)')])
\ No newline at end of file
@@ -0,0 +1,44 @@
+from Common.MeshCoordinatesCache import MeshCoordinatesCache
+from Printers.CommandPrinter import CommandPrinter
+import pytest
+
+RESULT = CommandPrinter.calculateMeshCoordinates(rowCount = 3,
+                                                 columnCount = 4,
+                                                 minX = 10.0,
+                                                 maxX = 220.0,
+                                                 minY = 15.0,
+                                                 maxY = 215.0)
+
+def test_roundTrip(tmp_path):
+    MeshCoordinatesCache(tmp_path / 'cache.json', tmp_path / 'Printer.json', 'COM1').put('4x3', RESULT)
+
+    # A new instance reads the entry back from disk
+    assert(MeshCoordinatesCache(tmp_path / 'cache.json', tmp_path / 'Printer.json', 'COM1').get('4x3') == RESULT)
+
+@pytest.mark.parametrize('printerInfoPath, specific, fingerprint', [('Printer.json', 'COM1', '5x5'),
+                                                                     ('Printer.json', 'COM2', '4x3'),
+                                                                     ('Other.json', 'COM1', '4x3')])
+def test_miss(tmp_path, printerInfoPath, specific, fingerprint):
+    MeshCoordinatesCache(tmp_path / 'cache.json', tmp_path / 'Printer.json', 'COM1').put('4x3', RESULT)
+    assert(MeshCoordinatesCache(tmp_path / 'cache.json', tmp_path / printerInfoPath, specific).get(fingerprint) is None)
+
+def test_sharedFile(tmp_path):
+    first = MeshCoordinatesCache(tmp_path / 'cache.json', tmp_path / 'Printer.json', 'COM1')
+    second = MeshCoordinatesCache(tmp_path / 'cache.json', tmp_path / 'Other.json', 'COM1')
+    first.put('4x3', RESULT)
+    second.put('4x3', RESULT._replace(minX = 20.0))
+    assert(first.get('4x3') == RESULT)
+    assert(second.get('4x3').minX == 20.0)
+
+@pytest.mark.parametrize('contents', ['', '{', '[]', '{"version": 0, "entries": {}}'])
+def test_unreadable(tmp_path, contents):
+    (tmp_path / 'cache.json').write_text(contents)
+    cache = MeshCoordinatesCache(tmp_path / 'cache.json', tmp_path / 'Printer.json', 'COM1')
+    assert(cache.get('4x3') is None)
+
+    # Writing replaces the unreadable file
+    cache.put('4x3', RESULT)
+    assert(cache.get('4x3') == RESULT)
+
+def test_fingerprint():
+    assert(MeshCoordinatesCache.fingerprint([[0.0, 0.1, 0.2, 0.3]]*3) == '4x3')
\ No newline at end of file
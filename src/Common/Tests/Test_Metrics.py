@@ -0,0 +1,109 @@
+from Common.Metrics import Histogram
+from Common.Metrics import Metrics
+from dataclasses import dataclass
+import json
+import pytest
+import threading
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    seconds: float
+    low: float
+    high: float
+
+testPoints = [
+    TestPoint(seconds = 0.0,      low = 0.0,      high = 0.000001),
+    TestPoint(seconds = 0.000127, low = 0.000127, high = 0.000128),
+    TestPoint(seconds = 0.000128, low = 0.000128, high = 0.00013),
+    TestPoint(seconds = 0.001,    low = 0.001,    high = 0.001008),
+    TestPoint(seconds = 2.5,      low = 2.490368, high = 2.523136),
+    TestPoint(seconds = 7200.0,   low = 3590.324224, high = 3623.878656), # Clamped
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_bucket(testPoint):
+    histogram = Histogram()
+    histogram.record(testPoint.seconds)
+
+    assert(list(histogram.buckets()) == [(testPoint.low, testPoint.high, 1)])
+    assert(histogram.maximum == testPoint.seconds)
+
+def test_fixedMemory():
+    histogram = Histogram()
+    size = len(histogram.counts)
+    for microseconds in range(0, 10000000, 997):
+        histogram.record(microseconds / 1e6)
+        low, high, _ = list(histogram.buckets())[-1]
+        assert(low * 1e6 <= microseconds < high * 1e6)
+        assert(high - low <= max(0.000001, low / 64))
+
+    assert(len(histogram.counts) == size)
+
+def test_percentiles():
+    histogram = Histogram()
+    assert(histogram.percentiles(50, 99) == [None, None])
+    assert(str(histogram) == 'no samples')
+
+    for milliseconds in range(1, 101):
+        histogram.record(milliseconds / 1000)
+
+    assert(histogram.count == 100)
+    assert(histogram.mean() == pytest.approx(0.0505))
+    assert(histogram.percentile(0) == pytest.approx(0.001, rel=0.02))
+    assert(histogram.percentile(50) == pytest.approx(0.05, rel=0.02))
+    assert(histogram.percentile(99) == pytest.approx(0.099, rel=0.02))
+    assert(histogram.percentile(100) == 0.1)
+    assert(histogram.cumulativeCounts([0.0005, 0.0102, 1.0]) == [0, 10, 100])
+
+    histogram.clear()
+    assert(histogram.count == 0 and sum(histogram.counts) == 0)
+
+def test_registry():
+    metrics = Metrics()
+    metrics.observe('command_seconds', 0.002, command='G28')
+    metrics.observe('command_seconds', 0.004, command='G28')
+    metrics.observe('command_seconds', 0.010, command='M114')
+    metrics.increment('lines')
+    metrics.increment('lines', 2)
+
+    assert(metrics.histogram('command_seconds', command='G28').count == 2)
+    assert(metrics.histogram('command_seconds', command='G30') is None)
+    assert(metrics.counter('lines') == 3)
+
+    snapshot = json.loads(metrics.toJson())
+    assert([(series['labels'], series['count']) for series in snapshot['histograms']] == [({'command': 'G28'}, 2), ({'command': 'M114'}, 1)])
+    assert(snapshot['counters'] == [{'name': 'lines', 'labels': {}, 'value': 3}])
+
+    lines = metrics.toOpenMetrics().splitlines()
+    assert(lines[:2] == ['# TYPE command_seconds histogram', '# UNIT command_seconds seconds'])
+    assert('command_seconds_bucket{command="G28",le="0.0025"} 1' in lines)
+    assert('command_seconds_bucket{command="G28",le="+Inf"} 2' in lines)
+    assert('command_seconds_count{command="M114"} 1' in lines)
+    assert(lines[-2:] == ['lines_total 3', '# EOF'])
+
+    metrics.clear()
+    assert(metrics.snapshot() == {'histograms': [], 'counters': []})
+
+def test_disabled():
+    metrics = Metrics(enabled=False)
+    metrics.observe('command_seconds', 0.002)
+    metrics.increment('lines')
+    assert(metrics.snapshot() == {'histograms': [], 'counters': []})
+
+def test_threads():
+    metrics = Metrics()
+
+    def record():
+        for _ in range(1000):
+            metrics.observe('command_seconds', 0.001)
+            metrics.increment('lines')
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert(metrics.histogram('command_seconds').count == 4000)
+    assert(metrics.counter('lines') == 4000)
\ No newline at end of file
@@ -0,0 +1,64 @@
+from Common.ProbeClearancePlanner import ProbeClearancePlanner
+from Common.Points import Point2F
+from dataclasses import dataclass, field
+from typing import Union
+import pytest
+
+FULL_HEIGHT = 10.0
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    heights: dict # (x, y): z
+    start: Union[None, Point2F]
+    end: Point2F
+    probeOffset: Point2F = field(default=Point2F(0.0, 0.0))
+    expected: float = field(default=None)
+
+testPoints = [
+    # Nothing known
+    TestPoint(heights = {}, start = Point2F(0.0, 0.0), end = Point2F(50.0, 0.0), expected = FULL_HEIGHT),
+    TestPoint(heights = {(0.0, 0.0): 0.1}, start = None, end = Point2F(0.0, 0.0), expected = FULL_HEIGHT),
+    # The highest height near the path decides
+    TestPoint(heights = {(0.0, 0.0): 0.1, (50.0, 0.0): 0.3, (100.0, 0.0): -0.2}, start = Point2F(0.0, 0.0), end = Point2F(100.0, 0.0), expected = 2.3),
+    TestPoint(heights = {(0.0, 0.0): 0.1, (50.0, 0.0): 0.3, (300.0, 0.0): 0.9}, start = Point2F(0.0, 0.0), end = Point2F(50.0, 0.0), expected = 2.3),
+    # Part of the path is too far from every known height
+    TestPoint(heights = {(0.0, 0.0): 0.1, (300.0, 0.0): 0.2}, start = Point2F(0.0, 0.0), end = Point2F(300.0, 0.0), expected = FULL_HEIGHT),
+    # The nozzle passes over a high spot the probe doesn't
+    TestPoint(heights = {(0.0, 0.0): 0.1, (50.0, 0.0): 0.2, (-40.0, 0.0): 0.5}, start = Point2F(0.0, 0.0), end = Point2F(50.0, 0.0),
+              probeOffset = Point2F(40.0, 0.0), expected = 2.5),
+    # Never above the full height
+    TestPoint(heights = {(0.0, 0.0): 9.0}, start = Point2F(0.0, 0.0), end = Point2F(0.0, 0.0), expected = FULL_HEIGHT)
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_hopHeight(testPoint):
+    planner = ProbeClearancePlanner(2.0)
+    for (x, y), z in testPoint.heights.items():
+        planner.addHeight(x, y, z)
+
+    assert(planner.hopHeight(testPoint.start, testPoint.end, FULL_HEIGHT, probeOffset=testPoint.probeOffset) == pytest.approx(testPoint.expected))
+
+def test_addMesh():
+    planner = ProbeClearancePlanner(1.0)
+    planner.addMesh([[Point2F(0.0, 0.0), Point2F(50.0, 0.0)]], [[0.2, None]])
+    assert(planner.heights == {(0.0, 0.0): 0.2})
+
+def test_metrics():
+    planner = ProbeClearancePlanner(2.0)
+    planner.hopHeight(None, Point2F(0.0, 0.0), FULL_HEIGHT)
+    planner.addHeight(0.0, 0.0, 0.5)
+    planner.hopHeight(Point2F(0.0, 0.0), Point2F(0.0, 10.0), FULL_HEIGHT)
+
+    metrics = planner.metrics()
+    assert(metrics.moveCount == 2)
+    assert(metrics.zTravel == pytest.approx(2 * 10.0 + 2 * 2.5))
+    assert(metrics.fullZTravel == pytest.approx(4 * 10.0))
+    assert(metrics.saved() == pytest.approx(15.0))
+
+    planner.resetMetrics()
+    assert(planner.metrics().moveCount == 0)
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        ProbeClearancePlanner(-1.0)
\ No newline at end of file
@@ -0,0 +1,56 @@
+from Common.ProbePathPlanner import planProbeOrder
+from Common.ProbePathPlanner import travelDistance
+from Common.Points import Point2F
+from dataclasses import dataclass, field
+from typing import Union
+import pytest
+
+GRID = [Point2F(x * 50.0, y * 50.0) for y in range(5) for x in range(5)]
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    points: list
+    probeOffset: Point2F = field(default=Point2F(0.0, 0.0))
+    start: Union[None, Point2F] = field(default=None)
+    expected: float = field(default=None) # Shortest travel distance
+
+testPoints = [
+    TestPoint(points = [Point2F(10.0, 10.0)],
+              expected = 0.0),
+    TestPoint(points = [Point2F(10.0, 10.0)],
+              start = Point2F(10.0, 40.0),
+              expected = 30.0),
+    TestPoint(points = [Point2F(0.0, 0.0), Point2F(30.0, 0.0), Point2F(10.0, 0.0), Point2F(20.0, 0.0)],
+              expected = 30.0),
+    TestPoint(points = [Point2F(0.0, 0.0), Point2F(30.0, 0.0), Point2F(10.0, 0.0), Point2F(20.0, 0.0)],
+              start = Point2F(40.0, 0.0),
+              expected = 40.0),
+    # The nozzle is at the start, 10 mm left of the probe
+    TestPoint(points = [Point2F(0.0, 0.0), Point2F(30.0, 0.0), Point2F(10.0, 0.0), Point2F(20.0, 0.0)],
+              probeOffset = Point2F(10.0, 0.0),
+              start = Point2F(20.0, 0.0),
+              expected = 30.0),
+    TestPoint(points = GRID,
+              expected = 24 * 50.0),
+    TestPoint(points = GRID,
+              start = Point2F(0.0, 0.0),
+              expected = 24 * 50.0),
+    TestPoint(points = list(reversed(GRID)),
+              start = Point2F(200.0, 0.0),
+              expected = 24 * 50.0)
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_planProbeOrder(testPoint):
+    order = planProbeOrder(testPoint.points, probeOffset=testPoint.probeOffset, start=testPoint.start)
+    assert(sorted(order) == list(range(len(testPoint.points))))
+    assert(travelDistance(testPoint.points, order, probeOffset=testPoint.probeOffset, start=testPoint.start) == pytest.approx(testPoint.expected))
+
+def test_neverLongerThanGiven():
+    # Manual probe points of a 420 mm bed listed in a zig-zag
+    points = [Point2F(35.0, 35.0), Point2F(385.0, 385.0), Point2F(35.0, 210.0), Point2F(385.0, 35.0),
+              Point2F(210.0, 210.0), Point2F(35.0, 385.0), Point2F(385.0, 210.0)]
+    start = Point2F(0.0, 0.0)
+    order = planProbeOrder(points, start=start)
+    assert(travelDistance(points, order, start=start) < travelDistance(points, range(len(points)), start=start))
\ No newline at end of file
@@ -0,0 +1,97 @@
+from Common.ThermalMonitor import Heater
+from Common.ThermalMonitor import TemperatureHistory
+from Common.ThermalMonitor import ThermalMonitor
+from Printers.CommandPrinter import GetTemperaturesResult
+from dataclasses import dataclass, field
+import pytest
+
+def temperatures(bedActual, bedDesired, toolActual=25.0, toolDesired=0.0):
+    return GetTemperaturesResult(toolActual = toolActual,
+                                 toolDesired = toolDesired,
+                                 toolPower = 0.0,
+                                 bedActual = bedActual,
+                                 bedDesired = bedDesired,
+                                 bedPower = 0.0)
+
+def test_history():
+    history = TemperatureHistory(capacity=3)
+    for second in range(5):
+        history.append(float(second), 20.0 + second)
+
+    # Only the newest samples are kept
+    assert(len(history) == 3)
+    assert(history.latest() == (4.0, 24.0))
+    assert(history.window(1.0, 4.0) == [(3.0, 23.0), (4.0, 24.0)])
+    assert(TemperatureHistory.slope(history.window(10.0, 4.0)) == pytest.approx(1.0))
+    assert(TemperatureHistory.slope([(4.0, 24.0)]) is None)
+
+def test_off(qapp):
+    monitor = ThermalMonitor()
+    monitor.update(temperatures(25.0, 0.0), now=0.0)
+    assert(not monitor.heating())
+    assert(monitor.stable())
+    assert(monitor.timeToTarget(Heater.BED) is None)
+
+def test_heating(qapp):
+    monitor = ThermalMonitor(tolerance=1.0, window=20.0, maxSlope=0.02, maxStdDev=0.5)
+    reached = []
+    settled = []
+    monitor.targetReached.connect(lambda heater, seconds: reached.append((heater, seconds)))
+    monitor.settled.connect(lambda: settled.append(monitor.now))
+    monitor.setTarget(Heater.BED, 60.0, now=0.0)
+
+    # Heating at 0.5 degrees per second, reaching the target at 70 s
+    for second in range(0, 120):
+        monitor.update(temperatures(min(60.0, 25.0 + 0.5 * second), 60.0), now=float(second))
+        if second == 20:
+            assert(monitor.timeToTarget(Heater.BED) == pytest.approx(50.0))
+
+    assert(reached == [(Heater.BED, 68.0)])
+
+    # Settled once the trend over the window is flat enough
+    assert(len(settled) == 1)
+    assert(70.0 < settled[0] < 90.0)
+    assert(monitor.stable())
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    samples: list # Bed temperatures, one per second
+    expected: bool = field(default=False)
+
+testPoints = [
+    TestPoint(samples = [60.0] * 21, expected = True),
+    TestPoint(samples = [59.6, 60.4] * 10 + [60.0], expected = True),
+    # Too few samples
+    TestPoint(samples = [60.0] * 5, expected = False),
+    # Oscillating too much
+    TestPoint(samples = [59.0, 61.0] * 10 + [60.0], expected = False),
+    # Still rising within tolerance
+    TestPoint(samples = [59.0 + 0.05 * second for second in range(21)], expected = False),
+    # Flat but off target
+    TestPoint(samples = [58.5] * 21, expected = False)
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_stable(qapp, testPoint):
+    monitor = ThermalMonitor(tolerance=1.0, window=20.0, maxSlope=0.02, maxStdDev=0.5)
+    for second, temperature in enumerate(testPoint.samples):
+        monitor.update(temperatures(temperature, 60.0), now=float(second))
+    assert(monitor.stable() == testPoint.expected)
+
+def test_targetChange(qapp):
+    monitor = ThermalMonitor(window=2.0)
+    settled = []
+    monitor.settled.connect(lambda: settled.append(True))
+    for second in range(3):
+        monitor.update(temperatures(60.0, 60.0), now=float(second))
+    assert(monitor.stable())
+    assert(settled == [True])
+
+    monitor.setTarget(Heater.NOZZLE, 200.0, now=3.0)
+    assert(not monitor.stable())
+    assert('Nozzle' in monitor.describe())
+
+    # Turning the heater off settles again
+    monitor.setTarget(Heater.NOZZLE, 0.0, now=4.0)
+    assert(settled == [True, True])
\ No newline at end of file
@@ -0,0 +1,39 @@
+from Common import Tracer
+import json
+import threading
+
+def test_spans():
+    tracer = Tracer.Tracer()
+    tracer.span('G28', 'gcode', 1.0, 1.5)
+    tracer.span('ProbeMachine', 'machine', 0.5, 2.0, id_=7, outcome='ok')
+    tracer.instant('TX', 'serial', 0.25, line='G28')
+
+    events = tracer.events()
+    assert(events[0]['ph'] == 'M' and events[0]['args']['name'] == threading.current_thread().name)
+    assert([(event['ph'], event['ts']) for event in events[1:]] == [('i', 250000.0), ('b', 500000.0), ('X', 1000000.0), ('e', 2000000.0)])
+    assert(events[2]['id'] == events[4]['id'] == '0x7')
+    assert(events[2]['args'] == {'outcome': 'ok'} and events[3]['dur'] == 500000.0)
+    assert(events[1]['s'] == 't' and events[1]['args'] == {'line': 'G28'})
+
+def test_maxEvents():
+    tracer = Tracer.Tracer(maxEvents=2)
+    for index in range(3):
+        tracer.instant(str(index), 'serial', index)
+
+    assert([event['name'] for event in tracer.events()[1:]] == ['1', '2'])
+
+    tracer.clear()
+    assert(len(tracer.events()) == 1) # Thread names are kept
+
+def test_configure(tmp_path):
+    path = tmp_path / 'trace.json'
+    tracer = Tracer.configure(file=path)
+    assert(Tracer.defaultTracer() is tracer)
+
+    tracer.instant('RX', 'serial', 1.0, line='ok')
+    Tracer.configure()
+    assert(Tracer.defaultTracer() is None)
+
+    trace = json.loads(path.read_text())
+    assert(trace['displayTimeUnit'] == 'ms')
+    assert([event['name'] for event in trace['traceEvents']] == ['thread_name', 'RX'])
\ No newline at end of file
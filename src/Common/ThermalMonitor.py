@@ -0,0 +1,175 @@
+from PySide6 import QtCore
+import collections
+from enum import StrEnum
+import statistics
+import time
+
+class Heater(StrEnum):
+    BED = 'Bed'
+    NOZZLE = 'Nozzle'
+
+class TemperatureHistory:
+    """ Bounded ring buffer of (time, temperature) samples, oldest first. """
+
+    DEFAULT_CAPACITY = 1200 # 20 minutes at one sample per second
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.samples = collections.deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def append(self, time_, temperature):
+        self.samples.append((time_, temperature))
+
+    def latest(self):
+        return self.samples[-1] if len(self.samples) > 0 else None
+
+    def window(self, seconds, now):
+        """ Returns the samples of the last seconds before now. """
+
+        window = []
+        for sample in reversed(self.samples):
+            if now - sample[0] > seconds:
+                break
+            window.append(sample)
+        window.reverse()
+        return window
+
+    @staticmethod
+    def slope(samples):
+        """ Returns the least squares temperature change per second of
+            samples, None if it can't be estimated. """
+
+        if len(samples) < 2 or samples[0][0] == samples[-1][0]:
+            return None
+        return statistics.linear_regression([sample[0] for sample in samples], [sample[1] for sample in samples]).slope
+
+class HeaterState:
+    def __init__(self, capacity=TemperatureHistory.DEFAULT_CAPACITY):
+        self.target = 0.0
+        self.targetTime = None
+        self.reachedTime = None # When the temperature first got within tolerance
+        self.history = TemperatureHistory(capacity)
+
+class ThermalMonitor(QtCore.QObject):
+    """ Keeps the temperature history of the bed and nozzle and detects when
+        they have settled enough to probe.
+
+        A heater that is on is stable once the samples of the last window
+        seconds span at least half of it and their mean is within tolerance
+        of the target, their trend within maxSlope per second and their
+        standard deviation within maxStdDev. Heaters that are off are always
+        stable. settled is emitted whenever the heaters become stable. """
+
+    targetReached = QtCore.Signal(str, float) # heater, seconds since the target was set
+    settled = QtCore.Signal()
+
+    RATE_WINDOW = 10.0 # Seconds of history used to estimate the heating rate
+
+    def __init__(self, *args, tolerance=1.0, window=20.0, maxSlope=0.02, maxStdDev=0.5, capacity=TemperatureHistory.DEFAULT_CAPACITY, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.tolerance = tolerance
+        self.window = window
+        self.maxSlope = maxSlope
+        self.maxStdDev = maxStdDev
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.heaters = {heater: HeaterState(self.capacity) for heater in Heater}
+        self.now = None
+        self._settled = True
+
+    def history(self, heater):
+        return self.heaters[heater].history
+
+    def setTarget(self, heater, target, now=None):
+        state = self.heaters[heater]
+        if target != state.target:
+            state.target = target
+            state.targetTime = time.monotonic() if now is None else now
+            state.reachedTime = None
+            self._updateSettled()
+
+    def update(self, result, now=None):
+        """ Records a GetTemperaturesResult. """
+
+        self.now = time.monotonic() if now is None else now
+        for heater, actual, desired in [(Heater.BED, result.bedActual, result.bedDesired),
+                                        (Heater.NOZZLE, result.toolActual, result.toolDesired)]:
+            self.setTarget(heater, desired, self.now)
+            state = self.heaters[heater]
+            state.history.append(self.now, actual)
+
+            if state.target > 0.0 and state.reachedTime is None and abs(actual - state.target) <= self.tolerance:
+                state.reachedTime = self.now
+                self.targetReached.emit(heater, state.reachedTime - state.targetTime)
+
+        self._updateSettled()
+
+    def heating(self):
+        return any(state.target > 0.0 for state in self.heaters.values())
+
+    def stable(self):
+        return all(self.heaterStable(heater) for heater in Heater)
+
+    def heaterStable(self, heater):
+        state = self.heaters[heater]
+        if state.target <= 0.0:
+            return True
+        elif self.now is None:
+            return False
+
+        samples = state.history.window(self.window, self.now)
+        if len(samples) < 3 or samples[-1][0] - samples[0][0] < self.window / 2:
+            return False
+
+        temperatures = [sample[1] for sample in samples]
+        slope = TemperatureHistory.slope(samples)
+        return abs(statistics.mean(temperatures) - state.target) <= self.tolerance and \
+               slope is not None and abs(slope) <= self.maxSlope and \
+               statistics.stdev(temperatures) <= self.maxStdDev
+
+    def timeToTarget(self, heater):
+        """ Returns the estimated seconds until heater reaches its target,
+            extrapolating the recent heating rate, or None if unknown. """
+
+        state = self.heaters[heater]
+        latest = state.history.latest()
+        if state.target <= 0.0 or latest is None:
+            return None
+        elif abs(latest[1] - state.target) <= self.tolerance:
+            return 0.0
+
+        rate = TemperatureHistory.slope(state.history.window(self.RATE_WINDOW, self.now))
+        remaining = state.target - latest[1]
+        if rate is None or rate == 0.0 or (remaining > 0.0) != (rate > 0.0):
+            return None
+        return remaining / rate
+
+    def describe(self):
+        """ Returns a description of the heaters that aren't stable yet. """
+
+        parts = []
+        for heater in Heater:
+            if self.heaterStable(heater):
+                continue
+
+            state = self.heaters[heater]
+            latest = state.history.latest()
+            timeToTarget = self.timeToTarget(heater)
+            part = f'{heater}: {"?" if latest is None else f"{latest[1]:.1f}"}/{state.target:.1f} \N{DEGREE SIGN}C'
+            if timeToTarget == 0.0:
+                part += ', settling'
+            elif timeToTarget is not None:
+                part += f', about {timeToTarget:.0f} s to target'
+            parts.append(part)
+        return '; '.join(parts)
+
+    def _updateSettled(self):
+        settled = self.stable()
+        if settled and not self._settled:
+            self.settled.emit()
+        self._settled = settled
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+from PySide6 import QtCore
+import atexit
+import collections
+import json
+import os
+import pathlib
+import threading
+
+class Tracer:
+    """ Collects begin/end spans and instant events in the Chrome trace
+        event format, which can be loaded into Perfetto or about:tracing.
+        Times are time.perf_counter() values. Only the last maxEvents
+        events are kept. """
+
+    def __init__(self, path=None, *, maxEvents=1000000):
+        self.path = None if path is None else pathlib.Path(path)
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._events = collections.deque(maxlen=maxEvents)
+        self._threadNames = {} # thread id: name
+
+    def _threadId(self):
+        """ Returns the trace id of the current thread, naming it on first use. """
+
+        threadId = threading.get_native_id()
+        if threadId not in self._threadNames:
+            # Worker threads are usually QThreads named by their owner
+            self._threadNames[threadId] = QtCore.QThread.currentThread().objectName() or threading.current_thread().name
+        return threadId
+
+    @staticmethod
+    def _timestamp(seconds):
+        return round(seconds * 1e6, 3) # us
+
+    def span(self, name, category, start, end, *, id_=None, **args):
+        """ Records a span from start to end. Spans with an id are drawn on
+            their own track, spans with the same category and id nest. """
+
+        with self._lock:
+            event = {'name': name, 'cat': category, 'pid': self.pid, 'tid': self._threadId(), 'ts': self._timestamp(start)}
+            if len(args) > 0:
+                event['args'] = args
+
+            if id_ is None:
+                self._events.append({**event, 'ph': 'X', 'dur': self._timestamp(end - start)})
+            else:
+                id_ = hex(id_)
+                self._events.append({**event, 'ph': 'b', 'id': id_})
+                self._events.append({'name': name, 'cat': category, 'pid': self.pid, 'tid': event['tid'],
+                                     'ts': self._timestamp(end), 'ph': 'e', 'id': id_})
+
+    def instant(self, name, category, time, **args):
+        with self._lock:
+            event = {'name': name, 'cat': category, 'ph': 'i', 's': 't',
+                     'pid': self.pid, 'tid': self._threadId(), 'ts': self._timestamp(time)}
+            if len(args) > 0:
+                event['args'] = args
+            self._events.append(event)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    def events(self):
+        """ Returns the thread name metadata followed by the events in time order. """
+
+        with self._lock:
+            events = sorted(self._events, key=lambda event: event['ts'])
+            threadNames = dict(self._threadNames)
+
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': threadId, 'args': {'name': name}}
+                    for threadId, name in threadNames.items()]
+        return metadata + events
+
+    def toJson(self):
+        return json.dumps({'traceEvents': self.events(), 'displayTimeUnit': 'ms'})
+
+    def save(self, path):
+        pathlib.Path(path).write_text(self.toJson(), encoding='utf-8')
+
+    def close(self):
+        if self.path is not None:
+            self.save(self.path)
+
+_defaultTracer = None
+
+def defaultTracer():
+    return _defaultTracer
+
+def configure(file=None, maxEvents=None):
+    """ Configures the tracer used by the printers. Tracing is disabled when
+        no file is given, otherwise the trace is written to file on exit. """
+
+    global _defaultTracer
+
+    if _defaultTracer is not None:
+        atexit.unregister(_defaultTracer.close)
+        _defaultTracer.close()
+        _defaultTracer = None
+
+    if file is None:
+        return None
+
+    _defaultTracer = Tracer(file) if maxEvents is None else Tracer(file, maxEvents=maxEvents)
+    atexit.register(_defaultTracer.close)
+    return _defaultTracer
+
+if __name__ == '__main__':
+    # Main only imports
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Summarize a trace file')
+    parser.add_argument('file', type=pathlib.Path, help='trace file')
+    parser.add_argument('--category', default=None, help='only summarize spans of this category')
+    parser.add_argument('--top', type=int, default=20, help='number of span names to show (default: %(default)s)')
+    args = parser.parse_args()
+
+    try:
+        events = json.loads(args.file.read_text(encoding='utf-8'))['traceEvents']
+    except (OSError, ValueError, KeyError) as exception:
+        sys.exit(f'Error: {exception}')
+
+    # Total time and count per span name
+    totals = collections.defaultdict(lambda: [0, 0.0])
+    begins = {}
+    for event in events:
+        if args.category is not None and event.get('cat') != args.category:
+            continue
+
+        key = (event.get('cat'), event.get('id'), event['name'])
+        if event['ph'] == 'X':
+            duration = event['dur']
+        elif event['ph'] == 'b':
+            begins.setdefault(key, []).append(event['ts'])
+            continue
+        elif event['ph'] == 'e' and len(begins.get(key, [])) > 0:
+            duration = event['ts'] - begins[key].pop()
+        else:
+            continue
+
+        totals[(event['cat'], event['name'])][0] += 1
+        totals[(event['cat'], event['name'])][1] += duration
+
+    print(f'{"category":10} {"name":40} {"count":>7} {"total (s)":>10} {"mean (ms)":>10}')
+    for (category, name), (count, total) in sorted(totals.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f'{category:10} {name[:40]:40} {count:7} {total / 1e6:10.3f} {total / count / 1e3:10.2f}')
\ No newline at end of file
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+from Common.Metrics import metrics as defaultMetrics
+from PySide6 import QtCore
+from PySide6 import QtWidgets
+import pathlib
+
+class MetricsDialog(QtWidgets.QDialog):
+    """ Live view of the latency histograms and counters of a metrics
+        registry, refreshed while the dialog is visible. """
+
+    REFRESH_INTERVAL = 500 # ms
+    HISTOGRAM_COLUMNS = ['Series', 'Count', 'Mean (ms)', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'Max (ms)']
+    COUNTER_COLUMNS = ['Counter', 'Value']
+
+    def __init__(self, *args, metrics=defaultMetrics, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.metrics = metrics
+        self.setWindowTitle('Metrics')
+
+        self.__createWidgets()
+        self.__layoutWidgets()
+
+        self.refreshTimer = QtCore.QTimer(self)
+        self.refreshTimer.setInterval(self.REFRESH_INTERVAL)
+        self.refreshTimer.timeout.connect(self.refresh)
+
+    def __createWidgets(self):
+        self.histogramTable = self.__createTable(self.HISTOGRAM_COLUMNS)
+        self.counterTable = self.__createTable(self.COUNTER_COLUMNS)
+
+        self.clearButton = QtWidgets.QPushButton('Clear')
+        self.clearButton.clicked.connect(self._clear)
+        self.saveJsonButton = QtWidgets.QPushButton('Save JSON')
+        self.saveJsonButton.clicked.connect(lambda : self._save('JSON (*.json)', self.metrics.toJson(indent=2)))
+        self.saveOpenMetricsButton = QtWidgets.QPushButton('Save OpenMetrics')
+        self.saveOpenMetricsButton.clicked.connect(lambda : self._save('OpenMetrics (*.txt)', self.metrics.toOpenMetrics()))
+        self.closeButton = QtWidgets.QPushButton('Close')
+        self.closeButton.clicked.connect(self.accept)
+
+    def __layoutWidgets(self):
+        splitter = QtWidgets.QSplitter(QtCore.Qt.Vertical)
+        splitter.addWidget(self.histogramTable)
+        splitter.addWidget(self.counterTable)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 1)
+
+        buttonLayout = QtWidgets.QHBoxLayout()
+        buttonLayout.addWidget(self.clearButton)
+        buttonLayout.addStretch()
+        buttonLayout.addWidget(self.saveJsonButton)
+        buttonLayout.addWidget(self.saveOpenMetricsButton)
+        buttonLayout.addWidget(self.closeButton)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(splitter)
+        layout.addLayout(buttonLayout)
+        self.setLayout(layout)
+        self.resize(800, 500)
+
+    @staticmethod
+    def __createTable(columns):
+        table = QtWidgets.QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        return table
+
+    @staticmethod
+    def seriesName(series):
+        labels = ', '.join(f'{key}={value}' for key, value in series['labels'].items())
+        return series['name'] if len(labels) == 0 else f'{series["name"]} {{{labels}}}'
+
+    @staticmethod
+    def __setRow(table, row, values):
+        for column, value in enumerate(values):
+            item = QtWidgets.QTableWidgetItem(value)
+            if column > 0:
+                item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+            table.setItem(row, column, item)
+
+    def refresh(self):
+        def milliseconds(seconds):
+            return '' if seconds is None else f'{seconds * 1000:.2f}'
+
+        snapshot = self.metrics.snapshot()
+
+        self.histogramTable.setRowCount(len(snapshot['histograms']))
+        for row, histogram in enumerate(snapshot['histograms']):
+            self.__setRow(self.histogramTable, row, [self.seriesName(histogram),
+                                                     str(histogram['count']),
+                                                     milliseconds(histogram['mean']),
+                                                     milliseconds(histogram['p50']),
+                                                     milliseconds(histogram['p90']),
+                                                     milliseconds(histogram['p99']),
+                                                     milliseconds(histogram['max'])])
+
+        self.counterTable.setRowCount(len(snapshot['counters']))
+        for row, counter in enumerate(snapshot['counters']):
+            self.__setRow(self.counterTable, row, [self.seriesName(counter), str(counter['value'])])
+
+    def _clear(self):
+        self.metrics.clear()
+        self.refresh()
+
+    def _save(self, fileFilter, text):
+        filePath, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Save metrics', '', fileFilter)
+        if filePath:
+            pathlib.Path(filePath).write_text(text, encoding='utf-8')
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refreshTimer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refreshTimer.stop()
+        super().hideEvent(event)
+
+if __name__ == '__main__':
+    # Main only imports
+    import random
+    import sys
+
+    app = QtWidgets.QApplication(sys.argv)
+
+    def record():
+        for command in ['G28', 'G30', 'M114']:
+            defaultMetrics.observe('marlin2_command_round_trip_seconds', random.lognormvariate(-5, 1), command=command)
+            defaultMetrics.increment('marlin2_commands', command=command)
+
+    timer = QtCore.QTimer()
+    timer.setInterval(50)
+    timer.timeout.connect(record)
+    timer.start()
+
+    dialog = MetricsDialog()
+    dialog.show()
+
+    try:
+       sys.exit(app.exec())
+    except KeyboardInterrupt:
+        sys.exit(1)
\ No newline at end of file
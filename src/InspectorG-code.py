@@ -8,6 +8,8 @@ from Dialogs.ErrorDialog import ErrorDialog
 from Dialogs.FatalErrorDialog import FatalErrorDialog
 from Printers.Marlin2.Marlin2LinePrinter import Marlin2LinePrinter
 from Printers.Moonraker.MoonrakerLinePrinter import MoonrakerLinePrinter
+from Printers.Marlin2 import WireTap
+from Common import Tracer
 from Common import PrinterInfo
 from Widgets.PrinterConnectWidget import PrinterConnectWidget
 from Common.PrinterInfo import ConnectionMode
@@ -228,7 +230,9 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     # Configure logging
-    Common.configureLogging(level=args.log_level, console=args.log_console, file=args.log_file)
+    Common.configureLogging(**parser.loggingOptions(args))
+    WireTap.configure(file=args.wire_capture, ringSize=args.wire_capture_ring)
+    Tracer.configure(file=args.trace)
     logging.getLogger(QtCore.QCoreApplication.applicationName()).info(f'Starting {app.applicationName()}')
 
     # Verify the printers directory exists
@@ -352,7 +352,7 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     # Configure logging
-    Common.configureLogging(level=args.log_level, console=args.log_console, file=args.log_file)
+    Common.configureLogging(**parser.loggingOptions(args))
     logging.getLogger(QtCore.QCoreApplication.applicationName()).info(f'Starting {app.applicationName()}')
 
     printerInfoWizard = PrinterInfoWizard()
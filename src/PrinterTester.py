@@ -3,6 +3,8 @@ from Common.PrinterInfo import ConnectionMode
 from Widgets.PrinterConnectWidget import PrinterConnectWidget
 from Printers.Moonraker.MoonrakerPrinter import MoonrakerPrinter
 from Printers.Marlin2.Marlin2Printer import Marlin2Printer
+from Printers.Marlin2 import WireTap
+from Common import Tracer
 from Dialogs.AboutDialog import AboutDialog
 from Dialogs.FatalErrorDialog import FatalErrorDialog
 from Common import Common
@@ -518,7 +520,9 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     # Configure logging
-    Common.configureLogging(level=args.log_level, console=args.log_console, file=args.log_file)
+    Common.configureLogging(**parser.loggingOptions(args))
+    WireTap.configure(file=args.wire_capture, ringSize=args.wire_capture_ring)
+    Tracer.configure(file=args.trace)
     logging.getLogger(QtCore.QCoreApplication.applicationName()).info(f'Starting {app.applicationName()}')
 
     # Verify the printers directory exists
@@ -1,10 +1,14 @@
 from .Printer import Printer
 from Common.Points import Point2F
+from Common.ProbeClearancePlanner import ProbeClearancePlanner
+from Common.ProbePathPlanner import planProbeOrder
 from Common.LoggedFunction import loggedFunction
+from Common.Log import getLogger
 from PySide6 import QtCore
 import abc
 import enum
-import logging
+import math
+import statistics
 from typing import NamedTuple
 
 class CommandType(enum.StrEnum):
@@ -21,8 +25,14 @@ class CommandType(enum.StrEnum):
     GET_DEFAULT_PROBE_Z_HEIGHT = 'getDefaultProbeZHeight'
     GET_DEFAULT_PROBE_XY_SPEED = 'getDefaultProbeXYSpeed'
     PROBE = 'probe'
+    PROBE_MANY = 'probeMany'
+    PROBE_MESH = 'probeMesh'
     MOVE = 'move'
 
+class ProbeOrder(enum.StrEnum):
+    GIVEN = 'given'
+    SHORTEST = 'shortest' # Minimize the estimated travel time
+
 class GetTemperaturesResult(NamedTuple):
     toolActual: float
     toolDesired: float
@@ -40,6 +50,17 @@ class ProbeResult(NamedTuple):
     x: float
     y: float
     z: float
+    sampleCount: int = 1
+    spread: float = None # Highest minus lowest sample, None if unknown
+
+class ProbeMeshResult(NamedTuple):
+    rowCount: int
+    columnCount: int
+    minX: float
+    maxX: float
+    minY: float
+    maxY: float
+    z: list[list[float]] # [row][column], rows from minY to maxY
 
 class GetCurrentPositionResult(NamedTuple):
     x: float
@@ -63,6 +84,7 @@ class GetMeshCoordinatesResult(NamedTuple):
     minY: float
     maxY: float
     meshCoordinates: list[list[Point2F]]
+    storedMesh: list[list[float]] = None # [row][column], the printer's current mesh if known
 
 class CommandPrinter(Printer):
     __metaclass__ = abc.ABCMeta
@@ -84,19 +106,32 @@ class CommandPrinter(Printer):
     gotDefaultProbeZHeight = QtCore.Signal(str, dict, float) # id, context, result
     gotDefaultProbeXYSpeed = QtCore.Signal(str, dict, float) # id, context, result
     probed = QtCore.Signal(str, dict, ProbeResult) # id, context, result
+    probedPoint = QtCore.Signal(str, dict, int, ProbeResult) # id, context, point index, result
+    probedMany = QtCore.Signal(str, dict, list) # id, context, results
+    probedMesh = QtCore.Signal(str, dict, ProbeMeshResult) # id, context, result
     moved = QtCore.Signal(str, dict) # id, context
 
+    # Id of the gotTemperatures emissions the printer reports on its own
+    TEMPERATURE_AUTO_REPORT_ID = 'temperatureAutoReport'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         # Get logger
-        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger = getLogger(self)
 
         # Defaults (invalid until init is called)
         self._probeSampleCount = None
         self._probeXYSpeed = None
         self._probeZHeight = None
 
+        # Adaptive probe sampling (disabled until set)
+        self._probeMaxSampleCount = None
+        self._probeTolerance = None
+
+        # Travel between probe points at the full probe height until set
+        self._probeClearancePlanner = None
+
         # Probe offsets (invalid until init is called)
         self._probeXOffset = None
         self._probeYOffset = None
@@ -110,6 +145,9 @@ class CommandPrinter(Printer):
         self._travelBoundsMinZ = None
         self._travelBoundsMaxZ = None
 
+        # Estimated XY position of the nozzle (None when unknown)
+        self._nozzlePosition = None
+
     @loggedFunction
     def abort(self):
         self._abort()
@@ -128,6 +166,15 @@ class CommandPrinter(Printer):
     def probeXYSpeed(self):
         return self._probeXYSpeed
 
+    def probeMaxSampleCount(self):
+        return self._probeMaxSampleCount
+
+    def probeTolerance(self):
+        return self._probeTolerance
+
+    def probeClearancePlanner(self):
+        return self._probeClearancePlanner
+
     def probeOffsets(self):
         return self._probeXOffset, self._probeYOffset, self._probeZOffset
 
@@ -162,6 +209,30 @@ class CommandPrinter(Printer):
     def setProbeSampleCount(self, count):
         self._probeSampleCount = count
 
+    @loggedFunction
+    def setProbeAdaptiveSampling(self, maxSampleCount, tolerance):
+        """ Lets each probed point take between probeSampleCount and
+            maxSampleCount samples, stopping once the standard error of their
+            mean is at most tolerance. A tolerance of None restores taking
+            exactly probeSampleCount samples. """
+
+        if tolerance is not None and (maxSampleCount is None or maxSampleCount < 1 or tolerance < 0.0):
+            raise ValueError('Adaptive probe sampling requires a positive maximum sample count and tolerance.')
+        if tolerance is not None and self._probeSampleCount is not None and maxSampleCount < self._probeSampleCount:
+            raise ValueError(f'The maximum probe sample count ({maxSampleCount}) is below the probe sample count ({self._probeSampleCount}).')
+
+        self._probeMaxSampleCount = None if tolerance is None else maxSampleCount
+        self._probeTolerance = tolerance
+
+    @loggedFunction
+    def setProbeClearance(self, margin, coverageRadius=ProbeClearancePlanner.DEFAULT_COVERAGE_RADIUS):
+        """ Lets probeMany travel between points margin above the highest
+            known bed height instead of at the probe Z height (see
+            ProbeClearancePlanner). A margin of None restores the full
+            probe Z height. """
+
+        self._probeClearancePlanner = None if margin is None else ProbeClearancePlanner(margin, coverageRadius)
+
     @loggedFunction
     def setProbeZHeight(self, height):
         self._probeZHeight = height
@@ -174,6 +245,7 @@ class CommandPrinter(Printer):
     @loggedFunction
     def init(self, id_, *, context=None):
         """ Resets default values for probe settings. """
+        self._nozzlePosition = None
         self._init(id_=id_, context=context)
 
     @abc.abstractmethod
@@ -183,6 +255,8 @@ class CommandPrinter(Printer):
     # Home
     @loggedFunction
     def home(self, id_, *, context=None, x=False, y=False, z=False):
+        if x or y:
+            self._nozzlePosition = None
         self._home(id_=id_, context=context, x=x, y=y, z=z)
 
     @abc.abstractmethod
@@ -198,6 +272,17 @@ class CommandPrinter(Printer):
     def _getTemperatures(self, id_, *, context):
         raise NotImplementedError
 
+    @loggedFunction
+    def startTemperatureAutoReport(self, interval):
+        """ Asks the printer to report its temperatures every interval
+            seconds without being polled, each report is emitted through
+            gotTemperatures with the id TEMPERATURE_AUTO_REPORT_ID. Returns
+            False if the printer can't, getTemperatures must then be polled. """
+        return self._startTemperatureAutoReport(interval)
+
+    def _startTemperatureAutoReport(self, interval):
+        return False
+
     # Get probe offsets
     @loggedFunction
     def getProbeOffsets(self, id_, *, context=None):
@@ -282,24 +367,110 @@ class CommandPrinter(Printer):
     # Probe
     @loggedFunction
     def probe(self, id_, *, context=None, x, y):
+        self._nozzlePosition = self._probeNozzlePosition(Point2F(x, y))
         self._probe(id_=id_, context=context, x=x, y=y)
 
     @abc.abstractmethod
     def _probe(self, id_, *, context, x, y):
         raise NotImplementedError
 
+    # Probe many
+    @loggedFunction
+    def probeMany(self, id_, *, context=None, points, order=ProbeOrder.GIVEN):
+        """ Probes all points as a single batch. probedPoint is emitted as each
+            point finishes and probedMany with the list of results, in the
+            same order as points, once all points have been probed. order is
+            either a ProbeOrder or a list of point indices. """
+        points = list(points)
+        order = self.resolveProbeOrder(points, order)
+        self._nozzlePosition = self._probeNozzlePosition(points[order[-1]])
+        self._probeMany(id_=id_, context=context, points=points, order=order)
+
+    @abc.abstractmethod
+    def _probeMany(self, id_, *, context, points, order):
+        raise NotImplementedError
+
+    def resolveProbeOrder(self, points, order):
+        """ Returns the list of point indices probeMany visits for order. """
+
+        if len(points) == 0:
+            raise ValueError('At least one probe point is required.')
+
+        if order == ProbeOrder.GIVEN:
+            return list(range(len(points)))
+
+        if order == ProbeOrder.SHORTEST:
+            return planProbeOrder(points, probeOffset=self._probeXYOffset(), start=self._nozzlePosition)
+
+        order = list(order)
+        if sorted(order) != list(range(len(points))):
+            raise ValueError('Probe order must contain each point index exactly once.')
+        return order
+
+    def _probeXYOffset(self):
+        return Point2F(self._probeXOffset or 0.0, self._probeYOffset or 0.0)
+
+    def _probeNozzlePosition(self, point):
+        offset = self._probeXYOffset()
+        return Point2F(point.x - offset.x, point.y - offset.y)
+
+    # Probe mesh
+    def hasNativeMeshProbing(self):
+        """ Returns True if probeMesh can be used to probe the whole mesh
+            with the printer's own mesh calibration. """
+        return False
+
+    @loggedFunction
+    def probeMesh(self, id_, *, context=None):
+        if not self.hasNativeMeshProbing():
+            message = f'{type(self).__name__} does not support native mesh probing.'
+            self.logger.error(message)
+            self.errorOccurred.emit(CommandType.PROBE_MESH, id_, context, message)
+            return
+        self._probeMesh(id_=id_, context=context)
+
+    def _probeMesh(self, id_, *, context):
+        """ Only called when hasNativeMeshProbing returns True. """
+        raise NotImplementedError
+
     # Move
     @loggedFunction
     def move(self, id_, *, context=None, x=None, y=None, z=None, e=None, f=None, wait=True, relative=False):
+        if not relative and x is not None and y is not None:
+            self._nozzlePosition = Point2F(x, y)
+        elif x is not None or y is not None:
+            self._nozzlePosition = None
         self._move(id_=id_, context=context, x=x, y=y, z=z, e=e, f=f, wait=wait, relative=relative)
 
     @abc.abstractmethod
     def _move(self, id_, *, context, x, y, z, e, f, wait, relative):
         raise NotImplementedError
 
+    @staticmethod
+    def probeSamplingDone(samples, *, sampleCount, maxSampleCount=None, tolerance=None):
+        """ Returns True once enough samples were taken for a point (see
+            setProbeAdaptiveSampling). """
+
+        if tolerance is None:
+            return len(samples) >= sampleCount
+        elif len(samples) >= maxSampleCount:
+            return True
+        elif len(samples) < max(sampleCount, 2):
+            return False
+
+        return statistics.stdev(samples) / math.sqrt(len(samples)) <= tolerance
+
+    @staticmethod
+    def probeResult(x, y, samples):
+        return ProbeResult(x = x,
+                           y = y,
+                           z = statistics.mean(samples),
+                           sampleCount = len(samples),
+                           spread = max(samples) - min(samples))
+
     @staticmethod
     @loggedFunction(level='debug')
-    def calculateMeshCoordinates(*, rowCount, columnCount, minX, maxX, minY, maxY):
+    def calculateMeshCoordinates(*, rowCount, columnCount, minX, maxX, minY, maxY, storedMesh=None):
         meshCoordinates = [[None for column in range(columnCount)] for row in range(rowCount)]
 
         xBase = minX
@@ -318,7 +489,8 @@ class CommandPrinter(Printer):
                                         maxX = maxX,
                                         minY = minY,
                                         maxY = maxY,
-                                        meshCoordinates = meshCoordinates)
+                                        meshCoordinates = meshCoordinates,
+                                        storedMesh = storedMesh)
 
     @loggedFunction(level='debug')
     def isProbeable(self, *, x, y):
@@ -1,8 +1,8 @@
 from .Printer import Printer
 from Common.LoggedFunction import loggedFunction
+from Common.Log import getLogger
 from PySide6 import QtCore
 import abc
-import logging
 
 class LinePrinter(Printer):
     __metaclass__ = abc.ABCMeta
@@ -15,7 +15,7 @@ class LinePrinter(Printer):
         super().__init__(*args, **kwargs)
 
         # Get logger
-        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger = getLogger(self)
 
     @loggedFunction
     def abort(self):
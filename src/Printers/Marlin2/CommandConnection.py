@@ -11,20 +11,33 @@ from .Commands.CommandG90 import CommandG90
 from .Commands.CommandG91 import CommandG91
 from .Commands.CommandM104 import CommandM104
 from .Commands.CommandM105 import CommandM105
+from .Commands.CommandM110 import CommandM110
 from .Commands.CommandM114 import CommandM114
+from .Commands.CommandM115 import CommandM115
 from .Commands.CommandM118 import CommandM118
 from .Commands.CommandM140 import CommandM140
+from .Commands.CommandM155 import CommandM155
 from .Commands.CommandM211 import CommandM211
 from .Commands.CommandM400 import CommandM400
 from .Commands.CommandM420 import CommandM420
 from .Commands.CommandM851 import CommandM851
+from .Commands.GCodeError import GCodeError
 from .SerialConnection import SerialConnection
+from Common.LatencyStats import LatencyStats
+from Common.Metrics import metrics
 from PySide6 import QtCore
+import collections
+import functools
+import operator
 import queue
+import time
 
 class CommandConnection(SerialConnection):
-    errorOccurred = QtCore.Signal(CommandBase)
-    finished = QtCore.Signal(CommandBase)
+    errorOccurred = QtCore.Signal(object) # CommandBase
+    queued = QtCore.Signal(object) # CommandBase
+    finished = QtCore.Signal(object) # CommandBase
+    temperatureReported = QtCore.Signal(dict)
+    _sendRequested = QtCore.Signal()
     finishedG0 = QtCore.Signal(CommandG0)
     finishedG28 = QtCore.Signal(CommandG28)
     finishedG30 = QtCore.Signal(CommandG30)
@@ -33,53 +46,258 @@ class CommandConnection(SerialConnection):
     finishedG91 = QtCore.Signal(CommandG91)
     finishedM104 = QtCore.Signal(CommandM104)
     finishedM105 = QtCore.Signal(CommandM105)
+    finishedM110 = QtCore.Signal(CommandM110)
     finishedM114 = QtCore.Signal(CommandM114)
+    finishedM115 = QtCore.Signal(CommandM115)
     finishedM118 = QtCore.Signal(CommandM118)
     finishedM140 = QtCore.Signal(CommandM140)
+    finishedM155 = QtCore.Signal(CommandM155)
     finishedM211 = QtCore.Signal(CommandM211)
     finishedM400 = QtCore.Signal(CommandM400)
     finishedM420 = QtCore.Signal(CommandM420)
     finishedM851 = QtCore.Signal(CommandM851)
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, pipelineDepth=1, reliable=False, historySize=64, **kwargs):
         super().__init__(*args, **kwargs)
 
+        assert(pipelineDepth >= 1)
+        assert(historySize >= pipelineDepth)
+
         self.commandQueue = queue.SimpleQueue()
-        self.currentCommand = None
+        self.heldCommand = None # Taken from the queue, waiting for the command it is sent after
+        self.inFlight = collections.deque()
+        self.skippingToOk = False
+        self.pipelineDepth = pipelineDepth
+        self.freeBufferCount = None
+
+        # Line numbers, checksums and resend handling
+        self.reliable = reliable
+        self.lineNumber = 0
+        self.history = collections.deque(maxlen=historySize) # (line number, framed line)
+        self.droppedOkCount = 0
+        self.ignoredResendNumber = None
+        self.ignoredResendCount = 0
+
+        # Commands queued from another thread are sent once the caller
+        # returns to its event loop, after it has connected to them
+        self._sendScheduled = False
+        self._sendRequested.connect(self._trySendNext)
+
+        # Metrics
+        self.resendCount = 0
+        self.resentLineCount = 0
+        self.serialLatency = LatencyStats() # From sending a command to its last response line
+
+    def open(self, *args, **kwargs):
+        super().open(*args, **kwargs)
+
+        self.freeBufferCount = None
+        self.skippingToOk = False
+        self.serialLatency.clear()
+
+        # Reset the printer's line number
+        if self.reliable:
+            self.lineNumber = 0
+            self.history.clear()
+            self.droppedOkCount = 0
+            self.ignoredResendNumber = None
+            self.ignoredResendCount = 0
+            self.sendM110(n=0)
+
+    def close(self):
+        if self.connected():
+            if self.reliable:
+                self.logger.info(f'Resend requests: {self.resendCount}, resent lines: {self.resentLineCount}')
+            self.logger.info(f'Serial latency: {self.serialLatency}')
+        super().close()
 
     def pendingCount(self):
-        return self.commandQueue.qsize()
+        return self.commandQueue.qsize() + (0 if self.heldCommand is None else 1)
+
+    def inFlightCount(self):
+        return len(self.inFlight)
+
+    def _sendLimit(self):
+        """ Only pipeline once the printer reports its free command buffer
+            count (ADVANCED_OK), otherwise fall back to one command at a time. """
+
+        if self.freeBufferCount is None:
+            return 1
+        return max(1, min(self.pipelineDepth, self.freeBufferCount))
+
+    @staticmethod
+    def frameLine(lineNumber, request):
+        line = f'N{lineNumber} {request}'
+        checksum = functools.reduce(operator.xor, line.encode(), 0)
+        return f'{line}*{checksum}'
 
     def _processLine(self, line):
         """ Improve error handling here """
 
+        metrics.increment('marlin2_lines_received')
+
+        # Handle the transport's lines, each resend request is followed by an ok
+        if self.reliable:
+            if CommandBase.isTransportError(line):
+                self.logger.warning(f'Printer rejected a line: {line}')
+                return
+            elif CommandBase.isResendRequest(line):
+                self.droppedOkCount += 1
+                self._resend(CommandBase.parseResendRequestLine(line))
+                return
+            elif self.droppedOkCount > 0 and line.startswith('ok'):
+                self.droppedOkCount -= 1
+                self._updateFreeBufferCount(line)
+                return
+
+        # Temperature reports (M155, M109 and M190) never belong to a command
+        if CommandBase.isTemperatureAutoReport(line):
+            try:
+                self.temperatureReported.emit(CommandM105.parseTemperatures(line))
+            except GCodeError as exception:
+                self.logger.warning(f'Ignoring temperature report: {exception}')
+            return
+
+        # The lines of a command that failed before its ok, the ok included,
+        # still belong to it and must not be matched to the next command
+        if self.skippingToOk:
+            self._updateFreeBufferCount(line)
+            if line.startswith('ok'):
+                self.skippingToOk = False
+            self.logger.debug('Skipping line of a failed command - %s', line)
+            return
+
         # Skip auto reported messages when there are no commands
-        if self.currentCommand is None:
+        if len(self.inFlight) == 0:
             if line.startswith('echo:') or \
                line.startswith('//') or \
-               line.startswith(' T') or \
                line.startswith('X:'):
                 return
             raise IOError(f'Received a line without a command ({line}).')
 
-        # Send the line to the current command
-        self.currentCommand.processLine(line)
+        self._updateFreeBufferCount(line)
+
+        # Responses arrive in send order, so the oldest command owns the line
+        command = self.inFlight[0]
+        if command.firstLineTime is None:
+            command.firstLineTime = time.perf_counter()
+        command.processLine(line)
+        if command.error is not None and not line.startswith('ok'):
+            self.skippingToOk = True
+
+    def _updateFreeBufferCount(self, line):
+        if self.pipelineDepth > 1 and \
+           (advancedOk := CommandBase.parseAdvancedOkResponseLine(line)) is not None:
+            self.freeBufferCount = advancedOk['buffer']
+
+    def _resend(self, lineNumber):
+        """ Replays the history starting at lineNumber. Lines sent after a
+            rejected line are rejected too, each requesting the same resend,
+            so those duplicate requests are ignored. """
+
+        if self.ignoredResendCount > 0 and lineNumber == self.ignoredResendNumber:
+            self.ignoredResendCount -= 1
+            return
+
+        if len(self.history) == 0:
+            self.logger.warning(f'Ignoring resend request for unsent line {lineNumber}.')
+            return
+        elif self.history[0][0] > lineNumber:
+            raise IOError(f'Unable to resend line {lineNumber}, it is no longer in the history.')
+
+        lines = [framedLine for number, framedLine in self.history if number >= lineNumber]
+        if len(lines) == 0:
+            # The printer's line number is out of sync, e.g. a rejected M110
+            lines = [self.history[-1][1]]
+
+        self.resendCount += 1
+        self.resentLineCount += len(lines)
+        metrics.increment('marlin2_resend_requests')
+        metrics.increment('marlin2_lines_sent', len(lines))
+        self.ignoredResendNumber = lineNumber
+        self.ignoredResendCount = len(lines) - 1
+        self.logger.warning(f'Resending {len(lines)} line(s) starting at line {lineNumber}.')
+
+        for framedLine in lines:
+            self.write(framedLine)
+
+    def _sendRequest(self, request):
+        if self.reliable:
+            request = self.frameLine(self.lineNumber, request)
+            self.history.append((self.lineNumber, request))
+            self.lineNumber += 1
+
+        metrics.increment('marlin2_lines_sent')
+        self.write(request)
+
+    def _createCommand(self, commandType, *args, after=None, **kwargs):
+        """ Creates and queues a command. A command created with after is
+            only sent once the after command has succeeded, so it is never
+            pipelined behind it, and is dropped if the after command fails
+            or is cancelled. """
 
-    def _createCommand(self, commandType, *args, **kwargs):
         command = commandType(*args, **kwargs)
+        command.after = after
+        command.queuedTime = time.perf_counter()
         command.finished.connect(self._finished)
         command.errorOccurred.connect(self._errorOccurred)
 
-        self.logger.debug(f'Queuing command - {command}')
+        self.logger.debug('Queuing command - %s', command)
+        self.queued.emit(command)
         self.commandQueue.put(command)
-        self._trySendNext()
+        if self.isCurrentThread():
+            self._trySendNext()
+        elif not self._sendScheduled:
+            self._sendScheduled = True
+            QtCore.QTimer.singleShot(0, self._requestSend)
         return command
 
+    def _requestSend(self):
+        # Runs on the thread that queued the commands
+        self._sendScheduled = False
+        self._sendRequested.emit()
+
+    def _deleteCommand(self, command):
+        # Replies to commands created on another thread may still be queued
+        # there, so those are left to the garbage collector
+        if self._workerThread is None:
+            command.deleteLater()
+
+    def cancel(self, command):
+        """ Prevents a queued command from being sent, commands that were
+            already sent are unaffected. """
+        command.cancelled = True
+
     def _trySendNext(self):
-        if self.currentCommand is None and not self.commandQueue.empty():
-            self.currentCommand = self.commandQueue.get()
-            self.logger.info(f'Sending command - {self.currentCommand}')
-            self.write(self.currentCommand.request)
+        while len(self.inFlight) < self._sendLimit():
+            if self.heldCommand is not None:
+                command = self.heldCommand
+                self.heldCommand = None
+            elif not self.commandQueue.empty():
+                command = self.commandQueue.get()
+            else:
+                break
+
+            if command.cancelled:
+                self.logger.debug('Dropping cancelled command - %s', command)
+                self._deleteCommand(command)
+                continue
+
+            if command.after is not None:
+                if command.after.error is not None or command.after.cancelled:
+                    self.logger.info('Dropping command - %s, the command it follows failed', command)
+                    command.cancelled = True
+                    self._deleteCommand(command)
+                    continue
+                elif command.after.finishedTime is None:
+                    self.heldCommand = command
+                    break
+                command.after = None
+
+            self.inFlight.append(command)
+            self.logger.info('Sending command - %s', command)
+            command.sentTime = time.perf_counter()
+            self._sendRequest(command.request)
 
     def sendG0(self, *args, **kwargs):
         return self._createCommand(CommandG0, *args, **kwargs)
@@ -105,15 +323,24 @@ class CommandConnection(SerialConnection):
     def sendM105(self, *args, **kwargs):
         return self._createCommand(CommandM105, *args, **kwargs)
 
+    def sendM110(self, *args, **kwargs):
+        return self._createCommand(CommandM110, *args, **kwargs)
+
     def sendM114(self, *args, **kwargs):
         return self._createCommand(CommandM114, *args, **kwargs)
 
+    def sendM115(self, *args, **kwargs):
+        return self._createCommand(CommandM115, *args, **kwargs)
+
     def sendM118(self, *args, **kwargs):
         return self._createCommand(CommandM118, *args, **kwargs)
 
     def sendM140(self, *args, **kwargs):
         return self._createCommand(CommandM140, *args, **kwargs)
 
+    def sendM155(self, *args, **kwargs):
+        return self._createCommand(CommandM155, *args, **kwargs)
+
     def sendM211(self, *args, **kwargs):
         return self._createCommand(CommandM211, *args, **kwargs)
 
@@ -127,19 +354,42 @@ class CommandConnection(SerialConnection):
         return self._createCommand(CommandM851, *args, **kwargs)
 
     def _finished(self, command):
-        assert(command == self.currentCommand)
+        assert(len(self.inFlight) > 0 and command == self.inFlight[0])
 
-        self.logger.debug(f'Command {command} finished with result: {command.result}')
+        command.finishedTime = time.perf_counter()
+        self.serialLatency.add(command.finishedTime - command.sentTime)
+        self._recordMetrics(command)
+        if self.tracer is not None:
+            self._trace(command)
+        self.logger.debug('Command %s finished with result: %s', command, command.result)
 
         getattr(self, f'finished{command.NAME}').emit(command)
         self.finished.emit(command)
-        command.deleteLater()
-        self.currentCommand = None
+        self._deleteCommand(command)
+        self.inFlight.popleft()
 
         self._trySendNext()
 
+    @staticmethod
+    def _recordMetrics(command):
+        metrics.increment('marlin2_commands', command=command.NAME)
+        if command.error is not None:
+            metrics.increment('marlin2_command_errors', command=command.NAME)
+
+        metrics.observe('marlin2_command_queue_wait_seconds', command.sentTime - command.queuedTime, command=command.NAME)
+        metrics.observe('marlin2_command_first_line_seconds', command.firstLineTime - command.sentTime, command=command.NAME)
+        metrics.observe('marlin2_command_round_trip_seconds', command.finishedTime - command.sentTime, command=command.NAME)
+
+    def _trace(self, command):
+        # Nested spans on a track of their own, as pipelined commands overlap
+        self.tracer.span(command.request, 'gcode', command.queuedTime, command.finishedTime, id_=id(command),
+                         command=command.NAME, error=command.error)
+        self.tracer.span('queued', 'gcode', command.queuedTime, command.sentTime, id_=id(command))
+        self.tracer.span('sent', 'gcode', command.sentTime, command.finishedTime, id_=id(command),
+                         firstLineMs=(command.firstLineTime - command.sentTime) * 1000)
+
     def _errorOccurred(self, command):
-        assert(command == self.currentCommand)
+        assert(len(self.inFlight) > 0 and command == self.inFlight[0])
 
         self.logger.error(f'Command {command} errored with message: {command.error}')
         self.errorOccurred.emit(command)
@@ -151,6 +401,8 @@ if __name__ == '__main__':
     from Dialogs.FatalErrorDialog import FatalErrorDialog
     from Common import Common
     from Common import Version
+    from Common import Tracer
+    from Printers.Marlin2 import WireTap
     from PySide6 import QtCore
     from PySide6 import QtWidgets
     import argparse
@@ -300,6 +552,16 @@ if __name__ == '__main__':
             self.startM140SSpinBox.setMinimum(0)
             self.startM140SSpinBox.setMaximum(500)
 
+            self.startM115Button = QtWidgets.QPushButton('M115')
+            self.startM115Button.clicked.connect(self.startM115)
+
+            self.startM155Button = QtWidgets.QPushButton('M155')
+            self.startM155Button.clicked.connect(self.startM155)
+            self.startM155SSpinBox = QtWidgets.QSpinBox()
+            self.startM155SSpinBox.setMinimum(0)
+            self.startM155SSpinBox.setMaximum(60)
+            self.startM155SSpinBox.setValue(1)
+
             self.startM211Button = QtWidgets.QPushButton('M211')
             self.startM211Button.clicked.connect(self.startM211)
             self.startM211SCheckBox = QtWidgets.QCheckBox()
@@ -469,6 +731,16 @@ if __name__ == '__main__':
             startM140Layout.addWidget(self.startM140SSpinBox)
             startM140Layout.addStretch()
 
+            startM115Layout = QtWidgets.QHBoxLayout()
+            startM115Layout.addWidget(self.startM115Button)
+            startM115Layout.addStretch()
+
+            startM155Layout = QtWidgets.QHBoxLayout()
+            startM155Layout.addWidget(self.startM155Button)
+            startM155Layout.addWidget(QtWidgets.QLabel('S:'))
+            startM155Layout.addWidget(self.startM155SSpinBox)
+            startM155Layout.addStretch()
+
             startM211Layout = QtWidgets.QHBoxLayout()
             startM211Layout.addWidget(self.startM211Button)
             startM211Layout.addWidget(QtWidgets.QLabel('S:'))
@@ -525,8 +797,10 @@ if __name__ == '__main__':
             controlsLayout.addLayout(startM104Layout)
             controlsLayout.addLayout(startM105Layout)
             controlsLayout.addLayout(startM114Layout)
+            controlsLayout.addLayout(startM115Layout)
             controlsLayout.addLayout(startM118Layout)
             controlsLayout.addLayout(startM140Layout)
+            controlsLayout.addLayout(startM155Layout)
             controlsLayout.addLayout(startM211Layout)
             controlsLayout.addLayout(startM400Layout)
             controlsLayout.addLayout(startM420Layout)
@@ -561,8 +835,11 @@ if __name__ == '__main__':
             self.qtConnections.append(self.connection.finishedM104.connect(lambda command: self.logFinished('finishedM104', command)))
             self.qtConnections.append(self.connection.finishedM105.connect(lambda command: self.logFinished('finishedM105', command)))
             self.qtConnections.append(self.connection.finishedM114.connect(lambda command: self.logFinished('finishedM114', command)))
+            self.qtConnections.append(self.connection.finishedM115.connect(lambda command: self.logFinished('finishedM115', command)))
             self.qtConnections.append(self.connection.finishedM118.connect(lambda command: self.logFinished('finishedM118', command)))
             self.qtConnections.append(self.connection.finishedM140.connect(lambda command: self.logFinished('finishedM140', command)))
+            self.qtConnections.append(self.connection.finishedM155.connect(lambda command: self.logFinished('finishedM155', command)))
+            self.qtConnections.append(self.connection.temperatureReported.connect(lambda result: self.logTextEdit.append(f'Temperature report: {result}')))
             self.qtConnections.append(self.connection.finishedM211.connect(lambda command: self.logFinished('finishedM211', command)))
             self.qtConnections.append(self.connection.finishedM400.connect(lambda command: self.logFinished('finishedM400', command)))
             self.qtConnections.append(self.connection.finishedM420.connect(lambda command: self.logFinished('finishedM420', command)))
@@ -643,6 +920,9 @@ if __name__ == '__main__':
                        e=True if self.startM114ECheckBox.isChecked() else None,
                        r=True if self.startM114RCheckBox.isChecked() else None)
 
+        def startM115(self):
+            self.start('M115')
+
         def startM118(self):
             self.start('M118',
                        a1= True if self.startM118A1CheckBox.isChecked() else None,
@@ -655,6 +935,10 @@ if __name__ == '__main__':
                        i=self.startM140ISpinBox.value() if self.startM140ICheckBox.isChecked() else None,
                        s=self.startM140SSpinBox.value() if self.startM140SCheckBox.isChecked() else None)
 
+        def startM155(self):
+            self.start('M155',
+                       s=self.startM155SSpinBox.value())
+
         def startM211(self):
             self.start('M211',
                        s=self.startM211SComboBox.currentData() if self.startM211SCheckBox.isChecked() else None)
@@ -707,7 +991,9 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     # Configure logging
-    Common.configureLogging(level=args.log_level, console=args.log_console, file=args.log_file)
+    Common.configureLogging(**parser.loggingOptions(args))
+    WireTap.configure(file=args.wire_capture, ringSize=args.wire_capture_ring)
+    Tracer.configure(file=args.trace)
 
     # Verify the printers directory exists
     if args.printers_dir is not None and not args.printers_dir.exists():
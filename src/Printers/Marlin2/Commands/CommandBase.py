@@ -5,8 +5,9 @@ import abc
 class CommandBase(QtCore.QObject):
     __metaclass__ = abc.ABCMeta
 
-    finished = QtCore.Signal(QtCore.QObject)
-    errorOccurred = QtCore.Signal(QtCore.QObject)
+    # Emitted as objects so replies queued to another thread keep the command alive
+    finished = QtCore.Signal(object)
+    errorOccurred = QtCore.Signal(object)
 
     def __init__(self, request):
         super().__init__()
@@ -14,6 +15,12 @@ class CommandBase(QtCore.QObject):
         self.request = request
         self.error = None
         self.result = None
+        self.cancelled = False
+        self.after = None # Command that must succeed before this one is sent
+        self.queuedTime = None   # time.perf_counter() values
+        self.sentTime = None
+        self.firstLineTime = None
+        self.finishedTime = None
 
     def __str__(self):
         return f'Name: {self.NAME} Request: {self.request}'
@@ -61,6 +68,30 @@ class CommandBase(QtCore.QObject):
     def isAutoReport(cls, line):
         return cls.isPositionAutoReport(line) or cls.isTemperatureAutoReport(line)
 
+    @staticmethod
+    def isResendRequest(line):
+        return line.startswith('Resend:') or line.startswith('rs ')
+
+    @staticmethod
+    def isTransportError(line):
+        """ Errors reported for lines rejected due to line numbers or checksums. """
+        return line.startswith('Error:checksum mismatch') or \
+               line.startswith('Error:Line Number is not Last Line Number+1') or \
+               line.startswith('Error:No Checksum with line number') or \
+               line.startswith('Error:No Line Number with checksum')
+
+    @staticmethod
+    def parseResendRequestLine(line):
+        tokens = line.replace(':', ' ').split()
+
+        if len(tokens) != 2 or tokens[0] not in ['Resend', 'rs']:
+            raise GCodeError(f'Unable to parse resend request: [{line}].')
+
+        try:
+            return int(tokens[1].removeprefix('N'))
+        except ValueError:
+            raise GCodeError(f'Incorrect numeric data type found in resend request: [{line}].')
+
     @staticmethod
     def verifyOkResponseLine(line):
         tokens = line.split()
@@ -70,6 +101,25 @@ class CommandBase(QtCore.QObject):
            (len(tokens) == 3 and (not tokens[1].startswith('P') or not tokens[2].startswith('B'))):
             raise GCodeError(f'Expected \'ok [PXX] [BXX]\' but detected \'{line}\'.')
 
+    @staticmethod
+    def parseAdvancedOkResponseLine(line):
+        """ Returns the free planner and command buffer counts of an ADVANCED_OK
+            response (ok P<planner> B<buffer>) or None for any other line. """
+
+        tokens = line.split()
+
+        if len(tokens) != 3 or \
+           tokens[0] != 'ok' or \
+           not tokens[1].startswith('P') or \
+           not tokens[2].startswith('B'):
+            return None
+
+        try:
+            return {'planner': int(tokens[1][1:]),
+                    'buffer': int(tokens[2][1:])}
+        except ValueError:
+            return None
+
     @staticmethod
     def tokenize(line, count, *, replace=' '):
         tokens = line.replace(replace, ' ').split()
@@ -26,19 +26,31 @@ class CommandM105(CommandBase):
         if self.isMetadata(line) or self.isAutoReport(line):
             return False
 
+        if not line.startswith('ok'):
+            raise GCodeError(f'Unable to parse response: [{line}].')
+
+        self.result = self.parseTemperatures(line[2:])
+        return True
+
+    @staticmethod
+    def parseTemperatures(line):
+        # Parses the temperature part of an M105 response, which is also the
+        # format of the ' T:' lines auto reported after M155 and while waiting
+        # on M109/M190
+        #
+        # 'T:<FLOAT> /<FLOAT> B:<FLOAT> /<FLOAT> @:<FLOAT> B@:<FLOAT> [W:<INT|?>]'
+
         bedPower = None
         bedTempDesired = None
         bedTempActual = None
         toolPower = None
         toolTempDesired = None
         toolTempActual = None
+        isCurrent = True
         tokens = line.replace(':', ' ').split()
 
-        if tokens[0] != 'ok':
-            raise GCodeError(f'Unable to parse response: [{line}].')
-
         try:
-            index = 1
+            index = 0
             while index < len(tokens):
                 if tokens[index].startswith('T'):
                     isCurrent = toolTempActual is None and (tokens[index] in ['T', 'T0'])
@@ -80,6 +92,9 @@ class CommandM105(CommandBase):
                 elif tokens[index] == 'A':
                     index += 2
 
+                elif tokens[index] == 'W':
+                    index += 2
+
                 else:
                     raise GCodeError(f'Unable to parse response: [{line}].')
         except IndexError as exception:
@@ -87,11 +102,9 @@ class CommandM105(CommandBase):
         except ValueError as exception:
             raise GCodeError(f'Incorrect numeric data type found in response: [{line}].') from exception
 
-        self.result = {'toolActual':  toolTempActual,
-                       'toolDesired': toolTempDesired,
-                       'bedActual':   bedTempActual,
-                       'bedDesired':  bedTempDesired,
-                       'toolPower':   toolPower,
-                       'bedPower':    bedPower}
-
-        return True
\ No newline at end of file
+        return {'toolActual':  toolTempActual,
+                'toolDesired': toolTempDesired,
+                'bedActual':   bedTempActual,
+                'bedDesired':  bedTempDesired,
+                'toolPower':   toolPower,
+                'bedPower':    bedPower}
\ No newline at end of file
@@ -0,0 +1,11 @@
+from .OkCommand import OkCommand
+
+class CommandM110(OkCommand):
+    NAME = 'M110'
+
+    def __init__(self, *, n=None):
+        self.n = n
+
+        nPart = '' if self.n is None else f' N{self.n}'
+
+        super().__init__(self.NAME + nPart)
\ No newline at end of file
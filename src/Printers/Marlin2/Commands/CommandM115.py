@@ -0,0 +1,42 @@
+from .GCodeError import GCodeError
+from .CommandBase import CommandBase
+
+class CommandM115(CommandBase):
+    NAME = 'M115'
+
+    def __init__(self):
+        super().__init__(self.NAME)
+        self.firmware = None
+        self.capabilities = {}
+
+    def _processLine(self, line):
+        # Line 0:   'FIRMWARE_NAME:<STR> SOURCE_CODE_URL:<STR> PROTOCOL_VERSION:<STR> MACHINE_TYPE:<STR> ...'
+        # Line 1-N: 'Cap:<NAME>:<0|1>'
+        # Other informational lines (e.g. M115_GEOMETRY_REPORT 'area:{...}') are skipped
+        # Last line: ok
+
+        if self.isMetadata(line) or self.isAutoReport(line):
+            return False
+
+        if line.startswith('FIRMWARE_NAME:'):
+            self.firmware = line[len('FIRMWARE_NAME:'):].split(' SOURCE_CODE_URL:')[0].strip()
+            return False
+
+        if line.startswith('Cap:'):
+            tokens = line.split(':')
+            if len(tokens) != 3:
+                raise GCodeError(f'Unable to parse response: [{line}].')
+
+            try:
+                self.capabilities[tokens[1]] = bool(int(tokens[2]))
+            except ValueError:
+                raise GCodeError(f'Incorrect numeric data type found in response: [{line}].')
+            return False
+
+        if not line.startswith('ok'):
+            return False
+
+        self.verifyOkResponseLine(line)
+        self.result = {'firmware': self.firmware,
+                       'capabilities': self.capabilities}
+        return True
\ No newline at end of file
@@ -0,0 +1,11 @@
+from .OkCommand import OkCommand
+
+class CommandM155(OkCommand):
+    NAME = 'M155'
+
+    def __init__(self, *, s=None):
+        self.s = s
+
+        sPart = '' if self.s is None else f' S{self.s}'
+
+        super().__init__(self.NAME + sPart)
\ No newline at end of file
@@ -1,6 +1,8 @@
 from .GCodeError import GCodeError
 from .CommandBase import CommandBase
 from . import Converter
+import math
+import re
 
 class CommandM420(CommandBase):
     NAME = 'M420'
@@ -47,4 +49,81 @@ class CommandM420(CommandBase):
         else:
             self.result['response'].append(line)
 
-        return False
\ No newline at end of file
+        return False
+
+    @classmethod
+    def parseMesh(cls, response):
+        """ Parses the mesh printed by M420 V, either the bilinear leveling
+            grid or the CSV bed topography report (M420 V T1, UBL only).
+            Returns the Z values indexed by [row][column], with row 0 at the
+            front (minimum Y) and None for points that were not probed, or
+            None when no mesh was printed. Raises ValueError when the mesh is
+            malformed. """
+
+        lines = [line for line in response if not line.startswith('echo:')]
+        for index, line in enumerate(lines):
+            if 'Bilinear Leveling Grid:' in line:
+                return cls._parseGrid(lines[index+1:])
+            elif 'Bed Topography Report for CSV:' in line:
+                return cls._parseCsv(lines[index+1:])
+
+        return None
+
+    @staticmethod
+    def _parseMeshValue(token):
+        # Points that were not probed are printed as NAN or a run of '=' or '.'
+        if len(token) > 0 and (set(token) == {'='} or set(token) == {'.'}):
+            return None
+
+        try:
+            value = float(token)
+        except ValueError:
+            raise ValueError(f'Invalid mesh value: [{token}].')
+
+        return None if math.isnan(value) else value
+
+    @classmethod
+    def _parseGrid(cls, lines):
+        columnCount = None
+        mesh = []
+        for line in lines:
+            tokens = line.split()
+            if len(tokens) == 0:
+                if len(mesh) > 0:
+                    break
+                continue
+
+            if columnCount is None:
+                if tokens != [str(column) for column in range(len(tokens))]:
+                    raise ValueError(f'Invalid mesh header line: [{line}].')
+                columnCount = len(tokens)
+            elif tokens[0] != str(len(mesh)) or len(tokens) - 1 != columnCount:
+                raise ValueError(f'Invalid mesh line: [{line}].')
+            else:
+                mesh.append([cls._parseMeshValue(token) for token in tokens[1:]])
+
+        if len(mesh) == 0:
+            raise ValueError('Mesh without any rows.')
+
+        return mesh
+
+    @classmethod
+    def _parseCsv(cls, lines):
+        mesh = []
+        for line in lines:
+            tokens = [token for token in re.split(r'[,\s]+', line) if len(token) > 0]
+            if len(tokens) == 0:
+                if len(mesh) > 0:
+                    break
+                continue
+
+            if len(mesh) > 0 and len(tokens) != len(mesh[0]):
+                raise ValueError(f'Invalid mesh line: [{line}].')
+            mesh.append([cls._parseMeshValue(token) for token in tokens])
+
+        if len(mesh) == 0:
+            raise ValueError('Mesh without any rows.')
+
+        # The report starts with the back row
+        mesh.reverse()
+        return mesh
\ No newline at end of file
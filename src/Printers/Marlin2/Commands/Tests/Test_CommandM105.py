@@ -50,4 +50,26 @@ def test_VerifyCorrect(testPoint):
         result = commandM105._processLine(line)
         isLast = index == len(testPoint.lines) - 1
         assert(isLast == result)
-    assert(commandM105.result == testPoint.expected)
\ No newline at end of file
+    assert(commandM105.result == testPoint.expected)
+
+@pytest.mark.parametrize('line, expected', [(' T:25.00 /0.00 B:24.50 /60.00 @:0 B@:127',
+                                             {'toolActual':   25.00,
+                                              'toolDesired':   0.00,
+                                              'bedActual':    24.50,
+                                              'bedDesired':   60.00,
+                                              'toolPower':     0.00,
+                                              'bedPower':    127.00}),
+                                            (' T:180.20 /200.00 B:60.00 /60.00 @:127 B@:30 W:?',
+                                             {'toolActual':  180.20,
+                                              'toolDesired': 200.00,
+                                              'bedActual':    60.00,
+                                              'bedDesired':   60.00,
+                                              'toolPower':   127.00,
+                                              'bedPower':     30.00})])
+def test_parseTemperatures(line, expected):
+    assert(CommandM105.parseTemperatures(line) == expected)
+
+@pytest.mark.parametrize('line', [' T:abc /0.00', ' T:25.00 /0.00 Q:1'])
+def test_parseTemperaturesInvalid(line):
+    with pytest.raises(GCodeError):
+        CommandM105.parseTemperatures(line)
\ No newline at end of file
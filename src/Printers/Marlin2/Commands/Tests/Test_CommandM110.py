@@ -0,0 +1,35 @@
+from Printers.Marlin2.Commands.CommandM110 import CommandM110
+from Printers.Marlin2.Commands.GCodeError import GCodeError
+from dataclasses import dataclass, field
+from typing import Union
+import pytest
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    lines: [str]
+    n: Union[None, int] = field(default=None)
+    request: str = field(default='M110')
+    expected: dict = field(default=None)
+
+testPoints = [
+    TestPoint(lines = ['ok P15 B3'],
+              expected = None),
+    TestPoint(lines = ['ok'],
+              n = 0,
+              request = 'M110 N0',
+              expected = None),
+    ]
+
+def createCommandM110(testPoint):
+    return CommandM110(n = testPoint.n)
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_VerifyCorrect(testPoint):
+    commandM110 = createCommandM110(testPoint)
+    assert(commandM110.request == testPoint.request)
+    for index, line in enumerate(testPoint.lines):
+        result = commandM110._processLine(line)
+        isLast = index == len(testPoint.lines) - 1
+        assert(isLast == result)
+    assert(commandM110.result == testPoint.expected)
\ No newline at end of file
@@ -0,0 +1,51 @@
+from Printers.Marlin2.Commands.CommandM115 import CommandM115
+from Printers.Marlin2.Commands.GCodeError import GCodeError
+from dataclasses import dataclass, field
+import pytest
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    lines: [str]
+    expected: dict = field(default=None)
+
+testPoints = [
+    TestPoint(lines = ['FIRMWARE_NAME:Marlin 2.1.2.1 (Jun 27 2023 10:00:00) SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin PROTOCOL_VERSION:1.0 MACHINE_TYPE:Ender-3 V2 EXTRUDER_COUNT:1 UUID:cede2a2f-41a2-4748-9b12-c55c62f367ff',
+                       'Cap:SERIAL_XON_XOFF:0',
+                       'Cap:EEPROM:1',
+                       'Cap:AUTOREPORT_TEMP:1',
+                       'Cap:AUTOREPORT_POS:0',
+                       'ok'],
+              expected = {'firmware': 'Marlin 2.1.2.1 (Jun 27 2023 10:00:00)',
+                          'capabilities': {'SERIAL_XON_XOFF': False,
+                                           'EEPROM': True,
+                                           'AUTOREPORT_TEMP': True,
+                                           'AUTOREPORT_POS': False}}),
+    # Firmware built without EXTENDED_CAPABILITIES_REPORT
+    TestPoint(lines = ['FIRMWARE_NAME:Marlin bugfix-2.0.x SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin PROTOCOL_VERSION:1.0 MACHINE_TYPE:3D Printer EXTRUDER_COUNT:1',
+                       ' T:25.00 /0.00 B:25.00 /0.00 @:0 B@:0',
+                       'ok P15 B3'],
+              expected = {'firmware': 'Marlin bugfix-2.0.x',
+                          'capabilities': {}}),
+    # Firmware built with M115_GEOMETRY_REPORT
+    TestPoint(lines = ['FIRMWARE_NAME:Marlin 2.1.2.1 (Jun 27 2023 10:00:00) SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin PROTOCOL_VERSION:1.0 MACHINE_TYPE:Ender-3 V2 EXTRUDER_COUNT:1',
+                       'Cap:EEPROM:1',
+                       'area:{full:{min:{x:0.00,y:0.00,z:0.00},max:{x:230.00,y:230.00,z:250.00}},work:{min:{x:0.00,y:0.00,z:0.00},max:{x:230.00,y:230.00,z:250.00}}}',
+                       'ok'],
+              expected = {'firmware': 'Marlin 2.1.2.1 (Jun 27 2023 10:00:00)',
+                          'capabilities': {'EEPROM': True}}),
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_VerifyCorrect(testPoint):
+    commandM115 = CommandM115()
+    for index, line in enumerate(testPoint.lines):
+        result = commandM115._processLine(line)
+        isLast = index == len(testPoint.lines) - 1
+        assert(isLast == result)
+    assert(commandM115.result == testPoint.expected)
+
+@pytest.mark.parametrize('line', ['Cap:EEPROM', 'Cap:EEPROM:yes'])
+def test_invalidCapability(line):
+    with pytest.raises(GCodeError):
+        CommandM115()._processLine(line)
\ No newline at end of file
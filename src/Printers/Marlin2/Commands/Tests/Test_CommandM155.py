@@ -0,0 +1,35 @@
+from Printers.Marlin2.Commands.CommandM155 import CommandM155
+from Printers.Marlin2.Commands.GCodeError import GCodeError
+from dataclasses import dataclass, field
+from typing import Union
+import pytest
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    lines: [str]
+    s: Union[None, int] = field(default=None)
+    expected: dict = field(default=None)
+
+testPoints = [
+    TestPoint(s = 1,
+              lines = ['ok'],
+              expected = None),
+    TestPoint(s = 0,
+              lines = [' T:25.00 /0.00 B:25.00 /0.00 @:0 B@:0',
+                       'ok P15 B3'],
+              expected = None),
+    ]
+
+def createCommandM155(testPoint):
+    return CommandM155(s = testPoint.s)
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_VerifyCorrect(testPoint):
+    commandM155 = createCommandM155(testPoint)
+    assert(commandM155.request == f'M155 S{testPoint.s}')
+    for index, line in enumerate(testPoint.lines):
+        result = commandM155._processLine(line)
+        isLast = index == len(testPoint.lines) - 1
+        assert(isLast == result)
+    assert(commandM155.result == testPoint.expected)
\ No newline at end of file
@@ -135,4 +135,62 @@ def test_VerifyCorrect(testPoint):
         result = commandM420._processLine(line)
         isLast = index == len(testPoint.lines) - 1
         assert(isLast == result)
-    assert(commandM420.result == testPoint.expected)
\ No newline at end of file
+    assert(commandM420.result == testPoint.expected)
+
+@dataclass(frozen=True)
+class MeshTestPoint:
+    __test__ = False
+    response: [str]
+    expected: Union[None, list] = field(default=None)
+
+meshTestPoints = [
+    MeshTestPoint(response = ['echo:Invalid mesh.',
+                              'echo:Bed Leveling OFF',
+                              'echo:Fade Height 10.00'],
+                  expected = None),
+    MeshTestPoint(response = ['Bilinear Leveling Grid:',
+                              '      0      1      2',
+                              ' 0 +0.100 -0.025 +0.000',
+                              ' 1 +0.050 +0.075 -0.125',
+                              '',
+                              'echo:Bed Leveling ON',
+                              'echo:Fade Height 10.00'],
+                  expected = [[0.1, -0.025, 0.0],
+                              [0.05, 0.075, -0.125]]),
+    MeshTestPoint(response = ['Bilinear Leveling Grid:',
+                              '      0      1',
+                              ' 0 +0.100  =======',
+                              ' 1 +0.050 +0.075',
+                              '',
+                              'Subdivided with CATMULL ROM Leveling Grid:',
+                              '        0        1        2',
+                              ' 0 +0.00000 +0.00000 +0.00000',
+                              ' 1 +0.00000 +0.00000 +0.00000',
+                              ' 2 +0.00000 +0.00000 +0.00000',
+                              ''],
+                  expected = [[0.1, None],
+                              [0.05, 0.075]]),
+    # The CSV report starts with the back row
+    MeshTestPoint(response = ['',
+                              'Bed Topography Report for CSV:',
+                              '',
+                              '0.300\t0.400\tNAN',
+                              '0.100\t0.200\t-0.050',
+                              'echo:Bed Leveling ON'],
+                  expected = [[0.1, 0.2, -0.05],
+                              [0.3, 0.4, None]]),
+    ]
+
+@pytest.mark.parametrize('meshTestPoint', meshTestPoints)
+def test_parseMesh(meshTestPoint):
+    assert(CommandM420.parseMesh(meshTestPoint.response) == meshTestPoint.expected)
+
+@pytest.mark.parametrize('response', [['Bilinear Leveling Grid:', '      0      1', ' 0 +0.100'],
+                                      ['Bilinear Leveling Grid:', '      0      1', ' 1 +0.100 +0.200'],
+                                      ['Bilinear Leveling Grid:', '      1      2', ' 0 +0.100 +0.200'],
+                                      ['Bilinear Leveling Grid:', '      0      1', ' 0 +0.100 abc'],
+                                      ['Bilinear Leveling Grid:', ''],
+                                      ['Bed Topography Report for CSV:', '0.1\t0.2', '0.1']])
+def test_parseMeshInvalid(response):
+    with pytest.raises(ValueError):
+        CommandM420.parseMesh(response)
\ No newline at end of file
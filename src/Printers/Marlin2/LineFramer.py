@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+class LineFramer:
+    """ Splits a byte stream into LF terminated lines.
+
+        Received bytes are appended to a single buffer and consumed through an
+        offset, so a burst of lines is split in linear time. Trailing CRs are
+        stripped from each line. Lines that fail to decode are passed to
+        badLineHandler (if set) and dropped without affecting other lines. """
+
+    def __init__(self, *, encoding='ascii', badLineHandler=None, compactThreshold=4096):
+        self.encoding = encoding
+        self.badLineHandler = badLineHandler
+        self.compactThreshold = compactThreshold
+        self.badLineCount = 0
+        self.clear()
+
+    def clear(self):
+        self.buffer = bytearray()
+        self.offset = 0     # Start of the first unconsumed line
+        self.scanOffset = 0 # Position to resume searching for a terminator
+
+    def pendingCount(self):
+        return len(self.buffer) - self.offset
+
+    def feed(self, data):
+        """ Adds data and returns the list of completed lines. """
+
+        self.buffer += data
+
+        lines = []
+        start = self.offset
+        view = memoryview(self.buffer)
+        try:
+            while (index := self.buffer.find(b'\n', self.scanOffset)) > -1:
+                end = index
+                while end > start and self.buffer[end - 1] == 0x0D:
+                    end -= 1
+
+                try:
+                    lines.append(str(view[start:end], self.encoding))
+                except UnicodeDecodeError:
+                    self.badLineCount += 1
+                    if self.badLineHandler is not None:
+                        self.badLineHandler(bytes(view[start:index + 1]))
+
+                start = index + 1
+                self.scanOffset = start
+        finally:
+            view.release()
+
+        self.offset = start
+        self.scanOffset = len(self.buffer)
+
+        # Compact the buffer, this only copies the trailing partial line
+        if self.offset == len(self.buffer):
+            self.buffer.clear()
+            self.offset = 0
+            self.scanOffset = 0
+        elif self.offset >= self.compactThreshold:
+            del self.buffer[:self.offset]
+            self.scanOffset -= self.offset
+            self.offset = 0
+
+        return lines
+
+if __name__ == '__main__':
+    # Main only imports
+    from PySide6 import QtCore
+    import argparse
+    import timeit
+
+    def legacySplit(readBuffer, data):
+        """ The line splitting previously done by SerialConnection._readData. """
+
+        lines = []
+        readBuffer += data
+
+        while (index := readBuffer.indexOf(b'\n')) > -1:
+            try:
+                lineEndIndex = index - 1 if index > 0 and readBuffer[index - 1] == b'\r' else index
+                line = str(readBuffer[:lineEndIndex], 'ascii')
+            except UnicodeDecodeError:
+                readBuffer.clear()
+                continue
+
+            readBuffer = readBuffer[index+1:]
+            lines.append(line)
+
+        return readBuffer, lines
+
+    def meshDump(size):
+        lines = ['Bilinear Leveling Grid:',
+                 ' '.join(f'{column:6}' for column in range(size))]
+        lines += [f'{row:2} ' + ' '.join('+0.000' for column in range(size)) for row in range(size)]
+        lines += ['', 'echo:Bed Leveling ON', 'echo:Fade Height 10.00', 'ok P15 B3']
+        return ''.join(line + '\r\n' for line in lines).encode()
+
+    parser = argparse.ArgumentParser(description='Line framer micro-benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timing repeats')
+    parser.add_argument('--chunk-size', type=int, default=4096, help='bytes delivered per read')
+    args = parser.parse_args()
+
+    workloads = {'busy spam (1000 lines)': b'echo:busy: processing\n' * 1000,
+                 'M420 V 10x10 mesh': meshDump(10),
+                 'M420 V 25x25 mesh': meshDump(25),
+                 'temperature autoreports (1000 lines)': b' T:210.00 /210.00 B:60.00 /60.00 @:64 B@:0\n' * 1000}
+
+    for name, data in workloads.items():
+        chunks = [data[index:index + args.chunk_size] for index in range(0, len(data), args.chunk_size)]
+
+        def runLegacy():
+            readBuffer = QtCore.QByteArray()
+            lineCount = 0
+            for chunk in chunks:
+                readBuffer, lines = legacySplit(readBuffer, chunk)
+                lineCount += len(lines)
+            return lineCount
+
+        def runFramer():
+            lineFramer = LineFramer()
+            lineCount = 0
+            for chunk in chunks:
+                lineCount += len(lineFramer.feed(chunk))
+            return lineCount
+
+        assert(runLegacy() == runFramer())
+
+        number = 10
+        legacyTime = min(timeit.repeat(runLegacy, number=number, repeat=args.repeat)) / number
+        framerTime = min(timeit.repeat(runFramer, number=number, repeat=args.repeat)) / number
+        print(f'{name:40} {len(data):7} bytes  legacy: {legacyTime * 1e3:8.3f} ms  '
+              f'framer: {framerTime * 1e3:8.3f} ms  speedup: {legacyTime / framerTime:6.1f}x')
@@ -7,11 +7,18 @@ from ..CommandPrinter import GetBoundsResult
 from ..CommandPrinter import GetMeshCoordinatesResult
 from ..CommandPrinter import ProbeResult
 from .CommandConnection import CommandConnection
+from .Commands.CommandM420 import CommandM420
+from .PrinterState import PositioningMode
+from .PrinterState import PrinterState
+from Common.LatencyStats import LatencyStats
+from Common.Metrics import metrics
+from Common import Tracer
+from Common.Points import Point2F
 
 from PySide6 import QtCore
 from PySide6 import QtNetwork
-import logging
-import statistics
+import collections
+import time
 
 class Marlin2Printer(CommandPrinter):
     # Hardcoded default value since Marlin 2 doesn't support querying for them
@@ -19,11 +26,28 @@ class Marlin2Printer(CommandPrinter):
     DEFAULT_PROBE_XY_SPEED = 5000
     DEFAULT_PROBE_Z_HEIGHT = 10
 
-    def __init__(self, printerInfo, port=None, *args,  **kwargs):
+    def __init__(self, printerInfo, port=None, *args, pipelineDepth=1, reliable=False, meshCoordinatesCache=None, threaded=True, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.port = port
-        self.commandConnection = CommandConnection(printerInfo=printerInfo)
+        self.meshCoordinatesCache = meshCoordinatesCache
+        self.commandConnection = CommandConnection(printerInfo=printerInfo, pipelineDepth=pipelineDepth, reliable=reliable)
+
+        # Serial I/O and response parsing run on their own thread while open
+        self.threaded = threaded
+        self.deliveryLatency = LatencyStats() # From a command finishing to this thread handling it
+        if threaded and QtCore.QCoreApplication.instance() is not None:
+            QtCore.QCoreApplication.instance().aboutToQuit.connect(self._stopSerialThread)
+
+        # Track the printer's state to skip redundant commands
+        self.printerState = PrinterState()
+        self.commandConnection.queued.connect(self.printerState.commandQueued)
+        self.commandConnection.finished.connect(self._commandFinished)
+        self.commandConnection.errorOccurred.connect(self._commandErrorOccurred)
+        self.commandConnection.temperatureReported.connect(self._temperatureReported)
+
+        # Firmware capabilities reported by M115 (unknown until init)
+        self._capabilities = {}
 
         self.machineSet = set()
 
@@ -32,18 +56,38 @@ class Marlin2Printer(CommandPrinter):
 
     def _open(self, port=None):
         self.port = port if port is not None else self.port
-        self.commandConnection.open(self.port)
+        self.printerState.invalidate()
+        self.deliveryLatency.clear()
+
+        if self.threaded:
+            self.commandConnection.startThread()
+
+        try:
+            self.commandConnection.open(self.port)
+        except IOError:
+            self._stopSerialThread()
+            raise
 
     def _close(self):
+        self.printerState.invalidate()
+        if self.commandConnection.connected():
+            self.logger.info(f'GUI delivery latency: {self.deliveryLatency}')
         self.commandConnection.close()
+        self._stopSerialThread()
+
+    def _stopSerialThread(self):
+        self.commandConnection.stopThread()
 
     def abort(self):
         for machine in self.machineSet:
             machine.abort()
         self.machineSet.clear()
 
+        # Cancelled commands may have been tracked as queued
+        self.printerState.invalidate()
+
     def _createMachine(self, machineClass, signalName, id_, context, *args, **kwargs):
-        machine = machineClass(self.commandConnection, id_, context, *args, **kwargs)
+        machine = machineClass(self.commandConnection, self.printerState, id_, context, *args, **kwargs)
         machine.sent.connect(self._sent)
         machine.finished.connect(self._finished)
         machine.errorOccurred.connect(self._errorOccurred)
@@ -54,13 +98,20 @@ class Marlin2Printer(CommandPrinter):
         else:
             machine.inited.connect(self._inited)
 
+        if machineClass == ProbeManyMachine:
+            machine.probedPoint.connect(self.probedPoint)
+
         self.machineSet.add(machine)
-        logging.debug(f'Starting {machineClass} with id: {id_}, context: {context}')
+        self.logger.debug('Starting %s with id: %s, context: %s', machineClass, id_, context)
         machine.start()
 
     def _inited(self, id_, context):
         machine = self.sender()
 
+        # Firmware
+        self.logger.info(f'Firmware: {machine.firmware}')
+        self._capabilities = machine.capabilities
+
         # Probe offsets
         self._probeXOffset = machine.probeXOffset
         self._probeYOffset = machine.probeYOffset
@@ -80,6 +131,7 @@ class Marlin2Printer(CommandPrinter):
         self._probeSampleCount = self.DEFAULT_PROBE_SAMPLE_COUNT
         self._probeZHeight = self.DEFAULT_PROBE_Z_HEIGHT
         self._probeXYSpeed = self.DEFAULT_PROBE_XY_SPEED
+        self._capabilities = {}
         self._createMachine(InitMachine, 'inited', id_, context)
 
     def _home(self, id_, *, context, x, y, z):
@@ -88,6 +140,16 @@ class Marlin2Printer(CommandPrinter):
     def _getTemperatures(self, id_, *, context):
         self._createMachine(GetTemperaturesMachine, 'gotTemperatures', id_, context)
 
+    def _startTemperatureAutoReport(self, interval):
+        if not self._capabilities.get('AUTOREPORT_TEMP', False):
+            return False
+
+        self.commandConnection.sendM155(s=max(1, round(interval)))
+        return True
+
+    def _temperatureReported(self, reply):
+        self.gotTemperatures.emit(self.TEMPERATURE_AUTO_REPORT_ID, {}, GetTemperaturesMachine.temperaturesResult(reply))
+
     def _getProbeOffsets(self, id_, *, context):
         self._createMachine(GetProbeOffsetsMachine, 'gotProbeOffsets', id_, context)
 
@@ -98,7 +160,7 @@ class Marlin2Printer(CommandPrinter):
         self._createMachine(GetTravelBoundsMachine, 'gotTravelBounds', id_, context)
 
     def _getMeshCoordinates(self, id_, *, context):
-        self._createMachine(GetMeshCoordinatesMachine, 'gotMeshCoordinates', id_, context)
+        self._createMachine(GetMeshCoordinatesMachine, 'gotMeshCoordinates', id_, context, self.meshCoordinatesCache)
 
     def _setBedTemperature(self, id_, *, context, temperature):
         self._createMachine(SetBedTemperatureMachine, 'bedTemperatureSet', id_, context, temperature)
@@ -116,7 +178,12 @@ class Marlin2Printer(CommandPrinter):
         self._createMachine(GetDefaultProbeXYSpeedMachine, 'gotDefaultProbeXYSpeed', id_, context)
 
     def _probe(self, id_, *, context, x, y):
-        self._createMachine(ProbeMachine, 'probed', id_, context, x, y, self._probeSampleCount, self._probeXYSpeed, self._probeZHeight)
+        self._createMachine(ProbeMachine, 'probed', id_, context, x, y, self._probeSampleCount, self._probeXYSpeed, self._probeZHeight,
+                            maxSampleCount=self._probeMaxSampleCount, tolerance=self._probeTolerance)
+
+    def _probeMany(self, id_, *, context, points, order):
+        self._createMachine(ProbeManyMachine, 'probedMany', id_, context, points, order, self._probeSampleCount, self._probeXYSpeed, self._probeZHeight,
+                            maxSampleCount=self._probeMaxSampleCount, tolerance=self._probeTolerance, clearancePlanner=self._probeClearancePlanner)
 
     def _move(self, id_, *, context, x, y, z, e, f, wait, relative):
         self._createMachine(MoveMachine, 'moved', id_, context, x, y, z, e, f, wait, relative)
@@ -128,7 +195,17 @@ class Marlin2Printer(CommandPrinter):
         self.machineSet.remove(machine)
         self.finished.emit(machine.TYPE, machine.id_, machine.context, machine.error, response)
 
+    def _commandFinished(self, command):
+        deliveryTime = time.perf_counter() - command.finishedTime
+        self.deliveryLatency.add(deliveryTime)
+        metrics.observe('marlin2_delivery_seconds', deliveryTime)
+        self.printerState.commandFinished(command)
+
+    def _commandErrorOccurred(self, command):
+        self.printerState.invalidate()
+
     def _errorOccurred(self, machine, message):
+        self.printerState.invalidate()
         self.errorOccurred.emit(machine.TYPE, machine.id_, machine.context, message)
 
 class Marlin2Machine(QtCore.QObject):
@@ -136,58 +213,130 @@ class Marlin2Machine(QtCore.QObject):
     finished = QtCore.Signal(QtCore.QObject, object) # machine, response
     errorOccurred = QtCore.Signal(QtCore.QObject, str) # machine, message
 
-    def __init__(self, commandConnection, id_, context, parent=None):
+    def __init__(self, commandConnection, printerState, id_, context, parent=None):
         super().__init__(parent)
 
         self.commandConnection = commandConnection
+        self.printerState = printerState
 
         self.id_ = id_
         self.context = context
         self.error = None
         self.setTransition(None)
-        self.command = None
+        self.commands = collections.deque()
+        self._progress = None
+        self.aborted = False
+
+        # time.perf_counter() values
+        self.startTime = time.perf_counter()
+        self.stateTime = None
+        self.stateName = 'start'
 
     def setTransition(self, transition):
         self._transition = transition
 
     def abort(self):
-        if self.command is not None:
-            self.command.finished.disconnect()
-            self.command.errorOccurred.disconnect()
-            self.command.deleteLater()
-            self.command = None
+        # Only detach this machine, the connection still owns in flight commands
+        self.aborted = True
+        while len(self.commands) > 0:
+            command = self.commands.popleft()
+            command.finished.disconnect(self.processReply)
+            self.commandConnection.cancel(command)
 
     def processReply(self, command):
-        assert(command == self.command)
+        # Replies are queued from the serial thread and may arrive after an abort
+        if self.aborted:
+            return
+
+        assert(len(self.commands) > 0 and command == self.commands[0])
 
-        error = self.command.error
-        self.command.deleteLater()
-        self.command = None
+        self.commands.popleft()
+        error = command.error
 
         # Handle errors
         if error is not None:
+            self.abort()
             self.error = error
+            self._recordDuration('error')
             self.errorOccurred.emit(self, error)
-        else: # Move to next state
+            return
+
+        if self._progress is not None:
+            self._progress(command)
+
+            # A progress handler may have aborted this machine
+            if self.aborted:
+                return
+
+        if self.error is None and len(self.commands) == 0: # Move to next state
+            self._recordState()
             self._transition(command.result)
 
     def setCommand(self, command):
-        self.command = command
-        self.sent.emit(self, command.request)
-        self.command.finished.connect(self.processReply)
+        self.setCommands(command)
+
+    def setCommands(self, *commands, progress=None):
+        """ Sets the commands of the current state, the transition is passed
+            the result of the last command once all of them have finished.
+            Commands are queued back to back so the connection can pipeline
+            them when a pipeline depth greater than one is configured. If
+            set, progress is called with each command as it finishes. """
+
+        assert(len(self.commands) == 0)
+
+        self.stateTime = time.perf_counter()
+        self._progress = progress
+        for command in commands:
+            self.commands.append(command)
+            self.sent.emit(self, command.request)
+            command.finished.connect(self.processReply)
+
+    def sendPositioningMode(self, *, relative=False):
+        """ Sends G90 or G91 unless the printer is already in the requested
+            positioning mode and returns the list of sent commands. """
+
+        positioningMode = PositioningMode.RELATIVE if relative else PositioningMode.ABSOLUTE
+        if self.printerState.positioningMode == positioningMode:
+            return []
+        elif relative:
+            return [self.commandConnection.sendG91()]
+        else:
+            return [self.commandConnection.sendG90()]
 
     def finish(self, signal, result=None):
         if result is None:
             signal.emit(self.id_, self.context)
         else:
             signal.emit(self.id_, self.context, result)
+        self._recordDuration('ok')
         self.finished.emit(self, result)
 
     def reportError(self, message):
         self.error = message
+        self._recordDuration('error')
         self.errorOccurred.emit(self, message)
         self.finished.emit(self, message)
 
+    def _recordState(self):
+        """ Records the time from sending the current state's commands to
+            calling its transition, which becomes the current state. """
+
+        now = time.perf_counter()
+        transitionName = self._transition.__name__
+        metrics.observe('marlin2_state_seconds', now - self.stateTime,
+                        machine=type(self).__name__, transition=transitionName)
+        if (tracer := Tracer.defaultTracer()) is not None:
+            tracer.span(self.stateName, 'machine', self.stateTime, now, id_=id(self), next=transitionName)
+        self.stateName = transitionName
+
+    def _recordDuration(self, outcome):
+        now = time.perf_counter()
+        metrics.observe('marlin2_machine_seconds', now - self.startTime,
+                        machine=type(self).__name__, outcome=outcome)
+        if (tracer := Tracer.defaultTracer()) is not None:
+            tracer.span(type(self).__name__, 'machine', self.startTime, now, id_=id(self),
+                        id=str(self.id_), context=str(self.context), outcome=outcome)
+
     @staticmethod
     def stringIsInteger(value):
         try:
@@ -201,10 +350,17 @@ class InitMachine(Marlin2Machine):
     TYPE = CommandType.INIT
     inited = QtCore.Signal(str, dict)
 
-    def __init__(self, commandConnection, id_, context, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
 
     def start(self):
+        self.setTransition(self._enterHome)
+        self.setCommand(self.commandConnection.sendM115())
+
+    def _enterHome(self, reply):
+        self.firmware = reply['firmware']
+        self.capabilities = reply['capabilities']
+
         self.setTransition(self._enterGetProbeOffsets)
         self.setCommand(self.commandConnection.sendG28())
 
@@ -238,8 +394,8 @@ class HomeMachine(Marlin2Machine):
     TYPE = CommandType.HOME
     homed = QtCore.Signal(str, dict)
 
-    def __init__(self, commandConnection, id_, context, x, y, z, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, x, y, z, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
         self.x = x
         self.y = y
         self.z = z
@@ -255,27 +411,31 @@ class GetTemperaturesMachine(Marlin2Machine):
     TYPE = CommandType.GET_TEMPERATURES
     gotTemperatures = QtCore.Signal(str, dict, GetTemperaturesResult)
 
-    def __init__(self, commandConnection, id_, context, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
         self.setCommand(self.commandConnection.sendM105())
 
     def _enterDone(self, reply):
-        self.finish(self.gotTemperatures, GetTemperaturesResult(toolActual = reply['toolActual'],
-                                                                toolDesired = reply['toolDesired'],
-                                                                toolPower = reply['toolPower'] / 127,
-                                                                bedActual = reply['bedActual'],
-                                                                bedDesired = reply['bedDesired'],
-                                                                bedPower = reply['bedPower'] / 127))
+        self.finish(self.gotTemperatures, self.temperaturesResult(reply))
+
+    @staticmethod
+    def temperaturesResult(reply):
+        return GetTemperaturesResult(toolActual = reply['toolActual'],
+                                     toolDesired = reply['toolDesired'],
+                                     toolPower = reply['toolPower'] / 127,
+                                     bedActual = reply['bedActual'],
+                                     bedDesired = reply['bedDesired'],
+                                     bedPower = reply['bedPower'] / 127)
 
 class GetProbeOffsetsMachine(Marlin2Machine):
     TYPE = CommandType.GET_PROBE_OFFSETS
     gotProbeOffsets = QtCore.Signal(str, dict, GetProbeOffsetsResult)
 
-    def __init__(self, commandConnection, id_, context, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
@@ -290,8 +450,8 @@ class GetCurrentPositionMachine(Marlin2Machine):
     TYPE = CommandType.GET_CURRENT_POSITION
     gotCurrentPosition = QtCore.Signal(str, dict, GetCurrentPositionResult)
 
-    def __init__(self, commandConnection, id_, context, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
@@ -307,8 +467,8 @@ class GetTravelBoundsMachine(Marlin2Machine):
     TYPE = CommandType.GET_TRAVEL_BOUNDS
     gotTravelBounds = QtCore.Signal(str, dict, GetBoundsResult)
 
-    def __init__(self, commandConnection, id_, context, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
@@ -326,73 +486,48 @@ class GetMeshCoordinatesMachine(Marlin2Machine):
     TYPE = CommandType.GET_MESH_COORDINATES
     gotMeshCoordinates = QtCore.Signal(str, dict, GetMeshCoordinatesResult)
 
-    def __init__(self, commandConnection, id_, context, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, cache=None, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
+        self.cache = cache
         self.xCount = None
-        self.yCount = 0
+        self.yCount = None
+        self.storedMesh = None
         self.frontLeftX = None
         self.frontLeftY = None
         self.speed = 5000
 
     def start(self):
+        # T1 requests the CSV report, firmware without UBL ignores it
         self.setTransition(self._enterGetMeshSize)
-        self.setCommand(self.commandConnection.sendM420(v=True))
+        self.setCommand(self.commandConnection.sendM420(v=True, t=1))
 
     def _enterGetMeshSize(self, reply):
-        """ Currently only supports bilinear bed leveling. """
-
-        # Determine xCount and yCount
-        foundBilinear = False
-        for line in reply['response']:
-            # Skip echo lines
-            if line.startswith('echo:'):
-                continue
-            elif not foundBilinear:
-                if 'Bilinear Leveling Grid:' in line:
-                    foundBilinear = True
-                else:
-                    self.reportError('Detected an unexpected line.')
-                    return
-            else:
-                tokens = line.split()
-                if len(tokens) == 0 and \
-                   foundBilinear and \
-                   self.xCount is not None and \
-                   self.yCount is not None:
-                    break
-
-                if len(tokens) > 0:
-                    if self.stringIsInteger(tokens[0]):
-                        if self.xCount is None:
-                            if not self.stringIsInteger(tokens[-1]) or int(tokens[-1]) != len(tokens) - 1:
-                                self.reportError('Detected an unexpected line.')
-                                return
-                            self.xCount = len(tokens)
-                        else:
-                            if len(tokens) - 1 != self.xCount or int(tokens[0]) != self.yCount:
-                                self.reportError('Detected an unexpected line.')
-                                return
-                            self.yCount += 1
-
-        if foundBilinear == False:
-            self.reportError('No mesh found. Please perform automatic bed leveling and try again.')
-        elif self.xCount is None or self.yCount == 0:
-            self.reportError('Failed to parse the M420 output.')
-        else:
-            self.setTransition(self._enterMoveToFrontLeftPosition)
-            self.setCommand(self.commandConnection.sendG0(z=20))
+        """ Supports bilinear and unified bed leveling. """
 
-    def _enterMoveToFrontLeftPosition(self, reply):
-        self.setTransition(self._enterWaitForFrontLeft)
-        self.setCommand(self.commandConnection.sendG42(i=0, j=0, f=self.speed))
+        try:
+            self.storedMesh = CommandM420.parseMesh(reply['response'])
+        except ValueError as exception:
+            self.reportError(f'Failed to parse the M420 output. {exception}')
+            return
+
+        if self.storedMesh is None:
+            self.reportError('No mesh found. Please perform automatic bed leveling and try again.')
+            return
 
-    def _enterWaitForFrontLeft(self, reply):
-        self.setTransition(self._enterGetFrontLeftPosition)
-        self.setCommand(self.commandConnection.sendM400())
+        self.yCount = len(self.storedMesh)
+        self.xCount = len(self.storedMesh[0])
 
-    def _enterGetFrontLeftPosition(self, reply):
-        self.setTransition(self._enterMoveToBackRightPosition)
-        self.setCommand(self.commandConnection.sendM114())
+        # Skip the motion while the mesh still has the grid last measured
+        cached = None if self.cache is None else self.cache.get(self.cache.fingerprint(self.storedMesh))
+        if cached is not None:
+            self.finish(self.gotMeshCoordinates, cached._replace(storedMesh=self.storedMesh))
+        else:
+            self.setTransition(self._enterMoveToBackRightPosition)
+            self.setCommands(*self.sendPositioningMode(),
+                             self.commandConnection.sendG0(z=20),
+                             self.commandConnection.sendG42(i=0, j=0, f=self.speed),
+                             self.commandConnection.sendM400(),
+                             self.commandConnection.sendM114())
 
     def _enterMoveToBackRightPosition(self, reply):
         try:
@@ -402,16 +537,10 @@ class GetMeshCoordinatesMachine(Marlin2Machine):
             self.reportError('Failed to parse result of M114 command.')
             return
 
-        self.setTransition(self._enterWaitForBackRight)
-        self.setCommand(self.commandConnection.sendG42(i=self.xCount-1, j=self.yCount-1, f=self.speed))
-
-    def _enterWaitForBackRight(self, reply):
-        self.setTransition(self._enterGetBackRightPosition)
-        self.setCommand(self.commandConnection.sendM400())
-
-    def _enterGetBackRightPosition(self, reply):
         self.setTransition(self._enterDone)
-        self.setCommand(self.commandConnection.sendM114())
+        self.setCommands(self.commandConnection.sendG42(i=self.xCount-1, j=self.yCount-1, f=self.speed),
+                         self.commandConnection.sendM400(),
+                         self.commandConnection.sendM114())
 
     def _enterDone(self, reply):
         try:
@@ -421,19 +550,24 @@ class GetMeshCoordinatesMachine(Marlin2Machine):
             self.reportError('Failed to parse result of M114 command.')
             return
 
-        self.finish(self.gotMeshCoordinates, CommandPrinter.calculateMeshCoordinates(rowCount = self.yCount,
-                                                                                     columnCount = self.xCount,
-                                                                                     minX = self.frontLeftX,
-                                                                                     minY = self.frontLeftY,
-                                                                                     maxX = backRightX,
-                                                                                     maxY = backRightY))
+        result = CommandPrinter.calculateMeshCoordinates(rowCount = self.yCount,
+                                                         columnCount = self.xCount,
+                                                         minX = self.frontLeftX,
+                                                         minY = self.frontLeftY,
+                                                         maxX = backRightX,
+                                                         maxY = backRightY,
+                                                         storedMesh = self.storedMesh)
+        if self.cache is not None:
+            self.cache.put(self.cache.fingerprint(self.storedMesh), result)
+
+        self.finish(self.gotMeshCoordinates, result)
 
 class SetBedTemperatureMachine(Marlin2Machine):
     TYPE = CommandType.SET_BED_TEMPERATURE
     bedTemperatureSet = QtCore.Signal(str, dict)
 
-    def __init__(self, commandConnection, id_, context, temp, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, temp, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
         self.temp = temp
 
     def start(self):
@@ -447,8 +581,8 @@ class SetNozzleTemperatureMachine(Marlin2Machine):
     TYPE = CommandType.SET_NOZZLE_TEMPERATURE
     nozzleTemperatureSet = QtCore.Signal(str, dict)
 
-    def __init__(self, commandConnection, id_, context, temp, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, temp, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
         self.temp = temp
 
     def start(self):
@@ -462,8 +596,8 @@ class GetDefaultProbeSampleCountMachine(Marlin2Machine):
     TYPE = CommandType.GET_DEFAULT_PROBE_SAMPLE_COUNT
     gotDefaultProbeSampleCount = QtCore.Signal(str, dict, int)
 
-    def __init__(self, commandConnection, id_, context, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
 
     def start(self):
         self.finish(self.gotDefaultProbeSampleCount, Marlin2Printer.DEFAULT_PROBE_SAMPLE_COUNT)
@@ -472,8 +606,8 @@ class GetDefaultProbeZHeightMachine(Marlin2Machine):
     TYPE = CommandType.GET_DEFAULT_PROBE_Z_HEIGHT
     gotDefaultProbeZHeight = QtCore.Signal(str, dict, float)
 
-    def __init__(self, commandConnection, id_, context, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
 
     def start(self):
         self.finish(self.gotDefaultProbeZHeight, Marlin2Printer.DEFAULT_PROBE_Z_HEIGHT)
@@ -482,23 +616,27 @@ class GetDefaultProbeXYSpeedMachine(Marlin2Machine):
     TYPE = CommandType.GET_DEFAULT_PROBE_XY_SPEED
     gotDefaultProbeXYSpeed = QtCore.Signal(str, dict, float)
 
-    def __init__(self, commandConnection, id_, context, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
 
     def start(self):
         self.finish(self.gotDefaultProbeXYSpeed, Marlin2Printer.DEFAULT_PROBE_XY_SPEED)
 
 class ProbeMachine(Marlin2Machine):
-    """ Probe samples are averaged. """
+    """ Probe samples are averaged. With a tolerance, sampling stops early
+        once the mean is known well enough (see
+        CommandPrinter.setProbeAdaptiveSampling). """
 
     TYPE = CommandType.PROBE
     probed = QtCore.Signal(str, dict, ProbeResult)
 
-    def __init__(self, commandConnection, id_, context, x, y, sampleCount, xySpeed, probeHeight, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, x, y, sampleCount, xySpeed, probeHeight, maxSampleCount=None, tolerance=None, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
         self.x = x
         self.y = y
         self.sampleCount = sampleCount
+        self.maxSampleCount = maxSampleCount
+        self.tolerance = tolerance
         self.xySpeed = xySpeed
         self.probeHeight = probeHeight
         self.sampleList = []
@@ -509,8 +647,14 @@ class ProbeMachine(Marlin2Machine):
         assert(self.probeHeight >= 0.0)
 
     def start(self):
-        self.setTransition(self._enterMove)
-        self.setCommand(self.commandConnection.sendM851())
+        # Probe offsets are only requested when they aren't already known
+        if self.printerState.probeOffsets is not None:
+            self.xOffset = self.printerState.probeOffsets['x']
+            self.yOffset = self.printerState.probeOffsets['y']
+            self._enterMove(None)
+        else:
+            self.setTransition(self._enterMove)
+            self.setCommand(self.commandConnection.sendM851())
 
     def _enterMove(self, reply):
         if self.xOffset is None or self.yOffset is None:
@@ -521,12 +665,12 @@ class ProbeMachine(Marlin2Machine):
                 self.reportError('Failed to parse output of M851 command.')
                 return
 
-        self.setTransition(self._enterProbe)
-        self.setCommand(self.commandConnection.sendG0(x=self.x - self.xOffset, y=self.y - self.yOffset, z=self.probeHeight, f=self.xySpeed))
-
-    def _enterProbe(self, reply):
+        # Move and probe are queued together, the probe is only sent once the move succeeded
         self.setTransition(self._enterDone)
-        self.setCommand(self.commandConnection.sendG30(e=True, x=self.x, y=self.y))
+        move = self.commandConnection.sendG0(x=self.x - self.xOffset, y=self.y - self.yOffset, z=self.probeHeight, f=self.xySpeed)
+        self.setCommands(*self.sendPositioningMode(),
+                         move,
+                         self.commandConnection.sendG30(e=True, x=self.x, y=self.y, after=move))
 
     def _enterDone(self, reply):
         try:
@@ -534,18 +678,148 @@ class ProbeMachine(Marlin2Machine):
         except:
             self.reportError('Failed to process output of G30 command.')
         else:
-            if len(self.sampleList) < self.sampleCount:
+            if not CommandPrinter.probeSamplingDone(self.sampleList,
+                                                    sampleCount=self.sampleCount,
+                                                    maxSampleCount=self.maxSampleCount,
+                                                    tolerance=self.tolerance):
                 self._enterMove(None)
             else:
-                result = ProbeResult(x=self.x, y=self.y, z=statistics.mean(self.sampleList))
-                self.finish(self.probed, result)
+                self.finish(self.probed, CommandPrinter.probeResult(self.x, self.y, self.sampleList))
+
+class ProbeManyMachine(Marlin2Machine):
+    """ Samples are averaged. With a fixed sample count all probe moves are
+        queued up front. With a tolerance each point is sampled until its
+        mean is known well enough before moving on to the next one (see
+        CommandPrinter.setProbeAdaptiveSampling). With a clearance planner
+        points are also probed one at a time, so each travel height can use
+        the heights probed before it. """
+
+    TYPE = CommandType.PROBE_MANY
+    probedPoint = QtCore.Signal(str, dict, int, ProbeResult)
+    probedMany = QtCore.Signal(str, dict, list)
+
+    def __init__(self, commandConnection, printerState, id_, context, points, order, sampleCount, xySpeed, probeHeight, maxSampleCount=None, tolerance=None, clearancePlanner=None, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
+        self.points = points
+        self.order = order
+        self.sampleCount = sampleCount
+        self.maxSampleCount = maxSampleCount
+        self.tolerance = tolerance
+        self.clearancePlanner = clearancePlanner
+        self.xySpeed = xySpeed
+        self.probeHeight = probeHeight
+        self.previousPoint = None
+
+        # At least two samples are needed to estimate the spread
+        self.initialSampleCount = self.sampleCount if self.tolerance is None else max(self.sampleCount, min(2, self.maxSampleCount))
+
+        self.sampleLists = [[] for point in self.points]
+        self.results = [None] * len(self.points)
+        self.probeIndices = collections.deque()
+        self.orderPosition = 0
+        self.xOffset = None
+        self.yOffset = None
+
+        assert(self.sampleCount >= 1)
+        assert(self.probeHeight >= 0.0)
+
+    def start(self):
+        # Probe offsets are only requested when they aren't already known
+        if self.printerState.probeOffsets is not None:
+            self.xOffset = self.printerState.probeOffsets['x']
+            self.yOffset = self.printerState.probeOffsets['y']
+            self._enterProbe(None)
+        else:
+            self.setTransition(self._enterProbe)
+            self.setCommand(self.commandConnection.sendM851())
+
+    def _enterProbe(self, reply):
+        if self.xOffset is None or self.yOffset is None:
+            try:
+                self.xOffset = float(reply['x'])
+                self.yOffset = float(reply['y'])
+            except:
+                self.reportError('Failed to parse output of M851 command.')
+                return
+
+        # Travel heights are planned from the current probe position
+        position = self.printerState.position
+        if self.clearancePlanner is not None and position is not None and position['x'] is not None and position['y'] is not None:
+            self.previousPoint = Point2F(position['x'] + self.xOffset, position['y'] + self.yOffset)
+
+        commands = self.sendPositioningMode()
+        if self.tolerance is None and self.clearancePlanner is None:
+            for index in self.order:
+                commands += self._sendSamples(index, self.sampleCount)
+            self.setTransition(self._enterDone)
+        else:
+            commands += self._sendSamples(self.order[0], self.initialSampleCount)
+            self.setTransition(self._enterSampled)
+
+        self.setCommands(*commands, progress=self._processProbe)
+
+    def _sendSamples(self, index, count):
+        point = self.points[index]
+        commands = []
+        for sample in range(count):
+            if self.clearancePlanner is None:
+                move = self.commandConnection.sendG0(x=point.x - self.xOffset, y=point.y - self.yOffset, z=self.probeHeight, f=self.xySpeed)
+            else:
+                # Reach the travel height first so the whole move clears the bed
+                height = self.clearancePlanner.hopHeight(self.previousPoint, point, self.probeHeight, probeOffset=Point2F(self.xOffset, self.yOffset))
+                commands.append(self.commandConnection.sendG0(z=height))
+                move = self.commandConnection.sendG0(x=point.x - self.xOffset, y=point.y - self.yOffset, f=self.xySpeed)
+                self.previousPoint = point
+            commands.append(move)
+
+            # The probe is only sent once the move succeeded
+            commands.append(self.commandConnection.sendG30(e=True, x=point.x, y=point.y, after=move))
+            self.probeIndices.append(index)
+        return commands
+
+    def _processProbe(self, command):
+        if command.NAME != 'G30':
+            return
+
+        index = self.probeIndices.popleft()
+        try:
+            self.sampleLists[index].append(command.result['bed']['z'])
+        except:
+            self.abort()
+            self.reportError('Failed to process output of G30 command.')
+            return
+
+        if CommandPrinter.probeSamplingDone(self.sampleLists[index],
+                                            sampleCount=self.sampleCount,
+                                            maxSampleCount=self.maxSampleCount,
+                                            tolerance=self.tolerance):
+            point = self.points[index]
+            self.results[index] = CommandPrinter.probeResult(point.x, point.y, self.sampleLists[index])
+            if self.clearancePlanner is not None:
+                self.clearancePlanner.addHeight(point.x, point.y, self.results[index].z)
+            self.probedPoint.emit(self.id_, self.context, index, self.results[index])
+
+    def _enterSampled(self, reply):
+        # Sample the current point again until it is done, then move on
+        if self.results[self.order[self.orderPosition]] is None:
+            self.setCommands(*self._sendSamples(self.order[self.orderPosition], 1), progress=self._processProbe)
+            return
+
+        self.orderPosition += 1
+        if self.orderPosition == len(self.order):
+            self._enterDone(reply)
+        else:
+            self.setCommands(*self._sendSamples(self.order[self.orderPosition], self.initialSampleCount), progress=self._processProbe)
+
+    def _enterDone(self, reply):
+        self.finish(self.probedMany, self.results)
 
 class MoveMachine(Marlin2Machine):
     TYPE = CommandType.MOVE
     moved = QtCore.Signal(str, dict)
 
-    def __init__(self, commandConnection, id_, context, x, y, z, e, f, wait, relative, parent=None):
-        super().__init__(commandConnection, id_, context, parent)
+    def __init__(self, commandConnection, printerState, id_, context, x, y, z, e, f, wait, relative, parent=None):
+        super().__init__(commandConnection, printerState, id_, context, parent)
         self.x = x
         self.y = y
         self.z = z
@@ -555,19 +829,13 @@ class MoveMachine(Marlin2Machine):
         self.relative = relative
 
     def start(self):
-        self.setTransition(self._enterMove)
-        if self.relative:
-            self.setCommand(self.commandConnection.sendG91())
-        else:
-            self.setCommand(self.commandConnection.sendG90())
-
-    def _enterMove(self, reply):
-        self.setTransition(self._enterWait if self.wait else self._enterDone)
-        self.setCommand(self.commandConnection.sendG0(x=self.x, y=self.y, z=self.z, e=self.e, f=self.f))
+        commands = self.sendPositioningMode(relative=self.relative)
+        commands.append(self.commandConnection.sendG0(x=self.x, y=self.y, z=self.z, e=self.e, f=self.f))
+        if self.wait:
+            commands.append(self.commandConnection.sendM400())
 
-    def _enterWait(self, reply):
         self.setTransition(self._enterDone)
-        self.setCommand(self.commandConnection.sendM400())
+        self.setCommands(*commands)
 
     def _enterDone(self, reply):
         self.finish(self.moved)
\ No newline at end of file
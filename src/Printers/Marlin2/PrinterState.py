@@ -0,0 +1,97 @@
+from enum import StrEnum
+
+class PositioningMode(StrEnum):
+    ABSOLUTE = 'G90'
+    RELATIVE = 'G91'
+
+class PrinterState:
+    """ Last known state of a Marlin 2 printer, None when unknown.
+
+        Commands are executed in queue order, so modal state (positioning
+        mode, commanded position) is updated when a command is queued and
+        describes the printer after all queued commands have run. Query
+        results are applied when the command finishes, unless a later queued
+        command has changed the same state in the meantime. """
+
+    def __init__(self):
+        self.invalidate()
+
+    def invalidate(self):
+        self.positioningMode = None
+        self.probeOffsets = None # {'x', 'y', 'z'}
+        self.travelBounds = None # {'minX', 'maxX', 'minY', 'maxY', 'minZ', 'maxZ'}
+        self.position = None     # {'x', 'y', 'z'}, None for unknown axes
+        self._positionGeneration = 0
+        self._pendingQueries = {} # command: position generation when queued
+
+    def _setPosition(self, **kwargs):
+        self._positionGeneration += 1
+        position = self.position if self.position is not None else {'x': None, 'y': None, 'z': None}
+        self.position = position | kwargs
+
+    def commandQueued(self, command):
+        match command.NAME:
+            case 'G0':
+                self._queuedMove(command)
+            case 'G28':
+                self.invalidate()
+            case 'G30':
+                self._pendingQueries[command] = self._positionGeneration
+            case 'G42':
+                self._setPosition(x=None, y=None)
+            case 'G90':
+                self.positioningMode = PositioningMode.ABSOLUTE
+            case 'G91':
+                self.positioningMode = PositioningMode.RELATIVE
+            case 'M114':
+                self._pendingQueries[command] = self._positionGeneration
+            case 'M851':
+                if command.x is not None or command.y is not None or command.z is not None:
+                    self.probeOffsets = None
+
+    def _queuedMove(self, command):
+        if command.x is None and command.y is None and command.z is None:
+            return
+
+        if self.positioningMode is None:
+            self._setPosition(x=None, y=None, z=None)
+            return
+
+        current = self.position if self.position is not None else {'x': None, 'y': None, 'z': None}
+        position = {}
+        for axis in ['x', 'y', 'z']:
+            value = getattr(command, axis)
+            if value is None:
+                continue
+            elif self.positioningMode == PositioningMode.ABSOLUTE:
+                position[axis] = float(value)
+            else:
+                position[axis] = None if current[axis] is None else current[axis] + float(value)
+
+        self._setPosition(**position)
+
+    def commandFinished(self, command):
+        generation = self._pendingQueries.pop(command, None)
+
+        if command.error is not None or command.result is None:
+            return
+
+        match command.NAME:
+            case 'G30':
+                if generation == self._positionGeneration:
+                    self._setPosition(x=command.result['position']['x'],
+                                      y=command.result['position']['y'],
+                                      z=command.result['position']['z'])
+            case 'M114':
+                if generation == self._positionGeneration:
+                    self._setPosition(x=command.result['x'],
+                                      y=command.result['y'],
+                                      z=command.result['z'])
+            case 'M211':
+                if command.s is None and 'minX' in command.result:
+                    self.travelBounds = {key: command.result[key] for key in ['minX', 'maxX', 'minY', 'maxY', 'minZ', 'maxZ']}
+            case 'M851':
+                if command.x is None and command.y is None and command.z is None:
+                    self.probeOffsets = {'x': command.result['x'],
+                                         'y': command.result['y'],
+                                         'z': command.result['z']}
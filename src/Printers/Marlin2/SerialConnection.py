@@ -1,26 +1,44 @@
 #!/usr/bin/env python
 
-from Common.Common import LOG_ALL
+from . import WireTap
+from .LineFramer import LineFramer
+from Common import Tracer
+from Common.Log import getLogger
 from PySide6 import QtCore
 from PySide6 import QtSerialPort
 import logging
-import math
+import time
 
 class SerialConnection(QtCore.QObject):
     # TODO: Determine if an errorOccurred signal is needed
 
-    def __init__(self, printerInfo, *args, **kwargs):
+    _invokeRequested = QtCore.Signal(object) # function run on the connection's thread
+
+    def __init__(self, printerInfo, *args, wireTap=None, tracer=None, **kwargs):
         super().__init__(*args, **kwargs)
 
         # Get logger
-        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger = getLogger(self)
+
+        # Raw capture of the serial traffic, None when disabled
+        self.wireTap = wireTap if wireTap is not None else WireTap.defaultWireTap()
+
+        # Trace of sent and received lines, None when disabled
+        self.tracer = tracer if tracer is not None else Tracer.defaultTracer()
 
-        # Serial port
-        self._serialPort = QtSerialPort.QSerialPort()
+        # Worker thread, None while the connection lives on its creator's
+        # thread. The thread is tracked here as calling thread() on a PySide
+        # object can leave the main thread's wrapper owned by Python.
+        self._workerThread = None
+        self._currentThread = QtCore.QThread.currentThread()
+        self._invokeRequested.connect(self._invoke, QtCore.Qt.BlockingQueuedConnection)
+
+        # Serial port (a child, so it follows the connection between threads)
+        self._serialPort = QtSerialPort.QSerialPort(self)
         self._serialPort.readyRead.connect(self._readData)
         self._serialPort.errorOccurred.connect(self._handleSerialPortError)
 
-        self.readBuffer = b''
+        self.lineFramer = LineFramer(badLineHandler=self._badLine)
 
         self._serialPort.setBaudRate(printerInfo.connection.baudRate)
         self._serialPort.setDataBits(printerInfo.connection.dataBits)
@@ -57,6 +75,58 @@ class SerialConnection(QtCore.QObject):
 
         self._error(f'Serial port error: {message}')
 
+    def startThread(self, name='Serial'):
+        """ Moves the connection to a thread of its own so reading, parsing
+            and writing don't compete with the GUI. Signals then reach
+            receivers on other threads queued. """
+
+        assert(self._workerThread is None and not self._serialPort.isOpen())
+
+        self._workerThread = QtCore.QThread()
+        self._workerThread.setObjectName(name)
+        self._workerThread.start()
+        self.moveToThread(self._workerThread)
+        self._currentThread = self._workerThread
+
+    def stopThread(self):
+        """ Moves the connection back to the calling thread and stops the
+            worker thread. """
+
+        if self._workerThread is None:
+            return
+
+        callingThread = QtCore.QThread.currentThread()
+        self._call(self.moveToThread, callingThread)
+        self._currentThread = callingThread
+        self._workerThread.quit()
+        self._workerThread.wait()
+        self._workerThread = None
+
+    def isCurrentThread(self):
+        return QtCore.QThread.currentThread() == self._currentThread
+
+    def _call(self, function, *args, **kwargs):
+        """ Runs function on the connection's thread and waits for it to
+            return, exceptions are re-raised in the calling thread. """
+
+        if self.isCurrentThread():
+            return function(*args, **kwargs)
+
+        outcome = {}
+        def run():
+            try:
+                outcome['result'] = function(*args, **kwargs)
+            except Exception as exception:
+                outcome['exception'] = exception
+
+        self._invokeRequested.emit(run)
+        if 'exception' in outcome:
+            raise outcome['exception']
+        return outcome.get('result')
+
+    def _invoke(self, function):
+        function()
+
     def connected(self):
         return self._serialPort.isOpen()
 
@@ -64,6 +134,9 @@ class SerialConnection(QtCore.QObject):
         return self._serialPort.portName()
 
     def open(self, portName, *, clear=True):
+        self._call(self._openPort, portName, clear=clear)
+
+    def _openPort(self, portName, *, clear):
         assert(not self._serialPort.isOpen())
 
         self._serialPort.setPortName(portName)
@@ -73,47 +146,46 @@ class SerialConnection(QtCore.QObject):
 
         if clear and not self._serialPort.clear():
             self._error(f'Failed to clear {portName}.')
+        self.lineFramer.clear()
 
         self.logger.info(f'Opened {self._serialPort.portName()}')
 
     def close(self):
+        self._call(self._closePort)
+
+    def _closePort(self):
         if self._serialPort.isOpen():
             self._serialPort.close()
             self.logger.info(f'Closed {self._serialPort.portName()}')
 
     def write(self, string):
-        self._serialPort.write((string + '\n').encode())
+        data = (string + '\n').encode()
+        if self.wireTap is not None:
+            self.wireTap.tx(data)
+        if self.tracer is not None:
+            self.tracer.instant('TX', 'serial', time.perf_counter(), line=string)
+        self._serialPort.write(data)
 
     def _readData(self):
         """ TODO: Improve error handling here """
 
-        self.readBuffer += self._serialPort.readAll()
+        data = self._serialPort.readAll().data()
+        if self.wireTap is not None:
+            self.wireTap.rx(data)
 
-        # Log the read buffer
-        self.logger.log(LOG_ALL, f'Read buffer: ')
-        for batch in range(int(math.ceil(self.readBuffer.length() / 16))):
-            startIndex = 16 * batch
-            stopIndex = min(startIndex + 16, self.readBuffer.length())
-            message = f'[0x{startIndex:02X}]:'
-            for currentIndex in range(startIndex, stopIndex):
-                message += f' {self.readBuffer[currentIndex].hex().upper()}'
-            self.logger.log(LOG_ALL, message)
+        for line in self.lineFramer.feed(data):
+            self.logger.debug('Line: %s', line)
+            if self.tracer is not None:
+                self.tracer.instant('RX', 'serial', time.perf_counter(), line=line)
 
-        while (index := self.readBuffer.indexOf(b'\n')) > -1:
-            # Extract line
+            # A failing line must not drop the lines read after it
             try:
-                lineEndIndex = index - 1 if index > 0 and self.readBuffer[index - 1] == b'\r' else index
-                line = str(self.readBuffer[:lineEndIndex], 'ascii') # TODO: Verify the correct encoding
-            except UnicodeDecodeError:
-                self.logger.warn(f'Detected bad bytes: {self.readBuffer.data().hex()}.')
-                self.readBuffer.clear()
-                continue
-
-            self.readBuffer = self.readBuffer[index+1:]
-
-            self.logger.debug(f'Line: {line}')
+                self._processLine(line)
+            except Exception as exception:
+                self.logger.error('Failed to process line %r: %s', line, exception)
 
-            self._processLine(line)
+    def _badLine(self, data):
+        self.logger.warning(f'Detected bad bytes: {data.hex()}.')
 
     def _error(self, message):
         """ TODO: This needs to be fixed """
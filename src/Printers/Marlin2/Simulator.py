@@ -0,0 +1,665 @@
+#!/usr/bin/env python
+
+from Common.Simulation import BedSurface
+from Common.Simulation import Heater
+from Common.Simulation import trapezoidTime
+import collections
+import functools
+import math
+import operator
+import os
+import queue
+import random
+import re
+import select
+import threading
+import time
+
+class Simulator:
+    """ Virtual Marlin 2 printer behind a pseudo-terminal (POSIX only).
+
+        Lines are received like the firmware does, including line numbers and
+        checksums, and executed in order from a command buffer. Moves are
+        planned and answered at once, while G28, G30 and M400 wait for the
+        motion to finish and report busy. Durations are derived from the
+        feedrates and accelerations in simulated seconds and multiplied by
+        timeScale to get the wall clock time, so 0 makes motion and heating
+        instant. latency is the processing time of each command in seconds,
+        either a number or a dict by command name with an optional 'default'
+        entry. The stored mesh is sampled from surface on a meshSize grid. """
+
+    FIRMWARE_NAME = 'Marlin 2.1.2.1 (Simulator)'
+    STEPS_PER_MM = (80, 80, 400)
+    MAX_FEEDRATE = (500.0, 500.0, 5.0) # mm/s
+    ACCELERATION = (500.0, 500.0, 100.0) # mm/s²
+    HOMING_FEEDRATE = (50.0, 50.0, 4.0) # mm/s
+    HOMING_BUMP_TIME = 1.0 # s per axis
+    Z_AFTER_HOMING = 10.0
+    XY_PROBE_FEEDRATE = 133.0 # mm/s
+    Z_PROBE_FEEDRATE_FAST = 4.0 # mm/s
+    Z_PROBE_FEEDRATE_SLOW = 2.0 # mm/s
+    Z_CLEARANCE_MULTI_PROBE = 5.0
+    Z_CLEARANCE_BETWEEN_PROBES = 5.0
+    PROBING_MARGIN = 10.0
+
+    def __init__(self, *, bounds=((0.0, 0.0, 0.0), (200.0, 200.0, 200.0)), probeOffset=(-10.0, -10.0, -1.5),
+                 meshSize=(5, 5), surface=None, noise=0.0, seed=None, latency=0.0, busyInterval=2.0,
+                 timeScale=1.0, advancedOk=True, bufferSize=4, plannerSize=16, baudRate=None, corruption=0.0,
+                 autoReportTemp=True):
+        self.bounds = bounds
+        self.probeOffset = list(probeOffset)
+        self.meshSize = meshSize # columns, rows
+        self.surface = BedSurface(center=((bounds[0][0] + bounds[1][0]) / 2, (bounds[0][1] + bounds[1][1]) / 2)) if surface is None else surface
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.latency = latency if isinstance(latency, dict) else {'default': latency}
+        self.busyInterval = busyInterval
+        self.timeScale = timeScale
+        self.advancedOk = advancedOk
+        self.bufferSize = bufferSize
+        self.plannerSize = plannerSize
+        self.baudRate = baudRate
+        self.corruption = corruption
+        self.autoReportTemp = autoReportTemp
+
+        self.handlers = {'G0': self._move,
+                         'G1': self._move,
+                         'G28': self._home,
+                         'G30': self._probe,
+                         'G42': self._moveToMeshPoint,
+                         'G90': self._setAbsolute,
+                         'G91': self._setRelative,
+                         'M104': self._setNozzleTemperature,
+                         'M105': self._reportTemperatures,
+                         'M110': self._setLineNumber,
+                         'M114': self._reportPosition,
+                         'M115': self._reportFirmware,
+                         'M118': self._echo,
+                         'M140': self._setBedTemperature,
+                         'M155': self._setTemperatureAutoReport,
+                         'M211': self._softEndstops,
+                         'M400': self._synchronize,
+                         'M420': self._bedLeveling,
+                         'M851': self._probeOffsets}
+
+        # Statistics
+        self.receivedLines = []
+        self.commandCounts = collections.Counter()
+        self.resendCount = 0
+
+        self.port = None
+        self.master = None
+        self.slave = None
+        self.threads = []
+        self.stopEvent = threading.Event()
+        self.writeLock = threading.Lock()
+        self.commandQueue = queue.Queue(maxsize=max(1, self.bufferSize - 1))
+        self.reset()
+
+    def reset(self):
+        """ Restores the power on state. """
+
+        self.position = [(self.bounds[0][axis] + self.bounds[1][axis]) / 2 for axis in range(3)]
+        self.homed = [False, False, False]
+        self.relative = False
+        self.feedrate = 50.0 # mm/s
+        self.softEndstops = True
+        self.lastLineNumber = 0
+        self.motionEnd = 0.0
+        self.blocks = collections.deque() # End times of the planned moves
+        self.lastBusyTime = 0.0
+
+        self.meshValid = True
+        self.levelingActive = True
+        self.fadeHeight = 10.0
+        self.storedMesh = [[round(self.surface(x, y), 3) for x, y in row] for row in self.meshCoordinates()]
+
+        self.nozzleHeater = Heater(30.0)
+        self.bedHeater = Heater(90.0)
+        self.autoReportInterval = 0
+        self.nextAutoReportTime = None
+
+    def meshCoordinates(self):
+        """ Returns the mesh points as (x, y) indexed by [row][column], with
+            row 0 at the front, matching what G29 would probe. """
+
+        minX, maxX = self.probeRange(0)
+        minY, maxY = self.probeRange(1)
+        columnCount, rowCount = self.meshSize
+        return [[(minX + (maxX - minX) * column / (columnCount - 1), minY + (maxY - minY) * row / (rowCount - 1))
+                 for column in range(columnCount)] for row in range(rowCount)]
+
+    def probeRange(self, axis):
+        """ The probe can reach the bed within the probing margin as long as
+            the nozzle stays within the travel bounds. """
+
+        return (max(self.bounds[0][axis] + self.PROBING_MARGIN, self.bounds[0][axis] + self.probeOffset[axis]),
+                min(self.bounds[1][axis] - self.PROBING_MARGIN, self.bounds[1][axis] + self.probeOffset[axis]))
+
+    def canProbe(self, x, y):
+        return all(low - 1e-6 <= value <= high + 1e-6 for value, (low, high) in zip((x, y), (self.probeRange(0), self.probeRange(1))))
+
+    def start(self):
+        """ Opens the pseudo-terminal and returns the port name to connect
+            to. """
+
+        # POSIX only
+        import tty
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        self.stopEvent.clear()
+        self.threads = [threading.Thread(target=target, name=f'Simulator {name}', daemon=True)
+                        for name, target in [('reader', self._readLoop),
+                                             ('executor', self._executeLoop),
+                                             ('reporter', self._autoReportLoop)]]
+        for thread in self.threads:
+            thread.start()
+
+        return self.port
+
+    def stop(self):
+        self.stopEvent.set()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+
+        for fd in [self.master, self.slave]:
+            if fd is not None:
+                os.close(fd)
+        self.master = None
+        self.slave = None
+        self.port = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # Time
+    def wallTime(self, duration):
+        return duration * self.timeScale
+
+    def simulatedTime(self):
+        """ Seconds of simulated time, None when time is not simulated. """
+
+        return time.monotonic() / self.timeScale if self.timeScale > 0 else None
+
+    def _waitUntil(self, endTime):
+        """ Sleeps like a blocking command, reporting busy while it waits. """
+
+        while not self.stopEvent.is_set():
+            now = time.monotonic()
+            if now >= endTime:
+                return
+
+            nextBusyTime = math.inf if not self.busyInterval else self.lastBusyTime + self.busyInterval
+            if now >= nextBusyTime:
+                self._send('echo:busy: processing')
+                self.lastBusyTime = now
+            else:
+                self.stopEvent.wait(min(endTime, nextBusyTime) - now)
+
+    def _wait(self, duration):
+        self._waitUntil(time.monotonic() + self.wallTime(duration))
+
+    # Output
+    def _send(self, line):
+        data = (line + '\n').encode()
+        with self.writeLock:
+            if self.baudRate:
+                time.sleep(len(data) * 10 / self.baudRate)
+
+            # Output is dropped when nobody reads it, like on a real UART
+            while data and self.master is not None and not self.stopEvent.is_set():
+                try:
+                    data = data[os.write(self.master, data):]
+                except BlockingIOError:
+                    if not select.select([], [self.master], [], 1.0)[1]:
+                        return
+
+    def _okLine(self):
+        if not self.advancedOk:
+            return 'ok'
+
+        # The executing command still holds its buffer entry
+        return f'ok P{max(0, self.plannerSize - len(self.blocks))} B{max(0, self.bufferSize - 1 - self.commandQueue.qsize())}'
+
+    def _positionLine(self):
+        counts = [round(value * steps) for value, steps in zip(self.position, self.STEPS_PER_MM)]
+        return f'X:{self.position[0]:.2f} Y:{self.position[1]:.2f} Z:{self.position[2]:.2f} E:0.00 ' \
+               f'Count X:{counts[0]} Y:{counts[1]} Z:{counts[2]}'
+
+    def _temperatureReport(self):
+        now = self.simulatedTime()
+        return f'T:{self.nozzleHeater.temperature(now):.2f} /{self.nozzleHeater.target:.2f} ' \
+               f'B:{self.bedHeater.temperature(now):.2f} /{self.bedHeater.target:.2f} ' \
+               f'@:{self.nozzleHeater.power(now)} B@:{self.bedHeater.power(now)}'
+
+    # Input
+    def _readLoop(self):
+        data = b''
+        while not self.stopEvent.is_set():
+            if not select.select([self.master], [], [], 0.1)[0]:
+                continue
+
+            try:
+                data += os.read(self.master, 4096)
+            except (BlockingIOError, OSError):
+                continue
+
+            *lines, data = re.split(rb'[\r\n]', data)
+            for line in lines:
+                self._receive(line.decode(errors='replace'))
+
+    def _receive(self, line):
+        # Comments and surrounding whitespace are dropped
+        line = line.split(';', 1)[0].strip()
+        if not line:
+            return
+        self.receivedLines.append(line)
+
+        if line.startswith('N'):
+            match = re.fullmatch(r'N(\d+)\s*(.*?)(?:\*(\d+))?', line)
+            if match is None:
+                return
+            number = int(match[1])
+            command = match[2]
+
+            # M110 sets the line number to its own N value
+            isM110 = command.startswith('M110')
+            if isM110 and (setting := re.search(r'N(\d+)', command[4:])) is not None:
+                number = int(setting[1])
+
+            if number != self.lastLineNumber + 1 and not isM110:
+                self._requestResend('Line Number is not Last Line Number+1')
+                return
+            if match[3] is None:
+                self._requestResend('No Checksum with line number')
+                return
+            checksum = functools.reduce(operator.xor, line[:line.rfind('*')].encode(), 0)
+            if checksum != int(match[3]) or self.random.random() < self.corruption:
+                self._requestResend('checksum mismatch')
+                return
+
+            self.lastLineNumber = number
+            line = command
+
+        # The reader stalls while the buffer is full
+        while not self.stopEvent.is_set():
+            try:
+                self.commandQueue.put(line, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _requestResend(self, message):
+        self.resendCount += 1
+        self._send(f'Error:{message}, Last Line: {self.lastLineNumber}')
+        self._send(f'Resend: {self.lastLineNumber + 1}')
+        self._send(self._okLine())
+
+    # Execution
+    def _executeLoop(self):
+        while not self.stopEvent.is_set():
+            try:
+                line = self.commandQueue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self._execute(line)
+
+    def _execute(self, line):
+        self.lastBusyTime = time.monotonic()
+        name, _, arguments = line.partition(' ')
+        name = name.upper()
+        self.commandCounts[name] += 1
+
+        latency = self.latency.get(name, self.latency.get('default', 0.0))
+        if latency > 0:
+            time.sleep(latency)
+
+        handler = self.handlers.get(name)
+        if handler is None:
+            self._send(f'echo:Unknown command: "{line}"')
+            self._send(self._okLine())
+            return
+
+        okLine = handler(arguments) if name == 'M118' else handler(self._parseParameters(arguments))
+        self._retireBlocks()
+        self._send(self._okLine() if okLine is None else okLine)
+
+    @staticmethod
+    def _parseParameters(arguments):
+        return {token[0].upper(): token[1:] for token in arguments.split()}
+
+    @staticmethod
+    def _float(parameters, letter, default=None):
+        value = parameters.get(letter)
+        return default if value is None or value == '' else float(value)
+
+    # Motion
+    def _moveTime(self, start, end, feedrate):
+        xyDistance = math.hypot(end[0] - start[0], end[1] - start[1])
+        xyTime = trapezoidTime(xyDistance, min(feedrate, self.MAX_FEEDRATE[0]), self.ACCELERATION[0])
+        zTime = trapezoidTime(abs(end[2] - start[2]), min(feedrate, self.MAX_FEEDRATE[2]), self.ACCELERATION[2])
+        return max(xyTime, zTime)
+
+    def _clamp(self, position):
+        if not self.softEndstops:
+            return position
+        return [max(low, min(high, value)) for value, low, high in zip(position, self.bounds[0], self.bounds[1])]
+
+    def _retireBlocks(self):
+        now = time.monotonic()
+        while self.blocks and self.blocks[0] <= now:
+            self.blocks.popleft()
+
+    def _plan(self, target, feedrate):
+        """ Queues a move, waiting for a free planner block first. """
+
+        target = self._clamp(target)
+        self._retireBlocks()
+        if len(self.blocks) >= self.plannerSize:
+            self._waitUntil(self.blocks[0])
+            self._retireBlocks()
+
+        startTime = max(time.monotonic(), self.motionEnd)
+        self.motionEnd = startTime + self.wallTime(self._moveTime(self.position, target, feedrate))
+        self.blocks.append(self.motionEnd)
+        self.position = target
+
+    def _synchronize(self, parameters=None):
+        self._waitUntil(self.motionEnd)
+        self._retireBlocks()
+
+    def _move(self, parameters):
+        if 'F' in parameters:
+            self.feedrate = self._float(parameters, 'F') / 60
+
+        target = list(self.position)
+        for axis, letter in enumerate('XYZ'):
+            value = self._float(parameters, letter)
+            if value is not None:
+                target[axis] = target[axis] + value if self.relative else value
+        self._plan(target, self.feedrate)
+
+    def _setAbsolute(self, parameters):
+        self.relative = False
+
+    def _setRelative(self, parameters):
+        self.relative = True
+
+    def _home(self, parameters):
+        self._synchronize()
+
+        axes = [letter in parameters for letter in 'XYZ']
+        if not any(axes):
+            axes = [True, True, True]
+
+        # Unhomed axes still travel from where they physically are
+        duration = 0.0
+        target = list(self.position)
+        for axis in [0, 1]:
+            if axes[axis]:
+                distance = self.position[axis] - self.bounds[0][axis]
+                duration += distance / self.HOMING_FEEDRATE[axis] + self.HOMING_BUMP_TIME
+                target[axis] = self.bounds[0][axis]
+                self.homed[axis] = True
+
+        # Z is homed at the center of the bed (Z_SAFE_HOMING)
+        if axes[2]:
+            center = [(self.bounds[0][axis] + self.bounds[1][axis]) / 2 for axis in [0, 1]]
+            duration += self._moveTime(target, center + [target[2]], self.MAX_FEEDRATE[0])
+            duration += (self.position[2] - self.bounds[0][2]) / self.HOMING_FEEDRATE[2] + self.HOMING_BUMP_TIME
+            duration += self.Z_AFTER_HOMING / self.HOMING_FEEDRATE[2]
+            target = center + [self.Z_AFTER_HOMING]
+            self.homed[2] = True
+
+        self._wait(duration)
+        self.position = target
+        self._send(self._positionLine())
+
+    def _probe(self, parameters):
+        self._synchronize()
+        if not all(self.homed):
+            self._send('echo:Home XYZ First')
+            return
+
+        x = self._float(parameters, 'X', self.position[0] + self.probeOffset[0])
+        y = self._float(parameters, 'Y', self.position[1] + self.probeOffset[1])
+        if not self.canProbe(x, y):
+            self._send('Z Probe Past Bed')
+            return
+
+        measured = self.surface(x, y) + (self.random.gauss(0.0, self.noise) if self.noise > 0 else 0.0)
+        triggerHeight = measured - self.probeOffset[2]
+        nozzle = [x - self.probeOffset[0], y - self.probeOffset[1], self.position[2]]
+
+        # Travel, fast and slow touch, then raise
+        duration = self._moveTime(self.position, nozzle, self.XY_PROBE_FEEDRATE)
+        duration += max(0.0, self.position[2] - triggerHeight) / self.Z_PROBE_FEEDRATE_FAST
+        duration += self.Z_CLEARANCE_MULTI_PROBE / self.Z_PROBE_FEEDRATE_FAST
+        duration += self.Z_CLEARANCE_MULTI_PROBE / self.Z_PROBE_FEEDRATE_SLOW
+        duration += self.Z_CLEARANCE_BETWEEN_PROBES / self.Z_PROBE_FEEDRATE_FAST
+        self._wait(duration)
+
+        self.position = nozzle[:2] + [triggerHeight + self.Z_CLEARANCE_BETWEEN_PROBES]
+        self._send(f'Bed X:{x:.2f} Y:{y:.2f} Z:{measured:.3f}')
+        self._send(self._positionLine())
+
+    def _moveToMeshPoint(self, parameters):
+        if not all(self.homed):
+            self._send('echo:Home XYZ First')
+            return
+
+        i = self._float(parameters, 'I')
+        j = self._float(parameters, 'J')
+        columnCount, rowCount = self.meshSize
+        if i is None or j is None or not (0 <= i < columnCount and 0 <= j < rowCount):
+            self._send('Error:Mesh point out of range')
+            return
+
+        x, y = self.meshCoordinates()[int(j)][int(i)]
+        if 'P' in parameters:
+            x -= self.probeOffset[0]
+            y -= self.probeOffset[1]
+
+        if 'F' in parameters:
+            self.feedrate = self._float(parameters, 'F') / 60
+        self._plan([x, y, self.position[2]], self.feedrate)
+
+    def _reportPosition(self, parameters):
+        self._send(self._positionLine())
+
+    # Settings
+    def _setLineNumber(self, parameters):
+        # Handled by the reader, which sees the line number first
+        pass
+
+    def _softEndstops(self, parameters):
+        if 'S' in parameters:
+            self.softEndstops = self._float(parameters, 'S', 1) != 0
+            return
+
+        self._send(f'  M211 S{int(self.softEndstops)} ; {"ON" if self.softEndstops else "OFF"}')
+        self._send('  Min:  ' + ' '.join(f'{letter}{value:.2f}' for letter, value in zip('XYZ', self.bounds[0])) +
+                   '   Max:  ' + ' '.join(f'{letter}{value:.2f}' for letter, value in zip('XYZ', self.bounds[1])))
+
+    def _probeOffsets(self, parameters):
+        if any(letter in parameters for letter in 'XYZ'):
+            for axis, letter in enumerate('XYZ'):
+                self.probeOffset[axis] = self._float(parameters, letter, self.probeOffset[axis])
+            return
+
+        self._send('  M851 ' + ' '.join(f'{letter}{value:.2f}' for letter, value in zip('XYZ', self.probeOffset)) + ' ; (mm)')
+
+    def _bedLeveling(self, parameters):
+        if 'Z' in parameters:
+            self.fadeHeight = self._float(parameters, 'Z')
+
+        if 'S' in parameters:
+            enable = self._float(parameters, 'S', 1) != 0
+            if enable and not self.meshValid:
+                self._send('echo:Invalid mesh.')
+                self._send('Error:Failed to enable Bed Leveling')
+            else:
+                self.levelingActive = enable
+
+        if 'V' in parameters and self._float(parameters, 'V', 1) != 0:
+            if self.meshValid:
+                self._send('Bilinear Leveling Grid:')
+                self._send(''.join(f'{column:7}' for column in range(self.meshSize[0])))
+                for row, values in enumerate(self.storedMesh):
+                    self._send(f'{row:2}' + ''.join(f' {value:+.3f}' for value in values))
+                self._send('')
+            else:
+                self._send('echo:Invalid mesh.')
+
+        self._send(f'echo:Bed Leveling {"ON" if self.levelingActive else "OFF"}')
+        self._send(f'echo:Fade Height {self.fadeHeight:.2f}')
+
+    # Temperatures
+    def _setNozzleTemperature(self, parameters):
+        self.nozzleHeater.setTarget(self._float(parameters, 'S', 0.0), self.simulatedTime())
+
+    def _setBedTemperature(self, parameters):
+        self.bedHeater.setTarget(self._float(parameters, 'S', 0.0), self.simulatedTime())
+
+    def _reportTemperatures(self, parameters):
+        return 'ok ' + self._temperatureReport()
+
+    def _setTemperatureAutoReport(self, parameters):
+        self.autoReportInterval = self._float(parameters, 'S', 0.0)
+        self.nextAutoReportTime = time.monotonic() + self.autoReportInterval
+
+    def _autoReportLoop(self):
+        while not self.stopEvent.wait(0.05):
+            if self.autoReportInterval > 0 and time.monotonic() >= self.nextAutoReportTime:
+                self.nextAutoReportTime += self.autoReportInterval
+                self._send(' ' + self._temperatureReport())
+
+    # Other
+    def _reportFirmware(self, parameters):
+        self._send(f'FIRMWARE_NAME:{self.FIRMWARE_NAME} SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin '
+                   'PROTOCOL_VERSION:1.0 MACHINE_TYPE:Simulator EXTRUDER_COUNT:1')
+        capabilities = {'EEPROM': False,
+                        'AUTOREPORT_TEMP': self.autoReportTemp,
+                        'AUTOREPORT_POS': False,
+                        'SOFTWARE_POWER': False,
+                        'TOGGLE_LIGHTS': False,
+                        'EMERGENCY_PARSER': False,
+                        'HOST_ACTION_COMMANDS': False,
+                        'PROMPT_SUPPORT': False}
+        for name, value in capabilities.items():
+            self._send(f'Cap:{name}:{int(value)}')
+
+    def _echo(self, arguments):
+        # Skip the A1, E1 and Pn flags
+        tokens = arguments.split(' ')
+        while tokens and re.fullmatch(r'A1|E1|P\d', tokens[0]):
+            tokens.pop(0)
+        self._send(' '.join(tokens))
+
+if __name__ == '__main__':
+    # Main only imports
+    from Common import PrinterInfo
+    from Common import Tracer
+    from Printers.Marlin2.Marlin2Printer import Marlin2Printer
+    from PySide6 import QtCore
+    import argparse
+    import pathlib
+    import sys
+
+    parser = argparse.ArgumentParser(description='Marlin 2 simulator on a pseudo-terminal')
+    parser.add_argument('--benchmark', action='store_true', help='run init, mesh and probe-all through Marlin2Printer and print the timings')
+    parser.add_argument('--time-scale', type=float, default=0.0, help='wall clock seconds per simulated second (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.002, help='command processing time in seconds (default: %(default)s)')
+    parser.add_argument('--baud-rate', type=int, default=115200, help='output bandwidth, 0 for unlimited (default: %(default)s)')
+    parser.add_argument('--busy-interval', type=float, default=2.0, help='seconds between busy messages (default: %(default)s)')
+    parser.add_argument('--noise', type=float, default=0.002, help='probe noise standard deviation in mm (default: %(default)s)')
+    parser.add_argument('--mesh-size', type=int, default=5, help='stored mesh points per side (default: %(default)s)')
+    parser.add_argument('--corruption', type=float, default=0.0, help='fraction of received lines with a bad checksum (default: %(default)s)')
+    parser.add_argument('--no-advanced-ok', action='store_true', help='answer with a plain ok')
+    parser.add_argument('--pipeline-depth', type=int, default=1, help='benchmark: commands in flight (default: %(default)s)')
+    parser.add_argument('--reliable', action='store_true', help='benchmark: send line numbers and checksums')
+    parser.add_argument('--samples', type=int, default=1, help='benchmark: samples per probed point (default: %(default)s)')
+    parser.add_argument('--no-serial-thread', action='store_true', help='benchmark: run the serial connection on the main thread')
+    parser.add_argument('--trace', type=pathlib.Path, default=None, help='benchmark: write a Chrome trace of the run to this file')
+    args = parser.parse_args()
+    Tracer.configure(file=args.trace)
+
+    simulator = Simulator(latency=args.latency,
+                          baudRate=args.baud_rate,
+                          busyInterval=args.busy_interval,
+                          timeScale=args.time_scale,
+                          noise=args.noise,
+                          meshSize=(args.mesh_size, args.mesh_size),
+                          corruption=args.corruption,
+                          advancedOk=not args.no_advanced_ok)
+    port = simulator.start()
+
+    if not args.benchmark:
+        print(f'Serving a simulated Marlin 2 printer on {port}, press Ctrl+C to stop.')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        simulator.stop()
+        sys.exit()
+
+    app = QtCore.QCoreApplication(sys.argv)
+    printer = Marlin2Printer(PrinterInfo.default(PrinterInfo.ConnectionMode.MARLIN_2),
+                             port=port,
+                             pipelineDepth=args.pipeline_depth,
+                             reliable=args.reliable,
+                             threaded=not args.no_serial_thread)
+
+    def run(name, start, signal):
+        """ Starts a request and waits for its result. """
+
+        loop = QtCore.QEventLoop()
+        replies = []
+        def finished(*reply):
+            replies.append(reply)
+            loop.quit()
+        def failed(type_, id_, context, message):
+            replies.append(message)
+            loop.quit()
+
+        signal.connect(finished)
+        printer.errorOccurred.connect(failed)
+        startTime = time.perf_counter()
+        start()
+        loop.exec()
+        elapsed = time.perf_counter() - startTime
+        signal.disconnect(finished)
+        printer.errorOccurred.disconnect(failed)
+
+        if isinstance(replies[0], str):
+            sys.exit(f'Error: {name} failed: {replies[0]}')
+        return elapsed, replies[0]
+
+    try:
+        printer.open()
+        initTime, _ = run('init', lambda: printer.init('init'), printer.inited)
+        meshTime, (_, _, mesh) = run('mesh', lambda: printer.getMeshCoordinates('mesh'), printer.gotMeshCoordinates)
+
+        points = [point for row in mesh.meshCoordinates for point in row]
+        printer.setProbeSampleCount(args.samples)
+        probeTime, (_, _, results) = run('probe-all', lambda: printer.probeMany('probeAll', points=points), printer.probedMany)
+        error = max(abs(result.z - simulator.surface(result.x, result.y)) for result in results)
+    finally:
+        printer.close()
+        simulator.stop()
+
+    print(f'init:      {initTime * 1000:9.1f} ms')
+    print(f'mesh:      {meshTime * 1000:9.1f} ms ({mesh.rowCount}x{mesh.columnCount})')
+    print(f'probe-all: {probeTime * 1000:9.1f} ms ({len(points)} points, {len(points) * args.samples / probeTime:.1f} probes/s, max error {error:.4f} mm)')
+    print(f'commands:  {sum(simulator.commandCounts.values())}, resend requests: {simulator.resendCount}')
+    print(f'delivery:  {printer.deliveryLatency}')
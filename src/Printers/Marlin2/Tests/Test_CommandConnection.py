@@ -0,0 +1,268 @@
+from Common import PrinterInfo
+from Printers.Marlin2.CommandConnection import CommandConnection
+from dataclasses import dataclass, field
+from PySide6 import QtCore
+import pytest
+
+class FakeConnection(CommandConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, printerInfo=PrinterInfo.default(PrinterInfo.ConnectionMode.MARLIN_2), **kwargs)
+        self.written = []
+
+    def write(self, string):
+        self.written.append(string)
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    pipelineDepth: int
+    okLine: str
+    expectedInFlight: [int] = field(default_factory=list)
+
+testPoints = [
+    # Without ADVANCED_OK commands are always sent one at a time
+    TestPoint(pipelineDepth = 1, okLine = 'ok P15 B3', expectedInFlight = [1, 1, 1, 1]),
+    TestPoint(pipelineDepth = 4, okLine = 'ok',        expectedInFlight = [1, 1, 1, 1]),
+    # With ADVANCED_OK the window is limited by the depth and free buffer count
+    TestPoint(pipelineDepth = 4, okLine = 'ok P15 B3', expectedInFlight = [1, 3, 3, 2]),
+    TestPoint(pipelineDepth = 2, okLine = 'ok P15 B3', expectedInFlight = [1, 2, 2, 2]),
+    TestPoint(pipelineDepth = 4, okLine = 'ok P15 B0', expectedInFlight = [1, 1, 1, 1]),
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_pipelining(qapp, testPoint):
+    connection = FakeConnection(pipelineDepth=testPoint.pipelineDepth)
+    finished = []
+    connection.finished.connect(lambda command: finished.append(command.NAME))
+
+    commands = [connection.sendG90(),
+                connection.sendG0(x=10),
+                connection.sendM400(),
+                connection.sendG91(),
+                connection.sendG0(x=20)]
+
+    inFlight = [connection.inFlightCount()]
+    for index in range(len(commands) - 2):
+        connection._processLine(testPoint.okLine)
+        inFlight.append(connection.inFlightCount())
+
+    assert(inFlight == testPoint.expectedInFlight)
+
+    # Responses are matched to commands in send order
+    while connection.inFlightCount() > 0:
+        connection._processLine(testPoint.okLine)
+
+    assert(finished == ['G90', 'G0', 'M400', 'G91', 'G0'])
+    assert(connection.written == [command.request for command in commands])
+
+def test_autoReportWithoutCommand(qapp):
+    connection = FakeConnection(pipelineDepth=4)
+    connection._processLine('echo:busy: processing')
+    connection._processLine(' T:25.00 /0.00 B:25.00 /0.00 @:0 B@:0')
+
+    with pytest.raises(IOError):
+        connection._processLine('ok')
+
+def test_temperatureReport(qapp):
+    connection = FakeConnection(pipelineDepth=1)
+    reports = []
+    finished = []
+    connection.temperatureReported.connect(reports.append)
+    connection.finished.connect(lambda command: finished.append(command.NAME))
+
+    # Reports are emitted whether or not a command is in flight
+    connection._processLine(' T:25.00 /0.00 B:24.00 /60.00 @:0 B@:127')
+    connection.sendM400()
+    connection._processLine(' T:25.00 /0.00 B:25.00 /60.00 @:0 B@:127')
+    connection._processLine(' T:25.00 /0.00 Q:1')
+    connection._processLine('ok')
+
+    assert([report['bedActual'] for report in reports] == [24.0, 25.0])
+    assert(finished == ['M400'])
+
+class Receiver(QtCore.QObject):
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def commandFinished(self, command):
+        self.threads.append(QtCore.QThread.currentThread())
+
+def test_thread(qtbot):
+    connection = FakeConnection()
+    receiver = Receiver()
+    connection.startThread()
+
+    try:
+        command = connection.sendM400()
+        command.finished.connect(receiver.commandFinished)
+
+        # Sending waits for the caller to return to its event loop
+        assert(connection.written == [])
+        qtbot.waitUntil(lambda: connection.written == ['M400'])
+
+        connection._call(connection._processLine, 'ok')
+
+        # The reply is parsed on the worker thread and delivered queued
+        qtbot.waitUntil(lambda: len(receiver.threads) == 1)
+        assert(receiver.threads == [QtCore.QThread.currentThread()])
+        assert(connection.serialLatency.count == 1)
+    finally:
+        connection.stopThread()
+
+    assert(connection.isCurrentThread())
+
+def test_cancel(qapp):
+    connection = FakeConnection(pipelineDepth=1)
+    finished = []
+    connection.finished.connect(lambda command: finished.append(command.NAME))
+
+    connection.sendG90()
+    cancelled = connection.sendG0(x=10)
+    connection.sendM400()
+    connection.cancel(cancelled)
+
+    # Cancelled commands are dropped instead of being sent
+    while connection.inFlightCount() > 0:
+        connection._processLine('ok')
+
+    assert(finished == ['G90', 'M400'])
+    assert(connection.written == ['G90', 'M400'])
+
+def test_errorBeforeOk(qapp):
+    connection = FakeConnection(pipelineDepth=4)
+    finished = []
+    errors = []
+    connection.finished.connect(lambda command: finished.append((command.NAME, command.error)))
+    connection.errorOccurred.connect(lambda command: errors.append(command.NAME))
+
+    connection.sendG90()
+    connection._processLine('ok P15 B3')
+    connection.sendG0(x=10)
+    connection.sendM400()
+    assert(connection.inFlightCount() == 2)
+
+    # The ok following the error still belongs to the failed command
+    connection._processLine('Error:Printer halted')
+    connection._processLine('ok P15 B3')
+    assert(errors == ['G0'])
+    assert(connection.inFlightCount() == 1)
+
+    connection._processLine('ok P15 B3')
+    assert([name for name, error in finished] == ['G90', 'G0', 'M400'])
+    assert(finished[-1][1] is None)
+
+def test_after(qapp):
+    connection = FakeConnection(pipelineDepth=4)
+    finished = []
+    connection.finished.connect(lambda command: finished.append(command.NAME))
+
+    connection.sendG90()
+    connection._processLine('ok P15 B3')
+
+    # A probe is not pipelined behind its move
+    move = connection.sendG0(x=10)
+    probe = connection.sendG30(e=True, x=10, y=10, after=move)
+    connection.sendM400()
+    assert(connection.written == ['G90', move.request])
+    assert(connection.pendingCount() == 2)
+
+    # and is dropped when the move fails
+    connection._processLine('Error:Printer halted')
+    assert(probe.cancelled)
+    assert(connection.written == ['G90', move.request, 'M400'])
+
+    connection._processLine('ok P15 B3')
+    connection._processLine('ok P15 B3')
+    assert(finished == ['G90', 'G0', 'M400'])
+    assert(connection.pendingCount() == 0)
+
+    move = connection.sendG0(x=20)
+    probe = connection.sendG30(e=True, x=20, y=20, after=move)
+    connection._processLine('ok P15 B3')
+    assert(connection.written[-1] == probe.request)
+
+def test_frameLine():
+    assert(CommandConnection.frameLine(0, 'M110 N0') == 'N0 M110 N0*125')
+    assert(CommandConnection.frameLine(1, 'M105') == 'N1 M105*38')
+
+def createReliableConnection(pipelineDepth):
+    connection = FakeConnection(pipelineDepth=pipelineDepth, reliable=True)
+    connection.sendM110(n=0)
+    connection._processLine('ok P15 B3')
+    connection.written.clear()
+    return connection
+
+def test_resendSingle(qapp):
+    connection = createReliableConnection(1)
+    finished = []
+    connection.finished.connect(lambda command: finished.append(command.NAME))
+
+    connection.sendG90()
+    connection.sendM400()
+    assert(connection.written == ['N1 G90*17'])
+
+    connection._processLine('Error:checksum mismatch, Last Line: 0')
+    connection._processLine('Resend: 1')
+    connection._processLine('ok')
+    assert(connection.written == ['N1 G90*17', 'N1 G90*17'])
+    assert(finished == [])
+
+    connection._processLine('ok')
+    connection._processLine('ok')
+    assert(finished == ['G90', 'M400'])
+    assert(connection.written[-1] == 'N2 M400*37')
+    assert(connection.resendCount == 1)
+    assert(connection.resentLineCount == 1)
+
+def test_resendPipelined(qapp):
+    connection = createReliableConnection(4)
+    finished = []
+    connection.finished.connect(lambda command: finished.append(command.NAME))
+
+    connection.sendG90()
+    connection.sendG0(x=10)
+    connection.sendM400()
+    assert(len(connection.written) == 3)
+
+    # Line 1 was corrupted, lines 2 and 3 are rejected for being out of order
+    connection._processLine('Error:checksum mismatch, Last Line: 0')
+    connection._processLine('Resend: 1')
+    connection._processLine('ok P15 B3')
+    assert(connection.written[3:] == connection.written[:3])
+
+    connection._processLine('Error:Line Number is not Last Line Number+1, Last Line: 0')
+    connection._processLine('Resend: 1')
+    connection._processLine('ok P15 B3')
+    connection._processLine('Error:Line Number is not Last Line Number+1, Last Line: 0')
+    connection._processLine('rs N1')
+    connection._processLine('ok P15 B3')
+    assert(len(connection.written) == 6)
+    assert(finished == [])
+
+    for index in range(3):
+        connection._processLine('ok P15 B3')
+
+    assert(finished == ['G90', 'G0', 'M400'])
+    assert(connection.resendCount == 1)
+    assert(connection.resentLineCount == 3)
+
+def test_resendOutsideHistory(qapp):
+    connection = FakeConnection(reliable=True, historySize=2)
+    for index in range(3):
+        connection.sendM400()
+        connection._processLine('ok')
+
+    connection.sendM400()
+    with pytest.raises(IOError):
+        connection._processLine('Resend: 0')
+
+def test_resendRejectedReset(qapp):
+    connection = FakeConnection(reliable=True)
+    connection.sendM110(n=0)
+
+    connection._processLine('Error:checksum mismatch, Last Line: 0')
+    connection._processLine('Resend: 1')
+    connection._processLine('ok')
+    assert(connection.written == ['N0 M110 N0*125', 'N0 M110 N0*125'])
+    assert(connection.inFlightCount() == 1)
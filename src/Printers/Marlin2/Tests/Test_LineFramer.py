@@ -0,0 +1,67 @@
+from Printers.Marlin2.LineFramer import LineFramer
+from dataclasses import dataclass, field
+import pytest
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    chunks: [bytes]
+    expected: [str]
+    badLines: [bytes] = field(default_factory=list)
+    pending: int = field(default=0)
+
+testPoints = [
+    TestPoint(chunks = [b'ok\n'],
+              expected = ['ok']),
+    TestPoint(chunks = [b'ok P15 B3\r\n', b'echo:busy: processing\r\n'],
+              expected = ['ok P15 B3', 'echo:busy: processing']),
+    TestPoint(chunks = [b'echo:Fade Height 10.00\r\r\n', b'\r\n', b'\n'],
+              expected = ['echo:Fade Height 10.00', '', '']),
+    TestPoint(chunks = [b'X:0.00 Y:0.', b'00 Z:0.00 E:0.00 Count X:0 Y:0 Z:0\nok', b'\n'],
+              expected = ['X:0.00 Y:0.00 Z:0.00 E:0.00 Count X:0 Y:0 Z:0', 'ok']),
+    TestPoint(chunks = [b'ok\r', b'\n'],
+              expected = ['ok']),
+    TestPoint(chunks = [b'ok\nec', b'ho:'],
+              expected = ['ok'],
+              pending = 5),
+    # Bad bytes only drop the line containing them
+    TestPoint(chunks = [b'\xff\xfe\x00start\nok\n'],
+              expected = ['ok'],
+              badLines = [b'\xff\xfe\x00start\n']),
+    TestPoint(chunks = [b'ok\nec\xe9ho\r\nok P15 B3\n'],
+              expected = ['ok', 'ok P15 B3'],
+              badLines = [b'ec\xe9ho\r\n']),
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_feed(testPoint):
+    badLines = []
+    lineFramer = LineFramer(badLineHandler=badLines.append)
+
+    lines = []
+    for chunk in testPoint.chunks:
+        lines += lineFramer.feed(chunk)
+
+    assert(lines == testPoint.expected)
+    assert(badLines == testPoint.badLines)
+    assert(lineFramer.badLineCount == len(testPoint.badLines))
+    assert(lineFramer.pendingCount() == testPoint.pending)
+
+def test_compaction():
+    lineFramer = LineFramer(compactThreshold=16)
+
+    lines = []
+    for index in range(100):
+        lines += lineFramer.feed(f'{index}\necho:busy: '.encode())
+        assert(len(lineFramer.buffer) < 64)
+
+    assert(lines == ['0'] + [f'echo:busy: {index}' for index in range(1, 100)])
+    assert(lineFramer.pendingCount() == len(b'echo:busy: '))
+
+def test_clear():
+    lineFramer = LineFramer()
+    lineFramer.feed(b'partial')
+    lineFramer.clear()
+
+    assert(lineFramer.pendingCount() == 0)
+    assert(lineFramer.feed(b'ok\n') == ['ok'])
@@ -0,0 +1,29 @@
+from Common import PrinterInfo
+from Printers.CommandPrinter import CommandType
+from Printers.Marlin2.Marlin2Printer import Marlin2Printer
+import pytest
+
+def test_probeMeshUnsupported(qapp):
+    printer = Marlin2Printer(PrinterInfo.default(PrinterInfo.ConnectionMode.MARLIN_2))
+    errors = []
+    printer.errorOccurred.connect(lambda type_, id_, context, message: errors.append((type_, id_, context)))
+
+    # Reported as an error instead of raising from a slot
+    assert(not printer.hasNativeMeshProbing())
+    printer.probeMesh('mesh', context={'row': 0})
+    assert(errors == [(CommandType.PROBE_MESH, 'mesh', {'row': 0})])
+
+def test_probeAdaptiveSampling(qapp):
+    printer = Marlin2Printer(PrinterInfo.default(PrinterInfo.ConnectionMode.MARLIN_2))
+    printer.setProbeSampleCount(3)
+
+    printer.setProbeAdaptiveSampling(3, 0.01)
+    assert(printer.probeMaxSampleCount() == 3)
+
+    # The maximum can't be below the samples always taken
+    with pytest.raises(ValueError):
+        printer.setProbeAdaptiveSampling(2, 0.01)
+    assert(printer.probeMaxSampleCount() == 3)
+
+    printer.setProbeAdaptiveSampling(2, None)
+    assert(printer.probeMaxSampleCount() is None)
\ No newline at end of file
@@ -0,0 +1,77 @@
+from Printers.Marlin2.Commands.CommandG0 import CommandG0
+from Printers.Marlin2.Commands.CommandG28 import CommandG28
+from Printers.Marlin2.Commands.CommandG90 import CommandG90
+from Printers.Marlin2.Commands.CommandG91 import CommandG91
+from Printers.Marlin2.Commands.CommandM114 import CommandM114
+from Printers.Marlin2.Commands.CommandM851 import CommandM851
+from Printers.Marlin2.PrinterState import PositioningMode
+from Printers.Marlin2.PrinterState import PrinterState
+import pytest
+
+def finish(printerState, command, lines):
+    for line in lines:
+        command.processLine(line)
+    printerState.commandFinished(command)
+
+def test_positioningMode():
+    printerState = PrinterState()
+    assert(printerState.positioningMode is None)
+
+    printerState.commandQueued(CommandG90())
+    assert(printerState.positioningMode == PositioningMode.ABSOLUTE)
+
+    printerState.commandQueued(CommandG91())
+    assert(printerState.positioningMode == PositioningMode.RELATIVE)
+
+    printerState.commandQueued(CommandG28())
+    assert(printerState.positioningMode is None)
+
+def test_probeOffsets():
+    printerState = PrinterState()
+
+    command = CommandM851()
+    printerState.commandQueued(command)
+    finish(printerState, command, ['Probe Offset X-40.00 Y-5.00 Z0.00', 'ok'])
+    assert(printerState.probeOffsets == {'x': -40.0, 'y': -5.0, 'z': 0.0})
+
+    # Setting the offsets invalidates them
+    printerState.commandQueued(CommandM851(z=-1.5))
+    assert(printerState.probeOffsets is None)
+
+def test_position():
+    printerState = PrinterState()
+
+    # Moves in an unknown positioning mode leave the position unknown
+    printerState.commandQueued(CommandG0(x=10))
+    assert(printerState.position == {'x': None, 'y': None, 'z': None})
+
+    printerState.commandQueued(CommandG90())
+    printerState.commandQueued(CommandG0(x=10, y=20, z=5))
+    printerState.commandQueued(CommandG91())
+    printerState.commandQueued(CommandG0(z=2))
+    assert(printerState.position == {'x': 10.0, 'y': 20.0, 'z': 7.0})
+
+    # Query results are ignored when a later move was queued
+    command = CommandM114()
+    printerState.commandQueued(command)
+    printerState.commandQueued(CommandG0(x=1))
+    finish(printerState, command, ['X:50.00 Y:60.00 Z:70.00 E:0.00 Count X:0 Y:0 Z:0', 'ok'])
+    assert(printerState.position == {'x': 11.0, 'y': 20.0, 'z': 7.0})
+
+    command = CommandM114()
+    printerState.commandQueued(command)
+    finish(printerState, command, ['X:50.00 Y:60.00 Z:70.00 E:0.00 Count X:0 Y:0 Z:0', 'ok'])
+    assert(printerState.position == {'x': 50.0, 'y': 60.0, 'z': 70.0})
+
+def test_invalidate():
+    printerState = PrinterState()
+
+    printerState.commandQueued(CommandG90())
+    command = CommandM851()
+    printerState.commandQueued(command)
+    finish(printerState, command, ['Probe Offset X-40.00 Y-5.00 Z0.00', 'ok'])
+
+    printerState.invalidate()
+    assert(printerState.positioningMode is None)
+    assert(printerState.probeOffsets is None)
+    assert(printerState.position is None)
@@ -0,0 +1,99 @@
+from Common import PrinterInfo
+from Common.Points import Point2F
+from Common.ProbeClearancePlanner import ProbeClearancePlanner
+from Printers.Marlin2.CommandConnection import CommandConnection
+from Printers.Marlin2.Marlin2Printer import ProbeManyMachine
+from Printers.Marlin2.PrinterState import PrinterState
+from dataclasses import dataclass, field
+from typing import Union
+import itertools
+import pytest
+
+class FakeConnection(CommandConnection):
+    """ Answers every G30 with the next sample of the probed point. """
+
+    def __init__(self, samples):
+        super().__init__(printerInfo=PrinterInfo.default(PrinterInfo.ConnectionMode.MARLIN_2))
+        self.samples = {point: itertools.cycle(values) for point, values in samples.items()}
+        self.written = []
+
+    def write(self, string):
+        self.written.append(string)
+
+    def respond(self):
+        while self.inFlightCount() > 0:
+            words = dict((word[0], word[1:]) for word in self.written[-self.inFlightCount()].split()[1:])
+            if self.written[-self.inFlightCount()].startswith('G30'):
+                x = float(words['X'])
+                y = float(words['Y'])
+                self._processLine(f'Bed X: {x:.2f} Y: {y:.2f} Z: {next(self.samples[(x, y)]):.3f}')
+                self._processLine(f'X:{x:.2f} Y:{y:.2f} Z:10.00 E:0.00 Count X:0 Y:0 Z:0')
+            self._processLine('ok')
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    samples: dict # (x, y): repeated samples
+    sampleCount: int
+    maxSampleCount: Union[None, int] = field(default=None)
+    tolerance: Union[None, float] = field(default=None)
+    expectedSampleCounts: list = field(default_factory=list)
+    expectedZ: list = field(default_factory=list)
+
+CLEAN = {(10.0, 10.0): [0.100, 0.101],
+         (20.0, 10.0): [0.200, 0.200]}
+NOISY = {(10.0, 10.0): [0.100, 0.200],
+         (20.0, 10.0): [0.200, 0.201]}
+
+testPoints = [
+    TestPoint(samples = CLEAN, sampleCount = 4,
+              expectedSampleCounts = [4, 4], expectedZ = [0.1005, 0.2]),
+    # Clean points stop at the minimum of two samples
+    TestPoint(samples = CLEAN, sampleCount = 1, maxSampleCount = 4, tolerance = 0.005,
+              expectedSampleCounts = [2, 2], expectedZ = [0.1005, 0.2]),
+    TestPoint(samples = NOISY, sampleCount = 1, maxSampleCount = 5, tolerance = 0.005,
+              expectedSampleCounts = [5, 2], expectedZ = [0.14, 0.2005]),
+    TestPoint(samples = NOISY, sampleCount = 3, maxSampleCount = 5, tolerance = 0.005,
+              expectedSampleCounts = [5, 3], expectedZ = [0.14, 0.2003333]),
+    TestPoint(samples = NOISY, sampleCount = 1, maxSampleCount = 1, tolerance = 0.005,
+              expectedSampleCounts = [1, 1], expectedZ = [0.1, 0.2])
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_sampling(qapp, testPoint):
+    connection = FakeConnection(testPoint.samples)
+    printerState = PrinterState()
+    printerState.probeOffsets = {'x': 0.0, 'y': 0.0, 'z': 0.0}
+    points = [Point2F(*point) for point in testPoint.samples]
+
+    machine = ProbeManyMachine(connection, printerState, 'id', {}, points, [0, 1], testPoint.sampleCount, 5000, 10.0,
+                               maxSampleCount=testPoint.maxSampleCount, tolerance=testPoint.tolerance)
+    connection.queued.connect(printerState.commandQueued)
+    results = []
+    machine.probedMany.connect(lambda id_, context, results_: results.extend(results_))
+    machine.start()
+    connection.respond()
+
+    assert([result.sampleCount for result in results] == testPoint.expectedSampleCounts)
+    assert([result.z for result in results] == pytest.approx(testPoint.expectedZ))
+
+    # All samples of a point are taken before moving on to the next one
+    probed = [line.split()[3:5] for line in connection.written if line.startswith('G30')]
+    assert(probed == sorted(probed))
+
+def test_clearance(qapp):
+    connection = FakeConnection(CLEAN)
+    printerState = PrinterState()
+    printerState.probeOffsets = {'x': 0.0, 'y': 0.0, 'z': 0.0}
+    points = [Point2F(*point) for point in CLEAN]
+    planner = ProbeClearancePlanner(2.0)
+
+    machine = ProbeManyMachine(connection, printerState, 'id', {}, points, [0, 1], 1, 5000, 10.0, clearancePlanner=planner)
+    connection.queued.connect(printerState.commandQueued)
+    machine.start()
+    connection.respond()
+
+    # The first move starts from an unknown position, the second one over the first point
+    hops = [line for line in connection.written if line.startswith('G0') and ' X' not in line]
+    assert(hops == ['G0 Z10.0', 'G0 Z2.1'])
+    assert(planner.heights == {(10.0, 10.0): 0.1, (20.0, 10.0): 0.2})
\ No newline at end of file
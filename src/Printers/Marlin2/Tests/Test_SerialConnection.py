@@ -0,0 +1,29 @@
+from Common import PrinterInfo
+from Printers.Marlin2.SerialConnection import SerialConnection
+from PySide6 import QtCore
+
+class FakePort:
+    def __init__(self, data):
+        self.data = data
+
+    def readAll(self):
+        return QtCore.QByteArray(self.data)
+
+class FakeConnection(SerialConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(PrinterInfo.default(PrinterInfo.ConnectionMode.MARLIN_2), *args, **kwargs)
+        self.lines = []
+
+    def _processLine(self, line):
+        if line == 'bad':
+            raise IOError(f'Received a line without a command ({line}).')
+        self.lines.append(line)
+
+def test_failingLine(qapp):
+    connection = FakeConnection()
+    connection._serialPort = FakePort(b'ok\nbad\nok T:25.00\nok')
+    connection._readData()
+
+    # The lines after a failing line are still processed
+    assert(connection.lines == ['ok', 'ok T:25.00'])
+    assert(connection.lineFramer.pendingCount() == 2)
\ No newline at end of file
@@ -0,0 +1,123 @@
+from Common import PrinterInfo
+from Common.Metrics import metrics
+from Common import Tracer
+from Common.Points import Point2F
+from Printers.Marlin2.Commands.CommandM420 import CommandM420
+from Printers.Marlin2.Marlin2Printer import Marlin2Printer
+from Printers.Marlin2.Simulator import Simulator
+from dataclasses import dataclass, field
+import os
+import pytest
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason='the simulator needs a pseudo-terminal')
+
+class RecordingSimulator(Simulator):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sentLines = []
+
+    def _send(self, line):
+        self.sentLines.append(line)
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    pipelineDepth: int
+    reliable: bool = field(default=False)
+    advancedOk: bool = field(default=True)
+    corruption: float = field(default=0.0)
+
+testPoints = [
+    TestPoint(pipelineDepth = 1),
+    TestPoint(pipelineDepth = 4),
+    TestPoint(pipelineDepth = 4, advancedOk = False),
+    TestPoint(pipelineDepth = 4, reliable = True, corruption = 0.1),
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_endToEnd(qtbot, testPoint):
+    simulator = Simulator(timeScale=0, seed=1, advancedOk=testPoint.advancedOk, corruption=testPoint.corruption)
+    printer = Marlin2Printer(PrinterInfo.default(PrinterInfo.ConnectionMode.MARLIN_2),
+                             port=simulator.start(),
+                             pipelineDepth=testPoint.pipelineDepth,
+                             reliable=testPoint.reliable)
+    errors = []
+    printer.errorOccurred.connect(lambda type_, id_, context, message: errors.append(message))
+
+    try:
+        printer.open()
+        with qtbot.waitSignal(printer.inited, timeout=5000):
+            printer.init('init')
+
+        with qtbot.waitSignal(printer.gotMeshCoordinates, timeout=5000) as blocker:
+            printer.getMeshCoordinates('mesh')
+        mesh = blocker.args[2]
+
+        expected = simulator.meshCoordinates()
+        assert(mesh.storedMesh == simulator.storedMesh)
+        assert(all(point.x == pytest.approx(expected[row][column][0]) and point.y == pytest.approx(expected[row][column][1])
+                   for row, points in enumerate(mesh.meshCoordinates) for column, point in enumerate(points)))
+
+        points = [point for row in mesh.meshCoordinates for point in row] + [Point2F(25, 175)]
+        with qtbot.waitSignal(printer.probedMany, timeout=5000) as blocker:
+            printer.probeMany('probeAll', points=points)
+        results = blocker.args[2]
+    finally:
+        printer.close()
+        simulator.stop()
+
+    assert(errors == [])
+    assert([(result.x, result.y) for result in results] == [(point.x, point.y) for point in points])
+    assert(all(result.z == pytest.approx(simulator.surface(result.x, result.y), abs=0.001) for result in results))
+    assert((simulator.resendCount > 0) == (testPoint.corruption > 0))
+    assert(metrics.histogram('marlin2_command_round_trip_seconds', command='G30').count >= len(points))
+    assert(metrics.histogram('marlin2_machine_seconds', machine='ProbeManyMachine', outcome='ok').count > 0)
+
+def test_trace(qtbot, tmp_path):
+    simulator = Simulator(timeScale=0)
+    tracer = Tracer.configure(file=tmp_path / 'trace.json')
+    printer = Marlin2Printer(PrinterInfo.default(PrinterInfo.ConnectionMode.MARLIN_2), port=simulator.start())
+
+    try:
+        printer.open()
+        with qtbot.waitSignal(printer.inited, timeout=5000):
+            printer.init('init')
+    finally:
+        printer.close()
+        simulator.stop()
+        Tracer.configure()
+
+    events = tracer.events()
+    names = {(event.get('cat'), event['name']) for event in events}
+    assert({('machine', 'InitMachine'), ('machine', 'start'), ('gcode', 'M115'), ('gcode', 'sent'), ('serial', 'TX'), ('serial', 'RX')} <= names)
+    assert(sum(event['ph'] == 'b' for event in events) == sum(event['ph'] == 'e' for event in events))
+    assert({'Serial', 'MainThread'} <= {event['args']['name'] for event in events if event['ph'] == 'M'})
+
+def test_resend():
+    simulator = RecordingSimulator(advancedOk=False)
+    simulator._receive('N0 M110 N0*125')
+    simulator._receive('N1 G90*17')
+    simulator._receive('N3 G91*18')
+    simulator._receive('N2 G91*20')
+
+    assert(simulator.resendCount == 2)
+    assert(simulator.sentLines == ['Error:Line Number is not Last Line Number+1, Last Line: 1', 'Resend: 2', 'ok',
+                                   'Error:checksum mismatch, Last Line: 1', 'Resend: 2', 'ok'])
+    assert(list(simulator.commandQueue.queue) == ['M110 N0', 'G90'])
+
+def test_commands():
+    simulator = RecordingSimulator(timeScale=0, meshSize=(3, 2))
+    for line in ['G42 I0 J0', 'G28', 'G30 X300 Y10', 'G42 I2 J1', 'M114', 'G91', 'G0 Z-50', 'M114', 'M420 V', 'M118 E1 Hello', 'M999']:
+        simulator._execute(line)
+
+    lines = simulator.sentLines
+    assert(lines[:4] == ['echo:Home XYZ First', 'ok P16 B3', 'X:100.00 Y:100.00 Z:10.00 E:0.00 Count X:8000 Y:8000 Z:4000', 'ok P16 B3'])
+    assert(lines[4:6] == ['Z Probe Past Bed', 'ok P16 B3'])
+    assert(lines[7:9] == ['X:190.00 Y:190.00 Z:10.00 E:0.00 Count X:15200 Y:15200 Z:4000', 'ok P16 B3'])
+
+    # Soft endstops stop relative moves at the travel bounds
+    assert(lines[11] == 'X:190.00 Y:190.00 Z:0.00 E:0.00 Count X:15200 Y:15200 Z:0')
+
+    meshEnd = lines.index('ok P16 B3', 13)
+    assert(CommandM420.parseMesh(lines[13:meshEnd]) == simulator.storedMesh)
+    assert(lines[meshEnd + 1:] == ['Hello', 'ok P16 B3', 'echo:Unknown command: "M999"', 'ok P16 B3'])
\ No newline at end of file
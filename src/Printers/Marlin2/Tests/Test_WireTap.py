@@ -0,0 +1,53 @@
+from Printers.Marlin2 import WireTap
+from Printers.Marlin2.WireTap import Direction
+import pytest
+
+def test_fileRoundTrip(tmp_path):
+    path = tmp_path / 'capture.bin'
+    wireTap = WireTap.FileWireTap(path)
+    wireTap.tx(b'M105\n')
+    wireTap.rx(b'ok T:25.00 /0.00 B:25.00 /0.00 @:0 B@:0\n')
+    wireTap.rx(b'')
+    wireTap.close()
+
+    chunks = list(WireTap.read(path))
+    assert([(chunk.direction, chunk.data) for chunk in chunks] == [(Direction.TX, b'M105\n'),
+                                                                  (Direction.RX, b'ok T:25.00 /0.00 B:25.00 /0.00 @:0 B@:0\n'),
+                                                                  (Direction.RX, b'')])
+    assert(all(chunks[index].timestamp <= chunks[index + 1].timestamp for index in range(len(chunks) - 1)))
+
+def test_ringEviction(tmp_path):
+    wireTap = WireTap.RingWireTap(10, tmp_path / 'ring.bin')
+    for index in range(5):
+        wireTap.rx(bytes([index]) * 4)
+
+    assert([chunk.data for chunk in wireTap.chunks()] == [b'\x03' * 4, b'\x04' * 4])
+
+    wireTap.close()
+    assert([chunk.data for chunk in WireTap.read(tmp_path / 'ring.bin')] == [b'\x03' * 4, b'\x04' * 4])
+
+def test_badFiles(tmp_path):
+    path = tmp_path / 'bad.bin'
+    path.write_bytes(b'NOTACAPTUREFILE')
+    with pytest.raises(ValueError):
+        list(WireTap.read(path))
+
+    wireTap = WireTap.FileWireTap(path)
+    wireTap.rx(b'echo:busy: processing\n')
+    wireTap.close()
+    path.write_bytes(path.read_bytes()[:-4])
+    with pytest.raises(ValueError):
+        list(WireTap.read(path))
+
+def test_configure(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(WireTap.atexit, 'register', registered.append)
+    monkeypatch.setattr(WireTap.atexit, 'unregister', registered.remove)
+
+    WireTap.configure(file=tmp_path / 'first.bin', ringSize=100)
+    second = WireTap.configure(file=tmp_path / 'second.bin')
+    assert(registered == [second.close])
+
+    assert(WireTap.configure() is None)
+    assert(registered == [])
+    assert(WireTap.defaultWireTap() is None)
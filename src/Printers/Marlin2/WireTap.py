@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+from typing import NamedTuple
+import atexit
+import collections
+import enum
+import pathlib
+import struct
+import time
+
+# Capture file layout:
+#   Header: MAGIC, version (uint16)
+#   Record: timestamp in ns since the epoch (uint64), direction (uint8), length (uint32), data
+MAGIC = b'BL5KWIRE'
+VERSION = 1
+HEADER = struct.Struct('<8sH')
+RECORD = struct.Struct('<QBI')
+
+class Direction(enum.IntEnum):
+    RX = 0
+    TX = 1
+
+class Chunk(NamedTuple):
+    timestamp: int # ns since the epoch
+    direction: Direction
+    data: bytes
+
+class WireTap:
+    """ Records raw chunks read from and written to a connection. """
+
+    def rx(self, data):
+        self.record(Direction.RX, data)
+
+    def tx(self, data):
+        self.record(Direction.TX, data)
+
+    def record(self, direction, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class FileWireTap(WireTap):
+    """ Streams every chunk to a capture file. """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.file = open(self.path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+
+    def record(self, direction, data):
+        data = bytes(data)
+        self.file.write(RECORD.pack(time.time_ns(), direction, len(data)))
+        self.file.write(data)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+class RingWireTap(WireTap):
+    """ Keeps the most recent chunks in memory, limited to maxBytes of data,
+        and optionally saves them to a capture file when closed. """
+
+    def __init__(self, maxBytes, path=None):
+        assert(maxBytes > 0)
+
+        self.maxBytes = maxBytes
+        self.path = None if path is None else pathlib.Path(path)
+        self.byteCount = 0
+        self._chunks = collections.deque()
+
+    def record(self, direction, data):
+        chunk = Chunk(time.time_ns(), direction, bytes(data))
+        self._chunks.append(chunk)
+        self.byteCount += len(chunk.data)
+
+        while self.byteCount > self.maxBytes and len(self._chunks) > 1:
+            self.byteCount -= len(self._chunks.popleft().data)
+
+    def chunks(self):
+        return list(self._chunks)
+
+    def save(self, path):
+        write(path, self._chunks)
+
+    def close(self):
+        if self.path is not None:
+            self.save(self.path)
+
+_defaultWireTap = None
+
+def defaultWireTap():
+    return _defaultWireTap
+
+def configure(file=None, ringSize=None):
+    """ Configures the wire tap used by new connections. Capturing is
+        disabled when no file is given. With a ring size only the last
+        ringSize bytes are kept and written to file on exit. """
+
+    global _defaultWireTap
+
+    if _defaultWireTap is not None:
+        atexit.unregister(_defaultWireTap.close)
+        _defaultWireTap.close()
+        _defaultWireTap = None
+
+    if file is None:
+        return None
+
+    _defaultWireTap = FileWireTap(file) if ringSize is None else RingWireTap(ringSize, file)
+    atexit.register(_defaultWireTap.close)
+    return _defaultWireTap
+
+def write(path, chunks):
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION))
+        for chunk in chunks:
+            file.write(RECORD.pack(chunk.timestamp, chunk.direction, len(chunk.data)))
+            file.write(chunk.data)
+
+def read(path):
+    with open(path, 'rb') as file:
+        header = file.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError(f'{path} is not a wire capture file.')
+
+        magic, version = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a wire capture file.')
+        if version != VERSION:
+            raise ValueError(f'Unsupported wire capture version ({version}).')
+
+        while len(record := file.read(RECORD.size)) == RECORD.size:
+            timestamp, direction, length = RECORD.unpack(record)
+            data = file.read(length)
+            if len(data) != length:
+                raise ValueError(f'Truncated record in {path}.')
+            yield Chunk(timestamp, Direction(direction), data)
+
+        if len(record) != 0:
+            raise ValueError(f'Truncated record in {path}.')
+
+if __name__ == '__main__':
+    # Main only imports
+    import argparse
+    import datetime
+    import sys
+
+    parser = argparse.ArgumentParser(description='Decode a wire capture file')
+    parser.add_argument('file', type=pathlib.Path, help='capture file')
+    parser.add_argument('--direction', choices=['rx', 'tx'], default=None, help='only show one direction')
+    parser.add_argument('--hex', action='store_true', help='show chunks as hex instead of text')
+    parser.add_argument('--absolute', action='store_true', help='show absolute instead of relative timestamps')
+    args = parser.parse_args()
+
+    try:
+        startTime = None
+        for chunk in read(args.file):
+            if args.direction is not None and chunk.direction.name.lower() != args.direction:
+                continue
+
+            if startTime is None:
+                startTime = chunk.timestamp
+
+            if args.absolute:
+                timestamp = datetime.datetime.fromtimestamp(chunk.timestamp / 1e9).isoformat(timespec='microseconds')
+            else:
+                timestamp = f'+{(chunk.timestamp - startTime) / 1e9:.6f}'
+
+            data = chunk.data.hex(' ').upper() if args.hex else repr(chunk.data)[2:-1]
+            print(f'{timestamp} {chunk.direction.name} {len(chunk.data):4} {data}')
+    except BrokenPipeError:
+        pass
+    except (OSError, ValueError) as exception:
+        sys.exit(f'Error: {exception}')
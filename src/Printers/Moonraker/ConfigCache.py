@@ -0,0 +1,41 @@
+class ConfigCache:
+    """ Snapshot of the parsed Klipper config ('configfile' printer object).
+
+        The config only changes when Klipper restarts, so it is downloaded
+        once and shared by all machines of a printer until invalidated. """
+
+    # G-code commands that restart Klipper and may load a different config
+    RESTART_COMMANDS = ['RESTART', 'FIRMWARE_RESTART', 'SAVE_CONFIG']
+
+    def __init__(self):
+        self.invalidate()
+
+    def invalidate(self):
+        self.config = None
+        self._sections = {} # name: parsed value
+
+    def valid(self):
+        return self.config is not None
+
+    def update(self, config):
+        if config is not self.config:
+            self.config = config
+            self._sections = {}
+
+    def section(self, name, parse):
+        """ Returns the value parse(config) computed for name, parsing the
+            config at most once per snapshot. """
+
+        assert(self.valid())
+
+        if name not in self._sections:
+            self._sections[name] = parse(self.config)
+        return self._sections[name]
+
+    @classmethod
+    def isRestartCommand(cls, script):
+        for line in script.splitlines():
+            words = line.split(maxsplit=1)
+            if len(words) > 0 and words[0].upper() in cls.RESTART_COMMANDS:
+                return True
+        return False
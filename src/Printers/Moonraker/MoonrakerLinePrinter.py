@@ -34,7 +34,7 @@ class MoonrakerLinePrinter(LinePrinter):
             endpoint = '/printer/gcode/script?script=' + command
 
         requestCommand = f'http://{self.host}{endpoint}'
-        self.logger.debug(f'Sending get: {requestCommand}')
+        self.logger.debug('Sending get: %s', requestCommand)
 
         request = QtNetwork.QNetworkRequest(requestCommand)
         self.replySet.add(self.networkAccessManager.get(request))
@@ -6,20 +6,30 @@ from Printers.CommandPrinter import GetCurrentPositionResult
 from Printers.CommandPrinter import GetBoundsResult
 from Printers.CommandPrinter import GetMeshCoordinatesResult
 from Printers.CommandPrinter import ProbeResult
+from Printers.CommandPrinter import ProbeMeshResult
+from Printers.Moonraker.ConfigCache import ConfigCache
+from Printers.Moonraker.Transport import HttpTransport
+from Printers.Moonraker.Transport import WebSocketTransport
 from Common.Common import LOG_ALL
+from Common.Log import getLogger
+from Common.Metrics import metrics
+from Common import Tracer
+from Common.Points import Point2F
 
 from PySide6 import QtCore
-from PySide6 import QtNetwork
-import json
-import logging
+import re
+import time
 from typing import NamedTuple
 
 class MoonrakerPrinter(CommandPrinter):
-    def __init__(self, printerInfo, host=None, *args, **kwargs):
+    def __init__(self, printerInfo, host=None, *args, websocket=False, nativeMesh=False, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.host = host
-        self.networkAccessManager = QtNetwork.QNetworkAccessManager()
+        self.nativeMesh = nativeMesh
+        self.transport = WebSocketTransport(parent=self) if websocket else HttpTransport(parent=self)
+        self.configCache = ConfigCache()
+        self.transport.klippyRestarted.connect(self.invalidateConfig)
 
         self.isConnected = False
         self.machineSet = set()
@@ -27,11 +37,19 @@ class MoonrakerPrinter(CommandPrinter):
     def _connected(self):
         return self.isConnected
 
+    def invalidateConfig(self):
+        """ Drops the cached Klipper config, it is downloaded again when next needed. """
+        self.configCache.invalidate()
+
     def _open(self, host=None):
         self.host = host if host is not None else self.host
+        self.configCache.invalidate()
+        self.transport.open(self.host)
         self.isConnected = True
 
     def _close(self):
+        self.transport.close()
+        self.configCache.invalidate()
         self.isConnected = False
 
     def _abort(self):
@@ -40,7 +58,7 @@ class MoonrakerPrinter(CommandPrinter):
         self.machineSet.clear()
 
     def _createMachine(self, machineClass, signalName, id_, context, *args, **kwargs):
-        machine = machineClass(self.networkAccessManager, self.host, id_, context, parent=self, *args, **kwargs)
+        machine = machineClass(self.transport, self.configCache, id_, context, parent=self, *args, **kwargs)
         machine.sent.connect(self._sent)
         machine.finished.connect(self._finished)
         machine.errorOccurred.connect(self._errorOccurred)
@@ -51,9 +69,12 @@ class MoonrakerPrinter(CommandPrinter):
         else:
             machine.inited.connect(self._inited)
 
+        if machineClass == ProbeManyMachine:
+            machine.probedPoint.connect(self.probedPoint)
+
         self.machineSet.add(machine)
 
-        logging.debug(f'Starting {machineClass} with id: {id_}, context: {context}')
+        self.logger.debug('Starting %s with id: %s, context: %s', machineClass, id_, context)
         machine.start()
 
     def _inited(self, id_, context):
@@ -113,6 +134,16 @@ class MoonrakerPrinter(CommandPrinter):
     def _probe(self, id_, *, context, x, y):
         self._createMachine(ProbeMachine, 'probed', id_, context, x, y, self._probeSampleCount, self._probeXYSpeed, self._probeZHeight)
 
+    def _probeMany(self, id_, *, context, points, order):
+        self._createMachine(ProbeManyMachine, 'probedMany', id_, context, points, order, self._probeSampleCount, self._probeXYSpeed, self._probeZHeight,
+                            clearancePlanner=self._probeClearancePlanner)
+
+    def hasNativeMeshProbing(self):
+        return self.nativeMesh
+
+    def _probeMesh(self, id_, *, context):
+        self._createMachine(ProbeMeshMachine, 'probedMesh', id_, context)
+
     def _move(self, id_, *, context, x, y, z, e, f, wait, relative):
         self._createMachine(MoveMachine, 'moved', id_, context, x, y, z, e, f, wait, relative)
 
@@ -140,95 +171,170 @@ class MoonrakerMachine(QtCore.QObject):
         name: str
         data: dict
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
+    class ScriptStep(NamedTuple):
+        gcode: str
+        errorMessage: str
+
+    def __init__(self, transport, configCache, id_, context, parent=None):
         super().__init__(parent)
 
         # Get logger
-        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger = getLogger(self)
 
-        self.networkAccessManager = networkAccessManager
-        self.host = host
+        self.transport = transport
+        self.configCache = configCache
         self.id_ = id_
         self.context = context
         self.error = None
         self.setTransition(None)
-        self.reply = None
+        self.request = None
+        self.scriptSteps = None
+
+        # time.perf_counter() values
+        self.startTime = time.perf_counter()
+        self.stateTime = None
+        self.stateName = 'start'
 
     def setTransition(self, transition):
         self._transition = transition
 
     def abort(self):
-        if self.reply is not None:
-            self.reply.finished.disconnect()
-            self.reply.abort()
-            self.reply.deleteLater()
-            self.reply = None
-
-    def get(self, endpoint):
-        assert(self.reply is None or self.reply.isFinished())
-
-        command = f'http://{self.host}{endpoint}'
-        self.logger.debug(f'Sending get: {command}')
-
-        request = QtNetwork.QNetworkRequest(command)
-        self.reply = self.networkAccessManager.get(request)
-        self.reply.finished.connect(self.processReply)
-        self.sent.emit(self, command)
-
-    def getGCode(self, gcode):
-        self.get(f'/printer/gcode/script?script={gcode}')
-
-    def processReply(self):
-        assert(self.sender() == self.reply)
-
-        replyBuffer = self.reply.readAll()
-        self.logger.log(LOG_ALL, f'Received: {replyBuffer}')
-
-        # TODO: Add error handling on conversion and parsing
-        replyJson = json.loads(str(replyBuffer, 'ascii'))
-        self.logger.debug(f'Received: {replyJson}')
-
-        errorStatus = self.reply.error()
-        self.reply.deleteLater()
-        self.reply = None
-
-        # Check for protocol error
-        if 'error' in replyJson and 'message' in replyJson['error']:
-            message = replyJson['error']['message']
-            self.error = message
-            logging.error(f'Error {replyJson}')
-            self.errorOccurred.emit(self, message)
-            self.finished.emit(self, message)
-
-        # Handle REST errors
-        elif errorStatus != QtNetwork.QNetworkReply.NoError:
-            message = f'Rest error occured ({errorStatus}).'
-            logging.error(message)
-            self.errorOccurred.emit(self, message)
-            return
+        if self.request is not None:
+            self.request.finished.disconnect(self.processReply)
+            self.request.abort()
+            self.request.deleteLater()
+            self.request = None
+
+    def queryObjects(self, *objects, cached=False):
+        self._send(self.transport.queryObjects(*objects, cached=cached))
+
+    def queryConfig(self):
+        """ Queries the 'configfile' printer object, the reply comes from the
+            config cache when it is valid. """
+
+        if self.configCache.valid():
+            status = {'configfile': {'config': self.configCache.config}}
+            self._send(self.transport.completedRequest('printer.objects.query configfile (cached)', {'status': status}))
+        else:
+            self.queryObjects('configfile')
+
+    def runGCode(self, gcode):
+        if ConfigCache.isRestartCommand(gcode):
+            self.configCache.invalidate()
+
+        self._send(self.transport.runGCode(gcode))
+
+    def runScript(self, *steps):
+        """ Runs the steps as a single multi-line G-code script. Klipper
+            stops at the first failing line, the error is reported with the
+            message of the step it is attributed to. The transition is only
+            called once every step has succeeded. """
+
+        assert(len(steps) > 0)
+
+        self.runGCode('\n'.join(step.gcode for step in steps))
+        self.scriptSteps = steps
+
+    @classmethod
+    def _failedScriptStep(cls, steps, message):
+        """ Returns the step a Klipper error message refers to, or None when
+            it can not be determined. """
+
+        if len(steps) == 1:
+            return steps[0]
+
+        # Klipper quotes the offending line in most parse errors
+        for step in steps:
+            if step.gcode.lower() in message.lower():
+                return step
+
+        candidates = [step for step in steps if re.search(rf'\b{re.escape(step.gcode.split()[0])}\b', message, re.IGNORECASE)]
+        if len(candidates) > 0 and all(step.errorMessage == candidates[0].errorMessage for step in candidates):
+            return candidates[0]
+
+        return None
+
+    def _scriptErrorMessage(self, steps, message):
+        step = self._failedScriptStep(steps, message)
+        if step is not None:
+            return f'{step.errorMessage} {message}'
+        else:
+            return f'{message} (while running: {"; ".join(step.gcode for step in steps)})'
+
+    def _send(self, request):
+        assert(self.request is None)
+
+        self.request = request
+        self.request.finished.connect(self.processReply)
+        self.stateTime = time.perf_counter()
+        self.sent.emit(self, request.description)
+
+    def processReply(self, request):
+        assert(request == self.request)
+
+        self.logger.log(LOG_ALL, 'Received: %s', request.result)
+        self.request.deleteLater()
+        self.request = None
+        steps = self.scriptSteps
+        self.scriptSteps = None
+
+        # Scripts only reply ok once every line succeeded
+        error = request.error
+        if error is None and steps is not None and request.result != 'ok':
+            error = steps[-1].errorMessage
+        elif error is not None and steps is not None:
+            error = self._scriptErrorMessage(steps, error)
+
+        # Handle protocol and transport errors
+        if error is not None:
+            self.reportError(error)
 
         else: # Move to next state
-            logging.debug(f'Entering {self._transition.__qualname__}' \
-                          f' Id: {self.id_}' \
-                          f' Context: {self.context}' \
-                          f' Reply: {replyJson}')
+            self.logger.debug('Entering %s Id: %s Context: %s Reply: %s',
+                              self._transition.__qualname__, self.id_, self.context, request.result)
 
+            self._recordState(request)
             try:
-                self._transition(replyJson['result'])
+                self._transition(request.result)
             except ValueError as exception:
-                message = str(exception)
-                self.error = message
-                logging.error(message)
-                self.errorOccurred.emit(self, message)
-                self.finished.emit(self, message)
+                self.reportError(str(exception))
+
+    def reportError(self, message):
+        self.error = message
+        self.logger.error(message)
+        self._recordDuration('error')
+        self.errorOccurred.emit(self, message)
+        self.finished.emit(self, message)
 
     def finish(self, signal, result=None):
         if result is None:
             signal.emit(self.id_, self.context)
         else:
             signal.emit(self.id_, self.context, result)
+        self._recordDuration('ok')
         self.finished.emit(self, result)
 
+    def _recordState(self, request):
+        """ Records the time from sending the current state's request to
+            calling its transition, which becomes the current state. """
+
+        now = time.perf_counter()
+        transitionName = self._transition.__name__
+        metrics.observe('moonraker_state_seconds', now - self.stateTime,
+                        machine=type(self).__name__, transition=transitionName)
+        if (tracer := Tracer.defaultTracer()) is not None:
+            tracer.span(self.stateName, 'machine', self.stateTime, now, id_=id(self),
+                        next=transitionName, request=request.description)
+        self.stateName = transitionName
+
+    def _recordDuration(self, outcome):
+        now = time.perf_counter()
+        metrics.observe('moonraker_machine_seconds', now - self.startTime,
+                        machine=type(self).__name__, outcome=outcome)
+        if (tracer := Tracer.defaultTracer()) is not None:
+            tracer.span(type(self).__name__, 'machine', self.startTime, now, id_=id(self),
+                        id=str(self.id_), context=str(self.context), outcome=outcome)
+
     @staticmethod
     def _fieldsToString(fieldList):
         return '[\'' + '\'][\''.join(fieldList) + '\']'
@@ -266,10 +372,16 @@ class MoonrakerMachine(QtCore.QObject):
         if reply != 'ok':
             raise ValueError(message)
 
-    @classmethod
-    def _getConfig(cls, replyJson):
+    def _getConfig(self, replyJson):
         configPath = ['status', 'configfile', 'config']
-        return cls._getField(replyJson, configPath)
+        self.configCache.update(self._getField(replyJson, configPath))
+        return self.configCache.config
+
+    def _cachedProbeLike(self):
+        return self.configCache.section('probeLike', self._getConfigSectionProbeLike)
+
+    def _cachedTravelBounds(self):
+        return self.configCache.section('travelBounds', self._getConfigSectionTravelBounds)
 
     @classmethod
     def _getConfigSection(cls, config, sectionName, *, allowMissing=False):
@@ -326,22 +438,23 @@ class InitMachine(MoonrakerMachine):
     TYPE = CommandType.INIT
     inited = QtCore.Signal(str, dict)
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterGetConfigFile)
-        self.getGCode('G28')
+        self.runScript(self.ScriptStep('G28', 'Homing failed during initialization.'),
+                       self.ScriptStep('G90', 'Initialization failed while switching to absolute moves.'))
 
     def _enterGetConfigFile(self, replyJson):
-        self._verifyOk(replyJson, 'Homing failed during initialization.')
-        self.setTransition(self._enterAbsolutePositioning)
-        self.get('/printer/objects/query?configfile')
+        self.setTransition(self._enterDone)
+        self.configCache.invalidate() # Always start with a fresh config
+        self.queryConfig()
 
-    def _enterAbsolutePositioning(self, replyJson):
+    def _enterDone(self, replyJson):
         # Get sections
         config = self._getConfig(replyJson)
-        probeLike = self._getConfigSectionProbeLike(config)
+        probeLike = self._cachedProbeLike()
         bedMesh = self._getConfigSection(config, 'bed_mesh')
 
         # Get probe sample count
@@ -358,12 +471,8 @@ class InitMachine(MoonrakerMachine):
         self.probeXOffset, self.probeYOffset, self.probeZOffset = self._getConfigSectionProbeOffsets(probeLike)
 
         # Get travel bounds
-        self.travelBoundsMinX, self.travelBoundsMaxX, self.travelBoundsMinY, self.travelBoundsMaxY, self.travelBoundsMinZ, self.travelBoundsMaxZ = self._getConfigSectionTravelBounds(config)
+        self.travelBoundsMinX, self.travelBoundsMaxX, self.travelBoundsMinY, self.travelBoundsMaxY, self.travelBoundsMinZ, self.travelBoundsMaxZ = self._cachedTravelBounds()
 
-        self.setTransition(self._enterDone)
-        self.getGCode('G90')
-
-    def _enterDone(self, replyJson):
         # Done
         self.finish(self.inited)
 
@@ -371,8 +480,8 @@ class HomeMachine(MoonrakerMachine):
     TYPE = CommandType.HOME
     homed = QtCore.Signal(str, dict)
 
-    def __init__(self, networkAccessManager, host, id_, context, x, y, z, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, x, y, z, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
         self.x = x
         self.y = y
         self.z = z
@@ -388,7 +497,7 @@ class HomeMachine(MoonrakerMachine):
             zPart = ' Z' if self.z else ''
             parts = xPart + yPart + zPart
 
-        self.getGCode('G28' + parts)
+        self.runGCode('G28' + parts)
 
     def _enterDone(self, replyJson):
         self._verifyOk(replyJson, 'Homing failed.')
@@ -398,12 +507,12 @@ class GetTemperaturesMachine(MoonrakerMachine):
     TYPE = CommandType.GET_TEMPERATURES
     gotTemperatures = QtCore.Signal(str, dict, GetTemperaturesResult)
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.get('/printer/objects/query?heater_bed&extruder')
+        self.queryObjects('heater_bed', 'extruder', cached=True)
 
     def _enterDone(self, replyJson):
         extruderPath = ['status', 'extruder']
@@ -421,16 +530,16 @@ class GetProbeOffsetsMachine(MoonrakerMachine):
     TYPE = CommandType.GET_PROBE_OFFSETS
     gotProbeOffsets = QtCore.Signal(str, dict, GetProbeOffsetsResult)
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.get('/printer/objects/query?configfile')
+        self.queryConfig()
 
     def _enterDone(self, replyJson):
         config = self._getConfig(replyJson)
-        probeLike = self._getConfigSectionProbeLike(config)
+        probeLike = self._cachedProbeLike()
 
         xOffset, yOffset, zOffset = self._getConfigSectionProbeOffsets(probeLike)
 
@@ -444,12 +553,12 @@ class GetCurrentPositionMachine(MoonrakerMachine):
     TYPE = CommandType.GET_CURRENT_POSITION
     gotCurrentPosition = QtCore.Signal(str, dict, GetCurrentPositionResult)
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.get('/printer/objects/query?gcode_move')
+        self.queryObjects('gcode_move')
 
     def _enterDone(self, replyJson):
         positionPath = ['status', 'gcode_move', 'gcode_position']
@@ -479,16 +588,16 @@ class GetTravelBoundsMachine(MoonrakerMachine):
     TYPE = CommandType.GET_TRAVEL_BOUNDS
     gotTravelBounds = QtCore.Signal(str, dict, GetBoundsResult)
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.get('/printer/objects/query?configfile')
+        self.queryConfig()
 
     def _enterDone(self, replyJson):
         config = self._getConfig(replyJson)
-        minX, maxX, minY, maxY, minZ, maxZ = self._getConfigSectionTravelBounds(config)
+        minX, maxX, minY, maxY, minZ, maxZ = self._cachedTravelBounds()
         self.finish(self.gotTravelBounds,
                     GetBoundsResult(minX = minX,
                                     maxX = maxX,
@@ -501,12 +610,12 @@ class GetMeshCoordinatesMachine(MoonrakerMachine):
     TYPE = CommandType.GET_MESH_COORDINATES
     gotMeshCoordinates = QtCore.Signal(str, dict, GetMeshCoordinatesResult)
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.get('/printer/objects/query?configfile')
+        self.queryConfig()
 
     def _enterDone(self, replyJson):
         def getValuePair(type_, name, bedMesh):
@@ -542,13 +651,13 @@ class SetBedTemperatureMachine(MoonrakerMachine):
     TYPE = CommandType.SET_BED_TEMPERATURE
     bedTemperatureSet = QtCore.Signal(str, dict)
 
-    def __init__(self, networkAccessManager, host, id_, context, temp, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent=None)
+    def __init__(self, transport, configCache, id_, context, temp, parent=None):
+        super().__init__(transport, configCache, id_, context, parent=None)
         self.temp = temp
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.getGCode(f'M140 S{self.temp}')
+        self.runGCode(f'M140 S{self.temp}')
 
     def _enterDone(self, replyJson):
         self._verifyOk(replyJson, 'Set bed temperature failed.')
@@ -558,13 +667,13 @@ class SetNozzleTemperatureMachine(MoonrakerMachine):
     TYPE = CommandType.SET_NOZZLE_TEMPERATURE
     nozzleTemperatureSet = QtCore.Signal(str, dict)
 
-    def __init__(self, networkAccessManager, host, id_, context, temp, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, temp, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
         self.temp = temp
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.getGCode(f'M104 S{self.temp}')
+        self.runGCode(f'M104 S{self.temp}')
 
     def _enterDone(self, replyJson):
         self._verifyOk(replyJson, 'Set nozzle temperature failed.')
@@ -574,16 +683,16 @@ class GetDefaultProbeSampleCountMachine(MoonrakerMachine):
     TYPE = CommandType.GET_DEFAULT_PROBE_SAMPLE_COUNT
     gotDefaultProbeSampleCount = QtCore.Signal(str, dict, int)
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.get('/printer/objects/query?configfile')
+        self.queryConfig()
 
     def _enterDone(self, replyJson):
         config = self._getConfig(replyJson)
-        probeLike = self._getConfigSectionProbeLike(config)
+        probeLike = self._cachedProbeLike()
         probeSampleCount = self._getConfigSectionValue(probeLike, 'samples', int, default=1)
 
         self.finish(self.gotDefaultProbeSampleCount, probeSampleCount)
@@ -592,12 +701,12 @@ class GetDefaultProbeZHeightMachine(MoonrakerMachine):
     TYPE = CommandType.GET_DEFAULT_PROBE_Z_HEIGHT
     gotDefaultProbeZHeight = QtCore.Signal(str, dict, float)
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.get('/printer/objects/query?configfile')
+        self.queryConfig()
 
     def _enterDone(self, replyJson):
         config = self._getConfig(replyJson)
@@ -610,12 +719,12 @@ class GetDefaultProbeXYSpeedMachine(MoonrakerMachine):
     TYPE = CommandType.GET_DEFAULT_PROBE_XY_SPEED
     gotDefaultProbeXYSpeed = QtCore.Signal(str, dict, float)
 
-    def __init__(self, networkAccessManager, host, id_, context, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
     def start(self):
         self.setTransition(self._enterDone)
-        self.get('/printer/objects/query?configfile')
+        self.queryConfig()
 
     def _enterDone(self, replyJson):
         config = self._getConfig(replyJson)
@@ -628,8 +737,8 @@ class ProbeMachine(MoonrakerMachine):
     TYPE = CommandType.PROBE
     probed = QtCore.Signal(str, dict, ProbeResult)
 
-    def __init__(self, networkAccessManager, host, id_, context, x, y, sampleCount, xySpeed, probeHeight, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, x, y, sampleCount, xySpeed, probeHeight, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
 
         assert(sampleCount is not None)
         assert(xySpeed is not None)
@@ -642,56 +751,196 @@ class ProbeMachine(MoonrakerMachine):
         self.probeHeight = probeHeight
 
     def start(self):
-        self.setTransition(self._enterRaise)
-        self.get('/printer/objects/query?configfile')
+        self.setTransition(self._enterProbe)
+        self.queryConfig()
 
-    def _enterRaise(self, replyJson):
+    def _enterProbe(self, replyJson):
         config = self._getConfig(replyJson)
-        probeLike = self._getConfigSectionProbeLike(config)
+        probeLike = self._cachedProbeLike()
 
         self.probeXOffset, self.probeYOffset, _ = self._getConfigSectionProbeOffsets(probeLike)
 
-        self.setTransition(self._enterWaitForRaise)
-        self.getGCode(f'G0 Z{self.probeHeight}')
-
-    def _enterWaitForRaise(self, replyJson):
-        self._verifyOk(replyJson, 'Probe failed while raising the toolhead.')
-        self.setTransition(self._enterMove)
-        self.getGCode(f'M400')
-
-    def _enterMove(self, replyJson):
-        self._verifyOk(replyJson, 'Probe failed waiting for the toolhead to rise.')
-        self.setTransition(self._enterWaitForMove)
-        self.getGCode(f'G0 X{self.x - self.probeXOffset} Y{self.y - self.probeYOffset} F{60*self.xySpeed}')
-
-    def _enterWaitForMove(self, replyJson):
-        self._verifyOk(replyJson, 'Probe failed while moving toolhead.')
-        self.setTransition(self._enterProbe)
-        self.getGCode(f'M400')
-
-    def _enterProbe(self, replyJson):
-        self._verifyOk(replyJson, 'Probe failed waiting for the toolhead to move.')
         self.setTransition(self._enterGetResult)
-        self.getGCode(f'PROBE SAMPLES={self.sampleCount}') # TODO: Add more configuration parameters (see https://www.klipper3d.org/G-Codes.html#additional-commands)
+        self.runScript(*self.probeSteps(self.x - self.probeXOffset, self.y - self.probeYOffset, self.sampleCount, self.xySpeed, self.probeHeight))
+
+    @classmethod
+    def probeSteps(cls, x, y, sampleCount, xySpeed, probeHeight):
+        # TODO: Add more PROBE configuration parameters (see https://www.klipper3d.org/G-Codes.html#additional-commands)
+        return [cls.ScriptStep(f'G0 Z{probeHeight}', 'Probe failed while raising the toolhead.'),
+                cls.ScriptStep('M400', 'Probe failed waiting for the toolhead to rise.'),
+                cls.ScriptStep(f'G0 X{x} Y{y} F{60*xySpeed}', 'Probe failed while moving toolhead.'),
+                cls.ScriptStep('M400', 'Probe failed waiting for the toolhead to move.'),
+                cls.ScriptStep(f'PROBE SAMPLES={sampleCount}', 'Probe failed while probing.')]
 
     def _enterGetResult(self, replyJson):
-        self._verifyOk(replyJson, 'Probe failed while probing.')
         self.setTransition(self._enterDone)
-        self.get('/printer/objects/query?probe')
+        self.queryObjects('probe')
 
     def _enterDone(self, replyJson):
         z = self._getField(replyJson, ['status', 'probe', 'last_z_result'], type_=float)
         self.finish(self.probed,
                     ProbeResult(x = self.x,
                                 y = self.y,
-                                z = z))
+                                z = z,
+                                sampleCount = self.sampleCount))
+
+class ProbeManyMachine(MoonrakerMachine):
+    TYPE = CommandType.PROBE_MANY
+    probedPoint = QtCore.Signal(str, dict, int, ProbeResult)
+    probedMany = QtCore.Signal(str, dict, list)
+
+    def __init__(self, transport, configCache, id_, context, points, order, sampleCount, xySpeed, probeHeight, clearancePlanner=None, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
+
+        assert(sampleCount is not None)
+        assert(xySpeed is not None)
+        assert(probeHeight is not None)
+
+        self.points = points
+        self.order = list(order)
+        self.sampleCount = sampleCount
+        self.xySpeed = xySpeed
+        self.probeHeight = probeHeight
+        self.clearancePlanner = clearancePlanner
+        self.results = [None] * len(self.points)
+        self.index = None
+
+    def start(self):
+        self.setTransition(self._enterNextPoint)
+        self.queryConfig()
+
+    def _enterNextPoint(self, replyJson):
+        if self.index is None:
+            config = self._getConfig(replyJson)
+            probeLike = self._cachedProbeLike()
+
+            self.probeXOffset, self.probeYOffset, _ = self._getConfigSectionProbeOffsets(probeLike)
+
+        if len(self.order) == 0:
+            self.finish(self.probedMany, self.results)
+            return
+
+        # The first travel height is unknown, the toolhead may be anywhere
+        previousPoint = None if self.index is None else self.points[self.index]
+        self.index = self.order.pop(0)
+        point = self.points[self.index]
+        height = self.probeHeight
+        if self.clearancePlanner is not None:
+            height = self.clearancePlanner.hopHeight(previousPoint, point, self.probeHeight, probeOffset=Point2F(self.probeXOffset, self.probeYOffset))
+
+        self.setTransition(self._enterGetResult)
+        self.runScript(*ProbeMachine.probeSteps(point.x - self.probeXOffset, point.y - self.probeYOffset, self.sampleCount, self.xySpeed, height))
+
+    def _enterGetResult(self, replyJson):
+        self.setTransition(self._enterProbed)
+        self.queryObjects('probe')
+
+    def _enterProbed(self, replyJson):
+        z = self._getField(replyJson, ['status', 'probe', 'last_z_result'], type_=float)
+        point = self.points[self.index]
+        self.results[self.index] = ProbeResult(x = point.x,
+                                               y = point.y,
+                                               z = z,
+                                               sampleCount = self.sampleCount)
+        if self.clearancePlanner is not None:
+            self.clearancePlanner.addHeight(point.x, point.y, z)
+        self.probedPoint.emit(self.id_, self.context, self.index, self.results[self.index])
+        self._enterNextPoint(replyJson)
+
+class ProbeMeshMachine(MoonrakerMachine):
+    """ Probes the whole mesh with BED_MESH_CALIBRATE into a temporary
+        profile, then restores the mesh that was loaded before. The temporary
+        profile is only held in memory, no saved mesh is changed. """
+
+    TYPE = CommandType.PROBE_MESH
+    TEMPORARY_PROFILE = 'bedleveler5000_temporary'
+    probedMesh = QtCore.Signal(str, dict, ProbeMeshResult)
+
+    def __init__(self, transport, configCache, id_, context, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
+        self.originalProfile = None
+        self.restoreError = None
+        self.result = None
+
+    def start(self):
+        self.setTransition(self._enterCalibrate)
+        self.queryObjects('bed_mesh')
+
+    def _enterCalibrate(self, replyJson):
+        self.originalProfile = self._getField(replyJson, ['status', 'bed_mesh', 'profile_name'], type_=str)
+        if self.originalProfile == self.TEMPORARY_PROFILE:
+            self.originalProfile = ''
+
+        self.setTransition(self._enterGetResult)
+        self.runScript(self.ScriptStep(f'BED_MESH_CALIBRATE PROFILE={self.TEMPORARY_PROFILE}', 'Mesh probing failed while calibrating.'))
+
+    def _enterGetResult(self, replyJson):
+        self.setTransition(self._enterRestore)
+        self.queryObjects('bed_mesh')
+
+    def _enterRestore(self, replyJson):
+        self.result = self.parseProbedMesh(self._getField(replyJson, ['status', 'bed_mesh']))
+        self._restore()
+
+    def _restore(self):
+        if len(self.originalProfile) > 0:
+            steps = [self.ScriptStep(f'BED_MESH_PROFILE LOAD={self.originalProfile}', f'Mesh probing failed while reloading the \'{self.originalProfile}\' mesh profile.')]
+        else:
+            steps = [self.ScriptStep('BED_MESH_CLEAR', 'Mesh probing failed while clearing the probed mesh.')]
+        steps.append(self.ScriptStep(f'BED_MESH_PROFILE REMOVE={self.TEMPORARY_PROFILE}', 'Mesh probing failed while removing the temporary mesh profile.'))
+
+        self.setTransition(self._enterDone)
+        self.runScript(*steps)
+
+    def _enterDone(self, replyJson):
+        if self.restoreError is not None:
+            self.reportError(self.restoreError)
+        else:
+            self.finish(self.probedMesh, self.result)
+
+    def reportError(self, message):
+        # Restore the original mesh once calibration has started, then report
+        if self.originalProfile is not None and self.restoreError is None:
+            self.restoreError = message
+            self._restore()
+        elif self.restoreError is not None and message != self.restoreError:
+            super().reportError(f'{self.restoreError} {message}')
+        else:
+            super().reportError(message)
+
+    @classmethod
+    def parseProbedMesh(cls, bedMesh):
+        matrix = cls._getField(bedMesh, ['probed_matrix'])
+        meshMin = cls._getField(bedMesh, ['mesh_min'])
+        meshMax = cls._getField(bedMesh, ['mesh_max'])
+
+        if not isinstance(matrix, list) or len(matrix) < 2 or \
+           not all(isinstance(row, list) and len(row) == len(matrix[0]) for row in matrix) or \
+           len(matrix[0]) < 2:
+            raise ValueError('Mesh probing failed, \'probed_matrix\' is not a valid mesh.')
+
+        z = [[cls._safeConvert(float, value) for value in row] for row in matrix]
+        if any(value is None for row in z for value in row):
+            raise ValueError('Mesh probing failed, invalid value found in \'probed_matrix\'.')
+
+        bounds = [cls._safeConvert(float, value) for value in list(meshMin) + list(meshMax)]
+        if len(bounds) != 4 or None in bounds:
+            raise ValueError('Mesh probing failed, invalid \'mesh_min\' or \'mesh_max\' value.')
+
+        return ProbeMeshResult(rowCount = len(z),
+                               columnCount = len(z[0]),
+                               minX = bounds[0],
+                               maxX = bounds[2],
+                               minY = bounds[1],
+                               maxY = bounds[3],
+                               z = z)
 
 class MoveMachine(MoonrakerMachine):
     TYPE = CommandType.MOVE
     moved = QtCore.Signal(str, dict)
 
-    def __init__(self, networkAccessManager, host, id_, context, x, y, z, e, f, wait, relative, parent=None):
-        super().__init__(networkAccessManager, host, id_, context, parent)
+    def __init__(self, transport, configCache, id_, context, x, y, z, e, f, wait, relative, parent=None):
+        super().__init__(transport, configCache, id_, context, parent)
         self.x = x
         self.y = y
         self.z = z
@@ -701,26 +950,19 @@ class MoveMachine(MoonrakerMachine):
         self.relative = relative
 
     def start(self):
-        self.setTransition(self._enterMove)
-        self.getGCode('G91' if self.relative else 'G90')
-
-    def _enterMove(self, replyJson):
-        self._verifyOk(replyJson, f'Move failed while switching to {"relative" if self.relative else "absolute"} moves.')
-
-        self.setTransition(self._enterWait if self.wait else self._enterDone)
-
         xPart = f' X{self.x}' if self.x is not None else ''
         yPart = f' Y{self.y}' if self.y is not None else ''
         zPart = f' Z{self.z}' if self.z is not None else ''
         ePart = f' E{self.e}' if self.e is not None else ''
         fPart = f' F{self.f}' if self.f is not None else ''
-        self.getGCode('G0' + xPart + yPart + zPart + ePart + fPart)
 
-    def _enterWait(self, replyJson):
-        self._verifyOk(replyJson, f'Move failed while moving.')
+        steps = [self.ScriptStep('G91' if self.relative else 'G90', f'Move failed while switching to {"relative" if self.relative else "absolute"} moves.'),
+                 self.ScriptStep('G0' + xPart + yPart + zPart + ePart + fPart, 'Move failed while moving.')]
+        if self.wait:
+            steps.append(self.ScriptStep('M400', 'Moved failed while waiting for move to finish.'))
+
         self.setTransition(self._enterDone)
-        self.getGCode('M400')
+        self.runScript(*steps)
 
     def _enterDone(self, replyJson):
-        self._verifyOk(replyJson, f'Moved failed while waiting for move to finish.')
         self.finish(self.moved)
\ No newline at end of file
@@ -0,0 +1,960 @@
+#!/usr/bin/env python
+
+from Common.Simulation import BedSurface
+from Common.Simulation import Heater
+from Common.Simulation import trapezoidTime
+import base64
+import collections
+import hashlib
+import http.server
+import json
+import math
+import random
+import re
+import socket
+import struct
+import threading
+import time
+import urllib.parse
+
+DEFAULT_PRINTER_CFG = '''
+[printer]
+kinematics: cartesian
+max_velocity: 300
+max_accel: 3000
+max_z_velocity: 5
+
+[stepper_x]
+position_min: 0
+position_endstop: 0
+position_max: 235
+homing_speed: 50
+
+[stepper_y]
+position_min: 0
+position_endstop: 0
+position_max: 235
+homing_speed: 50
+
+[stepper_z]
+endstop_pin: probe:z_virtual_endstop
+position_min: -2
+position_max: 250
+homing_speed: 5
+
+[extruder]
+min_temp: 0
+max_temp: 260
+
+[heater_bed]
+min_temp: 0
+max_temp: 110
+
+[bltouch]
+x_offset: -40
+y_offset: -10
+z_offset: 1.5
+speed: 5
+lift_speed: 10
+samples: 2
+sample_retract_dist: 2
+
+[safe_z_home]
+home_xy_position: 157.5, 127.5
+z_hop: 10
+
+[bed_mesh]
+speed: 100
+horizontal_move_z: 5
+mesh_min: 10, 10
+mesh_max: 190, 220
+probe_count: 5, 5
+'''
+
+def parseConfig(text):
+    """ Parses printer.cfg into the 'config' member of the 'configfile'
+        printer object: the raw option values by section, with section and
+        option names in lowercase. """
+
+    config = {}
+    section = None
+    option = None
+    for rawLine in text.splitlines():
+        line = re.split(r'(?:^|\s)[#;]', rawLine, maxsplit=1)[0].rstrip()
+        if len(line.strip()) == 0:
+            continue
+
+        # Indented lines continue the previous option
+        if line[0].isspace() and option is not None:
+            config[section][option] += '\n' + line.strip()
+        elif line.startswith('['):
+            section = line.strip()[1:-1].strip().lower()
+            config.setdefault(section, {})
+            option = None
+        elif (match := re.fullmatch(r'([^:=]+)[:=](.*)', line)) is not None and section is not None:
+            option = match[1].strip().lower()
+            config[section][option] = match[2].strip()
+        else:
+            raise ValueError(f'Unable to parse printer.cfg line: [{rawLine}].')
+
+    return config
+
+class KlipperError(Exception):
+    pass
+
+REQUIRED = object() # Default of config options without one
+
+class Klipper:
+    """ Printer objects and G-code commands of a simulated Klipper host.
+        Scripts run one at a time like on the real host: moves are queued
+        and return at once, homing, probing and M400 wait for the motion.
+        Durations are simulated seconds multiplied by timeScale. The bed
+        surface is given in probe coordinates. scriptErrors fails the listed
+        commands with the given message. """
+
+    HOMING_RETRACT_TIME = 1.0 # s per axis
+    TEMPERATURE_TOLERANCE = 1.0 # M109 and M190
+
+    def __init__(self, printerConfig=DEFAULT_PRINTER_CFG, *, surface=None, noise=0.0, seed=None, timeScale=1.0, scriptErrors=None):
+        self.printerConfig = printerConfig
+        self.surface = surface
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.timeScale = timeScale
+        self.scriptErrors = {} if scriptErrors is None else {name.upper(): message for name, message in scriptErrors.items()}
+        self.lock = threading.RLock()
+        self.responseListeners = [] # Called with each G-code response
+        self.restartListeners = [] # Called with 'disconnected' and 'ready'
+        self.restart()
+
+    def restart(self):
+        """ Reloads printer.cfg and restores the power on state. """
+
+        with self.lock:
+            self.config = parseConfig(self.printerConfig)
+
+            self.minimum = [self._option(f'stepper_{axis}', 'position_min', float, 0.0) for axis in 'xyz']
+            self.maximum = [self._option(f'stepper_{axis}', 'position_max', float) for axis in 'xyz']
+            self.homingSpeed = [self._option(f'stepper_{axis}', 'homing_speed', float, 5.0) for axis in 'xyz']
+            self.maxVelocity = self._option('printer', 'max_velocity', float, 300.0)
+            self.maxAcceleration = self._option('printer', 'max_accel', float, 3000.0)
+            self.maxZVelocity = self._option('printer', 'max_z_velocity', float, self.maxVelocity)
+
+            self.probeName = 'bltouch' if 'bltouch' in self.config else 'probe'
+            self.probeOffset = [self._option(self.probeName, f'{axis}_offset', float, 0.0) for axis in 'xyz']
+            self.probeSpeed = self._option(self.probeName, 'speed', float, 5.0)
+            self.probeLiftSpeed = self._option(self.probeName, 'lift_speed', float, self.probeSpeed)
+            self.probeSamples = self._option(self.probeName, 'samples', int, 1)
+            self.probeRetract = self._option(self.probeName, 'sample_retract_dist', float, 2.0)
+
+            self.meshMin = self._option('bed_mesh', 'mesh_min', self._pair, (self.minimum[0], self.minimum[1]))
+            self.meshMax = self._option('bed_mesh', 'mesh_max', self._pair, (self.maximum[0], self.maximum[1]))
+            self.meshCount = self._option('bed_mesh', 'probe_count', lambda value: [int(part) for part in self._pair(value)], (3, 3))
+            self.meshSpeed = self._option('bed_mesh', 'speed', float, 50.0)
+            self.meshHeight = self._option('bed_mesh', 'horizontal_move_z', float, 5.0)
+
+            self.safeHomePosition = self._option('safe_z_home', 'home_xy_position', self._pair, None)
+            self.zHop = self._option('safe_z_home', 'z_hop', float, 0.0)
+
+            if self.surface is None:
+                self.surface = BedSurface(center=((self.minimum[0] + self.maximum[0]) / 2, (self.minimum[1] + self.maximum[1]) / 2))
+
+            self.position = [(self.minimum[axis] + self.maximum[axis]) / 2 for axis in range(3)] + [0.0]
+            self.homedAxes = ''
+            self.absolute = True
+            self.speed = 25.0 # mm/s
+            self.motionEnd = 0.0
+            self.lastZResult = 0.0
+            self.lastQuery = False
+
+            self.extruder = Heater(30.0)
+            self.heaterBed = Heater(90.0)
+
+            # Klipper loads the 'default' profile on start
+            self.profiles = {'default': self._probeMesh()}
+            self.profileName = 'default'
+            self.mesh = self.profiles['default']
+
+    def _option(self, section, option, type_, default=REQUIRED):
+        value = self.config.get(section, {}).get(option)
+        if value is None:
+            if default is REQUIRED:
+                raise ValueError(f'Option \'{option}\' in section \'{section}\' must be specified.')
+            return default
+        return type_(value)
+
+    @staticmethod
+    def _pair(value):
+        parts = [float(part) for part in value.split(',')]
+        if len(parts) != 2:
+            raise ValueError(f'Expected two values but got [{value}].')
+        return parts
+
+    # Time
+    def _simulatedTime(self):
+        return time.monotonic() / self.timeScale if self.timeScale > 0 else None
+
+    def _wait(self, duration):
+        if self.timeScale > 0:
+            time.sleep(duration * self.timeScale)
+
+    def _waitForMoves(self):
+        remaining = self.motionEnd - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def _moveTime(self, start, end, speed):
+        xyTime = trapezoidTime(math.hypot(end[0] - start[0], end[1] - start[1]), min(speed, self.maxVelocity), self.maxAcceleration)
+        zTime = trapezoidTime(abs(end[2] - start[2]), min(speed, self.maxZVelocity), self.maxAcceleration)
+        return max(xyTime, zTime)
+
+    def _queueMove(self, target, speed):
+        startTime = max(time.monotonic(), self.motionEnd)
+        self.motionEnd = startTime + self._moveTime(self.position, target, speed) * self.timeScale
+        self.position[:3] = target
+
+    # Status
+    def status(self):
+        """ Returns every printer object with all of its fields. """
+
+        with self.lock:
+            now = self._simulatedTime()
+            mesh = self.mesh
+            return {'webhooks': {'state': 'ready', 'state_message': 'Printer is ready'},
+                    'configfile': {'config': {section: dict(options) for section, options in self.config.items()}},
+                    'toolhead': {'homed_axes': self.homedAxes,
+                                 'position': list(self.position),
+                                 'max_velocity': self.maxVelocity,
+                                 'max_accel': self.maxAcceleration},
+                    'gcode_move': {'absolute_coordinates': self.absolute,
+                                   'speed': self.speed * 60,
+                                   'position': list(self.position),
+                                   'gcode_position': list(self.position)},
+                    'probe': {'name': self.probeName,
+                              'last_query': self.lastQuery,
+                              'last_z_result': self.lastZResult},
+                    'extruder': self._heaterStatus(self.extruder, now),
+                    'heater_bed': self._heaterStatus(self.heaterBed, now),
+                    'bed_mesh': {'profile_name': self.profileName,
+                                 'mesh_min': [] if mesh is None else list(mesh['mesh_params']['min']),
+                                 'mesh_max': [] if mesh is None else list(mesh['mesh_params']['max']),
+                                 'probed_matrix': [[]] if mesh is None else [list(row) for row in mesh['points']],
+                                 'mesh_matrix': [[]] if mesh is None else [list(row) for row in mesh['points']],
+                                 'profiles': {name: {'points': [list(row) for row in profile['points']],
+                                                     'mesh_params': {'min_x': profile['mesh_params']['min'][0],
+                                                                     'min_y': profile['mesh_params']['min'][1],
+                                                                     'max_x': profile['mesh_params']['max'][0],
+                                                                     'max_y': profile['mesh_params']['max'][1],
+                                                                     'x_count': len(profile['points'][0]),
+                                                                     'y_count': len(profile['points'])}}
+                                              for name, profile in self.profiles.items()}}}
+
+    @staticmethod
+    def _heaterStatus(heater, now):
+        return {'temperature': round(heater.temperature(now), 2),
+                'target': heater.target,
+                'power': round(heater.power(now) / 127, 3)}
+
+    def query(self, objects):
+        """ objects maps printer object names to the list of fields to
+            return, or None for all of them. Unknown objects are skipped. """
+
+        status = self.status()
+        result = {}
+        for name, fields in objects.items():
+            if name in status:
+                result[name] = status[name] if fields is None else {field: status[name][field] for field in fields if field in status[name]}
+        return {'eventtime': time.monotonic(), 'status': result}
+
+    # G-code
+    def runScript(self, script):
+        """ Runs each line in order, raises KlipperError at the first line
+            that fails. """
+
+        with self.lock:
+            for line in script.split('\n'):
+                line = line.split(';', 1)[0].strip()
+                if len(line) > 0:
+                    self._runLine(line)
+
+    def _respond(self, message):
+        for listener in self.responseListeners:
+            listener(message)
+
+    def _runLine(self, line):
+        name, _, arguments = line.partition(' ')
+        name = name.upper()
+
+        if name in self.scriptErrors:
+            raise KlipperError(self.scriptErrors[name])
+
+        if re.fullmatch(r'[A-Z]\d+(\.\d+)?', name):
+            parameters = {token[0].upper(): token[1:] for token in arguments.split()}
+        else:
+            parameters = {}
+            for token in arguments.split():
+                key, equals, value = token.partition('=')
+                if len(equals) == 0:
+                    raise KlipperError(f'Malformed command \'{line}\'')
+                parameters[key.upper()] = value
+
+        handler = getattr(self, '_command' + name.replace('.', '_'), None)
+        if handler is None:
+            raise KlipperError(f'Unknown command:"{name}"')
+
+        try:
+            handler(parameters)
+        except ValueError:
+            raise KlipperError(f'Unable to parse \'{line}\'')
+
+    def _requireHomed(self, axes, target):
+        if any(axis not in self.homedAxes for axis in axes):
+            raise KlipperError('Must home axis first: ' + ' '.join(f'{value:.3f}' for value in target[:3]) + f' [{self.position[3]:.3f}]')
+
+    def _commandG28(self, parameters):
+        axes = ''.join(axis for axis in 'xyz' if axis.upper() in parameters) or 'xyz'
+        self._waitForMoves()
+
+        duration = 0.0
+        for index, axis in enumerate('xy'):
+            if axis in axes:
+                duration += (self.position[index] - self.minimum[index]) / self.homingSpeed[index] + self.HOMING_RETRACT_TIME
+                self.position[index] = self._option(f'stepper_{axis}', 'position_endstop', float, self.minimum[index])
+
+        if 'z' in axes:
+            if self.safeHomePosition is not None:
+                if 'x' not in self.homedAxes + axes or 'y' not in self.homedAxes + axes:
+                    raise KlipperError('Must home X and Y axes first')
+                target = list(self.safeHomePosition) + [self.position[2]]
+                duration += self._moveTime(self.position, target, self.maxVelocity)
+                self.position[:2] = self.safeHomePosition
+            duration += self.position[2] / self.homingSpeed[2] + self.HOMING_RETRACT_TIME + self.zHop / self.maxZVelocity
+            self.position[2] = self.zHop
+
+        self._wait(duration)
+        self.homedAxes = ''.join(axis for axis in 'xyz' if axis in self.homedAxes + axes)
+
+    def _commandG90(self, parameters):
+        self.absolute = True
+
+    def _commandG91(self, parameters):
+        self.absolute = False
+
+    def _commandG0(self, parameters):
+        if 'F' in parameters:
+            self.speed = float(parameters['F']) / 60
+
+        target = list(self.position[:3])
+        moved = ''
+        for index, axis in enumerate('XYZ'):
+            if axis in parameters:
+                value = float(parameters[axis])
+                target[index] = value if self.absolute else target[index] + value
+                moved += axis.lower()
+        if 'E' in parameters:
+            value = float(parameters['E'])
+            self.position[3] = value if self.absolute else self.position[3] + value
+
+        self._requireHomed(moved, target)
+        if any(not self.minimum[index] <= target[index] <= self.maximum[index] for index in range(3) if 'xyz'[index] in moved):
+            raise KlipperError('Move out of range: ' + ' '.join(f'{value:.3f}' for value in target) + f' [{self.position[3]:.3f}]')
+
+        self._queueMove(target, self.speed)
+
+    _commandG1 = _commandG0
+
+    def _commandM400(self, parameters):
+        self._waitForMoves()
+
+    def _commandM114(self, parameters):
+        self._respond(' '.join(f'{axis}:{value:.3f}' for axis, value in zip('XYZE', self.position)))
+
+    def _commandM105(self, parameters):
+        now = self._simulatedTime()
+        self._respond(f'ok T:{self.extruder.temperature(now):.1f} /{self.extruder.target:.1f} B:{self.heaterBed.temperature(now):.1f} /{self.heaterBed.target:.1f}')
+
+    def _setTemperature(self, heater, parameters, wait):
+        heater.setTarget(float(parameters.get('S', 0)), self._simulatedTime())
+        if wait and heater.target > 0 and self.timeScale > 0:
+            # Time for the first order response to get within tolerance
+            error = abs(heater.temperature(self._simulatedTime()) - heater.target)
+            if error > self.TEMPERATURE_TOLERANCE:
+                self._wait(heater.timeConstant * math.log(error / self.TEMPERATURE_TOLERANCE))
+
+    def _commandM104(self, parameters):
+        self._setTemperature(self.extruder, parameters, False)
+
+    def _commandM109(self, parameters):
+        self._setTemperature(self.extruder, parameters, True)
+
+    def _commandM140(self, parameters):
+        self._setTemperature(self.heaterBed, parameters, False)
+
+    def _commandM190(self, parameters):
+        self._setTemperature(self.heaterBed, parameters, True)
+
+    def _probeHeight(self, x, y):
+        """ Toolhead height at which the probe triggers over (x, y). """
+
+        return self.surface(x, y) + self.probeOffset[2]
+
+    def _commandPROBE(self, parameters):
+        if 'z' not in self.homedAxes:
+            raise KlipperError('Must home before probe')
+        self._waitForMoves()
+
+        samples = int(parameters.get('SAMPLES', self.probeSamples))
+        speed = float(parameters.get('PROBE_SPEED', self.probeSpeed))
+        retract = float(parameters.get('SAMPLE_RETRACT_DIST', self.probeRetract))
+
+        x = self.position[0] + self.probeOffset[0]
+        y = self.position[1] + self.probeOffset[1]
+        height = self._probeHeight(x, y)
+        if self.position[2] <= height:
+            raise KlipperError('Probe triggered prior to movement')
+
+        results = []
+        duration = (self.position[2] - height) / speed
+        for sample in range(samples):
+            results.append(height + (self.random.gauss(0.0, self.noise) if self.noise > 0 else 0.0))
+            self._respond(f'probe at {x:.3f},{y:.3f} is z={results[-1]:.6f}')
+            if sample < samples - 1:
+                duration += retract / self.probeLiftSpeed + retract / speed
+        self._wait(duration)
+
+        self.position[2] = results[-1]
+        self.lastZResult = sum(results) / len(results)
+        self._respond(f'Result is z={self.lastZResult:.6f}')
+
+    def _commandQUERY_PROBE(self, parameters):
+        self.lastQuery = False
+        self._respond('probe: open')
+
+    def _probeMesh(self):
+        """ Samples the surface on the configured grid, rows run from the
+            front (minimum Y) to the back. """
+
+        columnCount, rowCount = self.meshCount
+        points = [[self.surface(self.meshMin[0] + (self.meshMax[0] - self.meshMin[0]) * column / (columnCount - 1),
+                                self.meshMin[1] + (self.meshMax[1] - self.meshMin[1]) * row / (rowCount - 1)) +
+                   (self.random.gauss(0.0, self.noise) if self.noise > 0 else 0.0)
+                   for column in range(columnCount)] for row in range(rowCount)]
+        return {'points': points, 'mesh_params': {'min': tuple(self.meshMin), 'max': tuple(self.meshMax)}}
+
+    def _commandBED_MESH_CALIBRATE(self, parameters):
+        if 'xyz' != self.homedAxes:
+            raise KlipperError('Must home axis first')
+        self._waitForMoves()
+
+        # Every point is probed from the horizontal move height
+        columnCount, rowCount = self.meshCount
+        spacing = ((self.meshMax[0] - self.meshMin[0]) / (columnCount - 1), (self.meshMax[1] - self.meshMin[1]) / (rowCount - 1))
+        duration = columnCount * rowCount * (self.meshHeight / self.probeSpeed + self.meshHeight / self.probeLiftSpeed)
+        duration += rowCount * (columnCount - 1) * trapezoidTime(spacing[0], self.meshSpeed, self.maxAcceleration)
+        duration += (rowCount - 1) * trapezoidTime(spacing[1], self.meshSpeed, self.maxAcceleration)
+        self._wait(duration)
+
+        name = parameters.get('PROFILE', 'default')
+        self.mesh = self._probeMesh()
+        self.profiles[name] = self.mesh
+        self.profileName = name
+        self.position[:3] = [self.meshMax[0] - self.probeOffset[0], self.meshMax[1] - self.probeOffset[1], self.meshHeight]
+        self._respond('Mesh Bed Leveling Complete')
+
+    def _commandBED_MESH_PROFILE(self, parameters):
+        if 'LOAD' in parameters:
+            name = parameters['LOAD']
+            if name not in self.profiles:
+                raise KlipperError(f'bed_mesh: Unknown profile [{name}]')
+            self.mesh = self.profiles[name]
+            self.profileName = name
+        elif 'SAVE' in parameters:
+            if self.mesh is None:
+                raise KlipperError(f'Unable to save to profile [{parameters["SAVE"]}], the bed has not been probed')
+            self.profiles[parameters['SAVE']] = self.mesh
+            self.profileName = parameters['SAVE']
+        elif 'REMOVE' in parameters:
+            if self.profiles.pop(parameters['REMOVE'], None) is None:
+                self._respond(f'No profile named [{parameters["REMOVE"]}] to remove')
+        else:
+            raise KlipperError('Invalid syntax for BED_MESH_PROFILE')
+
+    def _commandBED_MESH_CLEAR(self, parameters):
+        self.mesh = None
+        self.profileName = ''
+
+    def _commandRESTART(self, parameters):
+        for listener in self.restartListeners:
+            listener('disconnected')
+        self.restart()
+        for listener in self.restartListeners:
+            listener('ready')
+
+    _commandFIRMWARE_RESTART = _commandRESTART
+    _commandSAVE_CONFIG = _commandRESTART
+
+class RequestError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+class WebSocketConnection:
+    """ Server side of a WebSocket (RFC 6455) carrying Moonraker's JSON-RPC
+        API, with the printer objects it subscribed to. """
+
+    GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    def __init__(self, handler, simulator):
+        self.handler = handler
+        self.simulator = simulator
+        self.writeLock = threading.Lock()
+        self.statusLock = threading.Lock()
+        self.subscriptions = {} # name: fields
+        self.lastStatus = {}
+
+    @classmethod
+    def acceptKey(cls, key):
+        return base64.b64encode(hashlib.sha1((key + cls.GUID).encode()).digest()).decode()
+
+    def _readExactly(self, count):
+        data = self.handler.rfile.read(count)
+        if len(data) < count:
+            raise ConnectionError('Connection closed.')
+        return data
+
+    def readMessage(self):
+        """ Returns the next text or binary message, None once closed. """
+
+        fragments = []
+        while True:
+            first, second = self._readExactly(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack('>H', self._readExactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('>Q', self._readExactly(8))[0]
+            mask = self._readExactly(4) if second & 0x80 else None
+            payload = self._readExactly(length)
+            if mask is not None:
+                payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+
+            if opcode == 0x8: # Close
+                self.send(payload[:2], opcode=0x8)
+                return None
+            elif opcode == 0x9: # Ping
+                self.send(payload, opcode=0xA)
+            elif opcode in [0x0, 0x1, 0x2]:
+                fragments.append(payload)
+                if first & 0x80:
+                    return b''.join(fragments).decode()
+
+    def send(self, payload, opcode=0x1):
+        if isinstance(payload, str):
+            payload = payload.encode()
+
+        if len(payload) < 126:
+            header = struct.pack('>BB', 0x80 | opcode, len(payload))
+        elif len(payload) < 65536:
+            header = struct.pack('>BBH', 0x80 | opcode, 126, len(payload))
+        else:
+            header = struct.pack('>BBQ', 0x80 | opcode, 127, len(payload))
+
+        with self.writeLock:
+            try:
+                self.handler.wfile.write(header + payload)
+                self.handler.wfile.flush()
+            except OSError:
+                pass
+
+    def notify(self, method, params=None):
+        message = {'jsonrpc': '2.0', 'method': method}
+        if params is not None:
+            message['params'] = params
+        self.send(json.dumps(message))
+
+    def subscribe(self, objects):
+        with self.statusLock:
+            self.subscriptions = dict(objects)
+            result = self.simulator.klipper.query(self.subscriptions)
+            self.lastStatus = result['status']
+        return result
+
+    def notifyStatus(self):
+        """ Sends the fields of the subscribed objects that changed since the
+            last notification. """
+
+        with self.statusLock:
+            if len(self.subscriptions) == 0:
+                return
+
+            status = self.simulator.klipper.query(self.subscriptions)['status']
+            changes = {}
+            for name, fields in status.items():
+                previous = self.lastStatus.get(name, {})
+                changed = {field: value for field, value in fields.items() if previous.get(field) != value}
+                if len(changed) > 0:
+                    changes[name] = changed
+            self.lastStatus = status
+
+            if len(changes) > 0:
+                self.notify('notify_status_update', [changes, time.monotonic()])
+
+    def serve(self):
+        while (text := self.readMessage()) is not None:
+            try:
+                message = json.loads(text)
+                method = message['method']
+                params = message.get('params', {})
+                id_ = message.get('id')
+            except (json.JSONDecodeError, TypeError, KeyError):
+                self.send(json.dumps({'jsonrpc': '2.0', 'error': {'code': -32700, 'message': 'Parse error'}, 'id': None}))
+                continue
+
+            reply = {'jsonrpc': '2.0', 'id': id_}
+            try:
+                reply['result'] = self.simulator.call(method, params, self)
+            except RequestError as error:
+                reply['error'] = {'code': error.code, 'message': error.message}
+
+            if id_ is not None:
+                self.send(json.dumps(reply))
+            if method == 'printer.gcode.script':
+                self.notifyStatus()
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    """ Serves the HTTP API and upgrades /websocket requests. """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        url = urllib.parse.urlsplit(self.path)
+        simulator = self.server.simulator
+
+        if url.path == '/websocket' and self.headers.get('Upgrade', '').lower() == 'websocket':
+            self._serveWebSocket(simulator)
+            return
+
+        # Arguments come from the query string or a JSON body
+        arguments = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        length = int(self.headers.get('Content-Length', 0))
+        if length > 0:
+            try:
+                arguments.update(json.loads(self.rfile.read(length)))
+            except (json.JSONDecodeError, TypeError):
+                self._reply(400, {'error': {'code': 400, 'message': 'Invalid JSON body'}})
+                return
+
+        if url.path == '/printer/objects/query' and 'objects' not in arguments:
+            arguments = {'objects': {name: value.split(',') if len(value) > 0 else None for name, value in arguments.items()}}
+
+        try:
+            self._reply(200, {'result': simulator.call(url.path.strip('/').replace('/', '.'), arguments)})
+        except RequestError as error:
+            self._reply(error.code, {'error': {'code': error.code, 'message': error.message}})
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _serveWebSocket(self, simulator):
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', WebSocketConnection.acceptKey(self.headers.get('Sec-WebSocket-Key', '')))
+        self.end_headers()
+        self.wfile.flush()
+
+        connection = WebSocketConnection(self, simulator)
+        simulator._addConnection(connection)
+        try:
+            connection.serve()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            simulator._removeConnection(connection)
+            self.close_connection = True
+
+class Simulator:
+    """ Local Moonraker stand-in with a simulated Klipper host behind it. It
+        serves the HTTP API and the WebSocket JSON-RPC API on the same port,
+        like Moonraker. Every request is delayed by latency plus a uniformly
+        distributed jitter in seconds, and fails with a server error at
+        errorRate. Subscribed WebSocket clients get status notifications
+        every notifyInterval seconds and after each G-code script. """
+
+    def __init__(self, printerConfig=DEFAULT_PRINTER_CFG, *, latency=0.0, jitter=0.0, errorRate=0.0, notifyInterval=0.25,
+                 address='127.0.0.1', port=0, seed=None, **kwargs):
+        self.klipper = Klipper(printerConfig, seed=seed, **kwargs)
+        self.klipper.responseListeners.append(self._gcodeResponse)
+        self.klipper.restartListeners.append(self._klippyStateChanged)
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.notifyInterval = notifyInterval
+        self.address = address
+        self.port = port
+        self.random = random.Random(seed)
+
+        self.requestCounts = collections.Counter() # method: count
+        self.server = None
+        self.threads = []
+        self.stopEvent = threading.Event()
+        self.connections = set()
+        self.connectionsLock = threading.Lock()
+
+        self.methods = {'printer.info': self._printerInfo,
+                        'server.info': self._serverInfo,
+                        'server.connection.identify': self._identify,
+                        'printer.objects.list': self._listObjects,
+                        'printer.objects.query': self._queryObjects,
+                        'printer.objects.subscribe': self._subscribeObjects,
+                        'printer.gcode.script': self._runScript,
+                        'printer.restart': self._restart,
+                        'printer.firmware_restart': self._restart}
+
+    @property
+    def host(self):
+        """ The host to connect to, as host:port. """
+        return None if self.server is None else f'{self.address}:{self.server.server_address[1]}'
+
+    def start(self):
+        self.server = http.server.ThreadingHTTPServer((self.address, self.port), RequestHandler)
+        self.server.daemon_threads = True
+        self.server.simulator = self
+
+        self.stopEvent.clear()
+        self.threads = [threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, name='Moonraker server', daemon=True),
+                        threading.Thread(target=self._notifyLoop, name='Moonraker notifier', daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+        return self.host
+
+    def stop(self):
+        if self.server is None:
+            return
+
+        self.stopEvent.set()
+        self.server.shutdown()
+
+        # Unblock the WebSocket connections waiting for messages
+        with self.connectionsLock:
+            for connection in self.connections:
+                try:
+                    connection.handler.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+        self.server.server_close()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+        self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def call(self, method, params, connection=None):
+        """ Runs an API method and returns its result, raises RequestError on
+            failure. """
+
+        self.requestCounts[method] += 1
+
+        delay = self.latency + (self.random.uniform(0.0, self.jitter) if self.jitter > 0 else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        if self.errorRate > 0 and self.random.random() < self.errorRate:
+            raise RequestError(500, 'Simulated server error')
+
+        function = self.methods.get(method)
+        if function is None:
+            raise RequestError(404, 'Not Found')
+        if not isinstance(params, dict):
+            raise RequestError(400, 'Invalid parameters')
+        return function(params, connection)
+
+    # Connections
+    def _addConnection(self, connection):
+        with self.connectionsLock:
+            self.connections.add(connection)
+
+    def _removeConnection(self, connection):
+        with self.connectionsLock:
+            self.connections.discard(connection)
+
+    def _broadcast(self, method, params=None):
+        with self.connectionsLock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.notify(method, params)
+
+    def _notifyLoop(self):
+        while not self.stopEvent.wait(self.notifyInterval):
+            with self.connectionsLock:
+                connections = list(self.connections)
+            for connection in connections:
+                connection.notifyStatus()
+
+    def _gcodeResponse(self, message):
+        self._broadcast('notify_gcode_response', [message])
+
+    def _klippyStateChanged(self, state):
+        self._broadcast(f'notify_klippy_{state}')
+
+    # Methods
+    def _printerInfo(self, params, connection):
+        return {'state': 'ready',
+                'state_message': 'Printer is ready',
+                'hostname': 'simulator',
+                'software_version': 'simulator',
+                'config_file': 'printer.cfg'}
+
+    def _serverInfo(self, params, connection):
+        return {'klippy_connected': True,
+                'klippy_state': 'ready',
+                'api_version': [1, 4, 0],
+                'moonraker_version': 'simulator'}
+
+    def _identify(self, params, connection):
+        return {'connection_id': id(connection)}
+
+    def _listObjects(self, params, connection):
+        return {'objects': list(self.klipper.status())}
+
+    def _objects(self, params):
+        objects = params.get('objects')
+        if not isinstance(objects, dict):
+            raise RequestError(400, 'No objects requested')
+        return objects
+
+    def _queryObjects(self, params, connection):
+        return self.klipper.query(self._objects(params))
+
+    def _subscribeObjects(self, params, connection):
+        if connection is None:
+            raise RequestError(400, 'Subscriptions need a WebSocket connection')
+        return connection.subscribe(self._objects(params))
+
+    def _runScript(self, params, connection):
+        script = params.get('script')
+        if not isinstance(script, str):
+            raise RequestError(400, 'No script given')
+
+        try:
+            self.klipper.runScript(script)
+        except KlipperError as error:
+            raise RequestError(400, str(error))
+        return 'ok'
+
+    def _restart(self, params, connection):
+        self.klipper.runScript('RESTART')
+        return 'ok'
+
+if __name__ == '__main__':
+    # Main only imports
+    from Common import Tracer
+    from Printers.Moonraker.MoonrakerPrinter import MoonrakerPrinter
+    from PySide6 import QtCore
+    import argparse
+    import pathlib
+    import sys
+
+    parser = argparse.ArgumentParser(description='Local Moonraker stand-in with a simulated Klipper host')
+    parser.add_argument('--config', type=argparse.FileType('r'), default=None, help='printer.cfg to use instead of the built-in one')
+    parser.add_argument('--port', type=int, default=7125, help='port to serve on, 0 for any (default: %(default)s)')
+    parser.add_argument('--benchmark', action='store_true', help='run init, mesh and probe-all through MoonrakerPrinter and print the timings')
+    parser.add_argument('--time-scale', type=float, default=0.0, help='wall clock seconds per simulated second (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.005, help='request latency in seconds (default: %(default)s)')
+    parser.add_argument('--jitter', type=float, default=0.002, help='maximum extra request latency in seconds (default: %(default)s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail (default: %(default)s)')
+    parser.add_argument('--noise', type=float, default=0.002, help='probe noise standard deviation in mm (default: %(default)s)')
+    parser.add_argument('--websocket', action='store_true', help='benchmark: use the WebSocket API instead of HTTP')
+    parser.add_argument('--samples', type=int, default=None, help='benchmark: samples per probed point (default: from printer.cfg)')
+    parser.add_argument('--trace', type=pathlib.Path, default=None, help='benchmark: write a Chrome trace of the run to this file')
+    args = parser.parse_args()
+    Tracer.configure(file=args.trace)
+
+    simulator = Simulator(DEFAULT_PRINTER_CFG if args.config is None else args.config.read(),
+                          port=0 if args.benchmark else args.port,
+                          latency=args.latency,
+                          jitter=args.jitter,
+                          errorRate=args.error_rate,
+                          timeScale=args.time_scale,
+                          noise=args.noise)
+    host = simulator.start()
+
+    if not args.benchmark:
+        print(f'Serving a simulated Moonraker on {host}, press Ctrl+C to stop.')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        simulator.stop()
+        sys.exit()
+
+    app = QtCore.QCoreApplication(sys.argv)
+    printer = MoonrakerPrinter(None, host=host, websocket=args.websocket)
+
+    def run(name, start, signal):
+        """ Starts a request and waits for its result. """
+
+        loop = QtCore.QEventLoop()
+        replies = []
+        def finished(*reply):
+            replies.append(reply)
+            loop.quit()
+        def failed(type_, id_, context, message):
+            replies.append(message)
+            loop.quit()
+
+        signal.connect(finished)
+        printer.errorOccurred.connect(failed)
+        startTime = time.perf_counter()
+        start()
+        loop.exec()
+        elapsed = time.perf_counter() - startTime
+        signal.disconnect(finished)
+        printer.errorOccurred.disconnect(failed)
+
+        if isinstance(replies[0], str):
+            sys.exit(f'Error: {name} failed: {replies[0]}')
+        return elapsed, replies[0]
+
+    try:
+        printer.open()
+        initTime, _ = run('init', lambda: printer.init('init'), printer.inited)
+        meshTime, (_, _, mesh) = run('mesh', lambda: printer.getMeshCoordinates('mesh'), printer.gotMeshCoordinates)
+
+        points = [point for row in mesh.meshCoordinates for point in row]
+        if args.samples is not None:
+            printer.setProbeSampleCount(args.samples)
+        probeTime, (_, _, results) = run('probe-all', lambda: printer.probeMany('probeAll', points=points), printer.probedMany)
+        error = max(abs(result.z - simulator.klipper._probeHeight(result.x, result.y)) for result in results)
+    finally:
+        printer.close()
+        simulator.stop()
+
+    print(f'init:      {initTime * 1000:9.1f} ms')
+    print(f'mesh:      {meshTime * 1000:9.1f} ms ({mesh.rowCount}x{mesh.columnCount})')
+    print(f'probe-all: {probeTime * 1000:9.1f} ms ({len(points)} points, {len(points) / probeTime:.1f} points/s, max error {error:.4f} mm)')
+    print(f'requests:  ' + ', '.join(f'{method} {count}' for method, count in simulator.requestCounts.most_common()))
@@ -0,0 +1,52 @@
+from Printers.Moonraker.ConfigCache import ConfigCache
+from dataclasses import dataclass
+import pytest
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    script: str
+    expected: bool
+
+testPoints = [
+    TestPoint(script = 'RESTART',                 expected = True),
+    TestPoint(script = 'firmware_restart',        expected = True),
+    TestPoint(script = 'G28\nSAVE_CONFIG',        expected = True),
+    TestPoint(script = 'G28',                     expected = False),
+    TestPoint(script = 'PROBE SAMPLES=3',         expected = False),
+    TestPoint(script = 'BED_MESH_PROFILE SAVE=x', expected = False),
+    TestPoint(script = '',                        expected = False),
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_isRestartCommand(testPoint):
+    assert(ConfigCache.isRestartCommand(testPoint.script) == testPoint.expected)
+
+def test_section():
+    parseCount = 0
+    def parse(config):
+        nonlocal parseCount
+        parseCount += 1
+        return config['probe']['samples']
+
+    cache = ConfigCache()
+    assert(not cache.valid())
+
+    config = {'probe': {'samples': '3'}}
+    cache.update(config)
+    assert(cache.valid())
+    assert(cache.section('samples', parse) == '3')
+    assert(cache.section('samples', parse) == '3')
+    assert(parseCount == 1)
+
+    # Updating with the same snapshot keeps parsed sections
+    cache.update(config)
+    cache.section('samples', parse)
+    assert(parseCount == 1)
+
+    cache.update({'probe': {'samples': '5'}})
+    assert(cache.section('samples', parse) == '5')
+    assert(parseCount == 2)
+
+    cache.invalidate()
+    assert(not cache.valid())
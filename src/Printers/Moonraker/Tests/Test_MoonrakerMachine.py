@@ -0,0 +1,125 @@
+from Printers.Moonraker.ConfigCache import ConfigCache
+from Printers.Moonraker.MoonrakerPrinter import MoonrakerMachine
+from Printers.Moonraker.MoonrakerPrinter import MoveMachine
+from Printers.Moonraker.MoonrakerPrinter import ProbeMeshMachine
+from Printers.Moonraker.Transport import Request
+from Printers.Moonraker.Transport import Transport
+from dataclasses import dataclass
+import pytest
+
+class FakeTransport(Transport):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def queryObjects(self, *objects, cached=False):
+        request = Request(None, f'query {",".join(objects)}')
+        self.requests.append(request)
+        return request
+
+    def runGCode(self, script):
+        request = Request(None, script)
+        self.requests.append(request)
+        return request
+
+Step = MoonrakerMachine.ScriptStep
+probeSteps = [Step('G0 Z15.0', 'Raise failed.'),
+              Step('M400', 'Wait failed.'),
+              Step('G0 X10 Y20 F6000', 'Move failed.'),
+              Step('M400', 'Wait failed.'),
+              Step('PROBE SAMPLES=2', 'Probe failed.')]
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    message: str
+    expectedStep: int
+
+testPoints = [
+    TestPoint(message = 'Unknown command:"PROBE"',                         expectedStep = 4),
+    TestPoint(message = 'Unable to parse move \'G0 X10 Y20 F6000\'',        expectedStep = 2),
+    TestPoint(message = 'Probe triggered prior to movement',               expectedStep = 4),
+    TestPoint(message = 'Move out of range: 10.000 20.000 15.000 [0.000]', expectedStep = None),
+    TestPoint(message = 'G0 failed',                                       expectedStep = None),
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_failedScriptStep(testPoint):
+    step = MoonrakerMachine._failedScriptStep(probeSteps, testPoint.message)
+    expected = None if testPoint.expectedStep is None else probeSteps[testPoint.expectedStep]
+    assert(step == expected)
+
+def createMoveMachine(transport, wait):
+    machine = MoveMachine(transport, ConfigCache(), 'id', {}, 1, 2, 3, None, None, wait, False)
+    errors = []
+    moved = []
+    machine.errorOccurred.connect(lambda machine, message: errors.append(message))
+    machine.moved.connect(lambda id_, context: moved.append(id_))
+    machine.start()
+    return machine, errors, moved
+
+def test_moveScript(qapp):
+    transport = FakeTransport()
+    machine, errors, moved = createMoveMachine(transport, wait=True)
+
+    # The whole move is sent as a single script
+    assert([request.description for request in transport.requests] == ['G90\nG0 X1 Y2 Z3\nM400'])
+
+    transport.requests[0]._finish(result='ok')
+    assert(errors == [])
+    assert(moved == ['id'])
+
+def test_moveScriptError(qapp):
+    transport = FakeTransport()
+    machine, errors, moved = createMoveMachine(transport, wait=False)
+
+    transport.requests[0]._finish(error='Unable to parse move \'G0 X1 Y2 Z3\'')
+    assert(errors == ['Move failed while moving. Unable to parse move \'G0 X1 Y2 Z3\''])
+    assert(moved == [])
+
+bedMesh = {'profile_name': 'default',
+           'mesh_min': [10.0, 20.0],
+           'mesh_max': [200.0, 210.0],
+           'probed_matrix': [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]}
+
+def createProbeMeshMachine(transport):
+    machine = ProbeMeshMachine(transport, ConfigCache(), 'id', {})
+    errors = []
+    results = []
+    machine.errorOccurred.connect(lambda machine, message: errors.append(message))
+    machine.probedMesh.connect(lambda id_, context, result: results.append(result))
+    machine.start()
+    return machine, errors, results
+
+def test_probeMesh(qapp):
+    transport = FakeTransport()
+    machine, errors, results = createProbeMeshMachine(transport)
+
+    transport.requests[-1]._finish(result={'status': {'bed_mesh': {'profile_name': 'default'}}})
+    transport.requests[-1]._finish(result='ok')
+    transport.requests[-1]._finish(result={'status': {'bed_mesh': bedMesh | {'profile_name': ProbeMeshMachine.TEMPORARY_PROFILE}}})
+    transport.requests[-1]._finish(result='ok')
+
+    assert([request.description for request in transport.requests] == ['query bed_mesh',
+                                                                        'BED_MESH_CALIBRATE PROFILE=bedleveler5000_temporary',
+                                                                        'query bed_mesh',
+                                                                        'BED_MESH_PROFILE LOAD=default\nBED_MESH_PROFILE REMOVE=bedleveler5000_temporary'])
+    assert(errors == [])
+    assert(len(results) == 1)
+    assert(results[0].rowCount == 2 and results[0].columnCount == 3)
+    assert((results[0].minX, results[0].maxX, results[0].minY, results[0].maxY) == (10.0, 200.0, 20.0, 210.0))
+    assert(results[0].z == bedMesh['probed_matrix'])
+
+def test_probeMeshRestoresAfterError(qapp):
+    transport = FakeTransport()
+    machine, errors, results = createProbeMeshMachine(transport)
+
+    # Without a loaded profile the probed mesh is cleared
+    transport.requests[-1]._finish(result={'status': {'bed_mesh': {'profile_name': ''}}})
+    transport.requests[-1]._finish(error='Probe triggered prior to movement')
+    assert(errors == [])
+
+    transport.requests[-1]._finish(result='ok')
+    assert(transport.requests[-1].description == 'BED_MESH_CLEAR\nBED_MESH_PROFILE REMOVE=bedleveler5000_temporary')
+    assert(errors == ['Mesh probing failed while calibrating. Probe triggered prior to movement'])
+    assert(results == [])
@@ -0,0 +1,142 @@
+from Common.Metrics import metrics
+from Common.Points import Point2F
+from Printers.Moonraker.MoonrakerLinePrinter import MoonrakerLinePrinter
+from Printers.Moonraker.MoonrakerPrinter import MoonrakerPrinter
+from Printers.Moonraker.MoonrakerSimulator import Klipper
+from Printers.Moonraker.MoonrakerSimulator import KlipperError
+from Printers.Moonraker.MoonrakerSimulator import Simulator
+from Printers.Moonraker.MoonrakerSimulator import parseConfig
+from Printers.Moonraker.Transport import WebSocketTransport
+from dataclasses import dataclass
+import json
+import pytest
+
+@dataclass(frozen=True)
+class ConfigTestPoint:
+    __test__ = False
+    text: str
+    expected: dict
+
+configTestPoints = [
+    ConfigTestPoint(text = '[bltouch]\nx_offset: -40\ny_offset = -10 # comment\n; comment\n\n[Bed_Mesh]\nmesh_min: 10, 10',
+                    expected = {'bltouch': {'x_offset': '-40', 'y_offset': '-10'}, 'bed_mesh': {'mesh_min': '10, 10'}}),
+    ConfigTestPoint(text = '[gcode_macro START]\ngcode:\n  G28\n  G90\n[probe]',
+                    expected = {'gcode_macro start': {'gcode': '\nG28\nG90'}, 'probe': {}}),
+    ]
+
+@pytest.mark.parametrize('configTestPoint', configTestPoints)
+def test_parseConfig(configTestPoint):
+    assert(parseConfig(configTestPoint.text) == configTestPoint.expected)
+
+@pytest.mark.parametrize('text', ['x_offset: 1', '[probe]\nx_offset'])
+def test_parseConfigInvalid(text):
+    with pytest.raises(ValueError):
+        parseConfig(text)
+
+@dataclass(frozen=True)
+class ScriptTestPoint:
+    __test__ = False
+    script: str
+    expectedError: str
+
+scriptTestPoints = [
+    ScriptTestPoint(script = 'G0 X10',                    expectedError = 'Must home axis first: 10.000 117.500 124.000 [0.000]'),
+    ScriptTestPoint(script = 'G28\nG0 X300',              expectedError = 'Move out of range: 300.000 127.500 10.000 [0.000]'),
+    ScriptTestPoint(script = 'G28\nG0 Z1\nPROBE',         expectedError = 'Probe triggered prior to movement'),
+    ScriptTestPoint(script = 'G28\nBED_MESH_PROFILE LOAD=x', expectedError = 'bed_mesh: Unknown profile [x]'),
+    ScriptTestPoint(script = 'G28\nFOO',                  expectedError = 'Unknown command:"FOO"'),
+    ScriptTestPoint(script = 'G28\nQUERY_PROBE',          expectedError = 'Probe failure'),
+    ScriptTestPoint(script = 'G28\nG0 Z15\nPROBE\nG0 Z15\nPROBE SAMPLES=3\nM400', expectedError = None),
+    ]
+
+@pytest.mark.parametrize('scriptTestPoint', scriptTestPoints)
+def test_runScript(scriptTestPoint):
+    klipper = Klipper(timeScale=0, scriptErrors={'query_probe': 'Probe failure'})
+    responses = []
+    klipper.responseListeners.append(responses.append)
+
+    if scriptTestPoint.expectedError is None:
+        klipper.runScript(scriptTestPoint.script)
+        assert(klipper.lastZResult == pytest.approx(klipper._probeHeight(157.5 - 40, 127.5 - 10)))
+        assert(responses[-1].startswith('Result is z='))
+    else:
+        with pytest.raises(KlipperError) as exception:
+            klipper.runScript(scriptTestPoint.script)
+        assert(str(exception.value) == scriptTestPoint.expectedError)
+
+@pytest.mark.parametrize('websocket', [False, True])
+def test_endToEnd(qtbot, websocket):
+    simulator = Simulator(timeScale=0, seed=1)
+    printer = MoonrakerPrinter(None, host=simulator.start(), websocket=websocket)
+    errors = []
+    printer.errorOccurred.connect(lambda type_, id_, context, message: errors.append(message))
+
+    try:
+        printer.open()
+        with qtbot.waitSignal(printer.inited, timeout=5000):
+            printer.init('init')
+
+        with qtbot.waitSignal(printer.gotMeshCoordinates, timeout=5000) as blocker:
+            printer.getMeshCoordinates('mesh')
+        mesh = blocker.args[2]
+        assert((mesh.minX, mesh.maxX, mesh.minY, mesh.maxY, mesh.rowCount, mesh.columnCount) == (10, 190, 10, 220, 5, 5))
+
+        points = [mesh.meshCoordinates[0][0], mesh.meshCoordinates[4][4], Point2F(100, 100)]
+        with qtbot.waitSignal(printer.probedMany, timeout=5000) as blocker:
+            printer.probeMany('probeAll', points=points)
+        results = blocker.args[2]
+    finally:
+        printer.close()
+        simulator.stop()
+
+    assert(errors == [])
+    assert(all(result.z == pytest.approx(simulator.klipper._probeHeight(result.x, result.y)) for result in results))
+    assert(simulator.requestCounts['printer.objects.subscribe'] == int(websocket))
+    assert(metrics.histogram('moonraker_machine_seconds', machine='InitMachine', outcome='ok').count > 0)
+
+def test_injectedErrors(qtbot):
+    simulator = Simulator(timeScale=0, errorRate=1.0)
+    printer = MoonrakerPrinter(None, host=simulator.start())
+
+    try:
+        printer.open()
+        with qtbot.waitSignal(printer.errorOccurred, timeout=5000) as blocker:
+            printer.init('init')
+    finally:
+        printer.close()
+        simulator.stop()
+
+    assert('Simulated server error' in blocker.args[3])
+
+def test_linePrinter(qtbot):
+    simulator = Simulator(timeScale=0)
+    printer = MoonrakerLinePrinter(None, host=simulator.start())
+
+    try:
+        printer.open()
+        with qtbot.waitSignal(printer.received, timeout=5000) as blocker:
+            printer.sendCommand('G28')
+    finally:
+        printer.close()
+        simulator.stop()
+
+    assert(json.loads(blocker.args[0]) == {'result': 'ok'})
+    assert(simulator.klipper.homedAxes == 'xyz')
+
+def test_webSocketNotifications(qtbot):
+    simulator = Simulator(timeScale=0, notifyInterval=60)
+    transport = WebSocketTransport()
+    restarts = []
+    transport.klippyRestarted.connect(lambda: restarts.append(True))
+
+    try:
+        transport.open(simulator.start())
+        request = transport.runGCode('M140 S60')
+        qtbot.waitUntil(lambda: transport.status.get('heater_bed', {}).get('target') == 60.0, timeout=5000)
+        assert(request.result == 'ok')
+
+        transport.runGCode('FIRMWARE_RESTART')
+        qtbot.waitUntil(lambda: len(restarts) == 2, timeout=5000)
+    finally:
+        transport.close()
+        simulator.stop()
\ No newline at end of file
@@ -0,0 +1,136 @@
+from Printers.Moonraker.Transport import WebSocketTransport
+from PySide6 import QtNetwork
+from PySide6 import QtWebSockets
+from dataclasses import dataclass
+import json
+import pytest
+
+class FakeTransport(WebSocketTransport):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sentMessages = []
+        self.isOpen = False
+
+    def isConnected(self):
+        return self.isOpen
+
+    def _sendText(self, message):
+        self.sentMessages.append(json.loads(message))
+
+    def establish(self, host='printer'):
+        self.host = host
+        self.isOpen = True
+        self._connected()
+
+    def reply(self, message, **kwargs):
+        self._processMessage(json.dumps({'jsonrpc': '2.0', 'id': message['id']} | kwargs))
+
+    def notify(self, status):
+        self._processMessage(json.dumps({'jsonrpc': '2.0', 'method': 'notify_status_update', 'params': [status, 1.0]}))
+
+@dataclass(frozen=True)
+class TestPoint:
+    __test__ = False
+    reply: dict
+    expectedResult: object
+    expectedError: str
+
+testPoints = [
+    TestPoint(reply = {'result': 'ok'},                                    expectedResult = 'ok', expectedError = None),
+    TestPoint(reply = {'error': {'code': 400, 'message': 'Unknown command'}}, expectedResult = None, expectedError = 'Unknown command'),
+    ]
+
+@pytest.mark.parametrize('testPoint', testPoints)
+def test_call(qapp, testPoint):
+    transport = FakeTransport()
+    transport.establish()
+
+    request = transport.runGCode('G28')
+    finished = []
+    request.finished.connect(finished.append)
+
+    message = transport.sentMessages[-1]
+    assert(message['method'] == 'printer.gcode.script')
+    assert(message['params'] == {'script': 'G28'})
+
+    transport.reply(message, **testPoint.reply)
+    assert(finished == [request])
+    assert(request.result == testPoint.expectedResult)
+    assert(request.error == testPoint.expectedError)
+
+def test_queuedUntilConnected(qapp):
+    transport = FakeTransport()
+    transport.host = 'printer'
+
+    transport.runGCode('G28')
+    transport.queryObjects('configfile')
+    assert(transport.sentMessages == [])
+
+    transport.establish()
+    assert([message['method'] for message in transport.sentMessages] == ['printer.gcode.script', 'printer.objects.query'])
+
+def test_statusUpdates(qapp):
+    transport = FakeTransport()
+    transport.establish()
+
+    transport.notify({'heater_bed': {'temperature': 25.0, 'target': 0.0}})
+    transport.notify({'heater_bed': {'temperature': 26.5}})
+    assert(transport.status == {'heater_bed': {'temperature': 26.5, 'target': 0.0}})
+
+def test_cachedQuery(qapp):
+    transport = FakeTransport()
+    transport.establish()
+    transport.notify({'heater_bed': {'temperature': 25.0}, 'extruder': {'temperature': 30.0}})
+
+    # Only unknown objects are queried from the printer
+    transport.queryObjects('heater_bed', 'probe', cached=True)
+    assert(len(transport.sentMessages) == 1)
+
+    request = transport.queryObjects('heater_bed', 'extruder', cached=True)
+    assert(len(transport.sentMessages) == 1)
+
+    qapp.processEvents()
+    assert(request.result == {'status': {'heater_bed': {'temperature': 25.0}, 'extruder': {'temperature': 30.0}}})
+
+def test_abort(qapp):
+    transport = FakeTransport()
+    transport.establish()
+
+    request = transport.runGCode('G28')
+    finished = []
+    request.finished.connect(finished.append)
+    request.abort()
+
+    transport.reply(transport.sentMessages[-1], result='ok')
+    assert(finished == [])
+
+def test_server(qapp, qtbot):
+    server = QtWebSockets.QWebSocketServer('Moonraker', QtWebSockets.QWebSocketServer.NonSecureMode)
+    assert(server.listen(QtNetwork.QHostAddress.LocalHost, 0))
+
+    received = []
+    def processMessage(socket, text):
+        message = json.loads(text)
+        received.append(message['method'])
+        if message['method'] == 'printer.objects.subscribe':
+            result = {'eventtime': 1.0, 'status': {'extruder': {'temperature': 210.0}}}
+        else:
+            result = 'ok'
+        socket.sendTextMessage(json.dumps({'jsonrpc': '2.0', 'id': message['id'], 'result': result}))
+
+    def newConnection():
+        socket = server.nextPendingConnection()
+        socket.textMessageReceived.connect(lambda text: processMessage(socket, text))
+    server.newConnection.connect(newConnection)
+
+    transport = WebSocketTransport()
+    transport.open(f'127.0.0.1:{server.serverPort()}')
+    request = transport.runGCode('G28')
+
+    qtbot.waitUntil(lambda: request.result is not None)
+    assert(request.result == 'ok')
+    assert(received == ['printer.objects.subscribe', 'printer.gcode.script'])
+    assert(transport.status == {'extruder': {'temperature': 210.0}})
+
+    transport.close()
+    server.close()
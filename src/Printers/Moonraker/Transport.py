@@ -0,0 +1,294 @@
+from PySide6 import QtCore
+from PySide6 import QtNetwork
+from PySide6 import QtWebSockets
+from Common.Log import getLogger
+from Common.Metrics import metrics
+from Common import Tracer
+import functools
+import json
+import time
+import urllib.parse
+
+class Request(QtCore.QObject):
+    """ A single request to Moonraker. Once finished either result holds the
+        'result' member of the reply or error holds an error message. """
+
+    finished = QtCore.Signal(QtCore.QObject) # request
+
+    def __init__(self, transport, description, method=None, parent=None):
+        super().__init__(parent)
+
+        self.transport = transport
+        self.description = description
+        self.method = description.split(' ', 1)[0] if method is None else method # Metrics label
+        self.result = None
+        self.error = None
+        self.createdTime = time.perf_counter()
+
+    def abort(self):
+        if self.transport is not None:
+            self.transport._abortRequest(self)
+
+    def _finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+
+        transport = 'cache' if self.transport is None else type(self.transport).__name__
+        metrics.increment('moonraker_requests', transport=transport, method=self.method)
+        if error is not None:
+            metrics.increment('moonraker_request_errors', transport=transport, method=self.method)
+        finishedTime = time.perf_counter()
+        metrics.observe('moonraker_request_seconds', finishedTime - self.createdTime, transport=transport, method=self.method)
+        if (tracer := Tracer.defaultTracer()) is not None:
+            tracer.span(self.method, 'request', self.createdTime, finishedTime, id_=id(self),
+                        transport=transport, description=self.description, error=error)
+
+        self.finished.emit(self)
+
+class Transport(QtCore.QObject):
+    """ Base class for the connections used to talk to Moonraker. """
+
+    statusUpdated = QtCore.Signal(dict) # changed printer object status
+    klippyRestarted = QtCore.Signal()
+    errorOccurred = QtCore.Signal(str) # message
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        # Get logger
+        self.logger = getLogger(self)
+
+        self.host = None
+        self.status = {} # Last known status of subscribed printer objects
+
+    def open(self, host):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def queryObjects(self, *objects, cached=False):
+        """ Queries all fields of the given printer objects. If cached is set
+            and all objects are subscribed, the last known status is returned
+            without a round trip to the printer. """
+        raise NotImplementedError
+
+    def runGCode(self, script):
+        raise NotImplementedError
+
+    def completedRequest(self, description, result=None, error=None):
+        """ Returns a request that finishes with the given result once control
+            returns to the event loop, without contacting the printer. """
+
+        request = Request(None, description)
+        QtCore.QTimer.singleShot(0, request, lambda: request._finish(result=result, error=error))
+        return request
+
+    def _abortRequest(self, request):
+        raise NotImplementedError
+
+class HttpTransport(Transport):
+    """ Sends every request as a separate HTTP GET. """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.networkAccessManager = QtNetwork.QNetworkAccessManager(self)
+        self.replies = {} # request: reply
+
+    def open(self, host):
+        self.host = host
+
+    def close(self):
+        for request in list(self.replies):
+            self._abortRequest(request)
+
+    def queryObjects(self, *objects, cached=False):
+        return self.get('/printer/objects/query?' + '&'.join(objects))
+
+    def runGCode(self, script):
+        return self.get(f'/printer/gcode/script?script={urllib.parse.quote(script)}')
+
+    def get(self, endpoint):
+        command = f'http://{self.host}{endpoint}'
+        self.logger.debug('Sending get: %s', command)
+
+        request = Request(self, command, endpoint.split('?')[0])
+        reply = self.networkAccessManager.get(QtNetwork.QNetworkRequest(command))
+        reply.finished.connect(functools.partial(self._processReply, request))
+        self.replies[request] = reply
+        return request
+
+    def _abortRequest(self, request):
+        reply = self.replies.pop(request, None)
+        if reply is not None:
+            reply.finished.disconnect()
+            reply.abort()
+            reply.deleteLater()
+
+    def _processReply(self, request):
+        reply = self.replies.pop(request)
+        replyBuffer = reply.readAll()
+        errorStatus = reply.error()
+        reply.deleteLater()
+
+        self.logger.debug('Received: %s', replyBuffer)
+        try:
+            replyJson = json.loads(str(replyBuffer, 'utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            replyJson = None
+
+        # Check for protocol error
+        if isinstance(replyJson, dict) and isinstance(replyJson.get('error'), dict) and 'message' in replyJson['error']:
+            request._finish(error=replyJson['error']['message'])
+
+        # Handle REST errors
+        elif errorStatus != QtNetwork.QNetworkReply.NoError:
+            request._finish(error=f'Rest error occured ({errorStatus}).')
+
+        elif not isinstance(replyJson, dict) or 'result' not in replyJson:
+            request._finish(error=f'Invalid reply received for {request.description}.')
+
+        else:
+            request._finish(result=replyJson['result'])
+
+class WebSocketTransport(Transport):
+    """ Sends JSON-RPC requests over a single persistent WebSocket and keeps
+        the status of the subscribed printer objects up to date from the
+        status notifications pushed by Moonraker. Requests made while the
+        connection is being established are sent once it is up. """
+
+    SUBSCRIBED_OBJECTS = ['heater_bed', 'extruder', 'probe', 'gcode_move']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.webSocket = QtWebSockets.QWebSocket(parent=self)
+        self.webSocket.connected.connect(self._connected)
+        self.webSocket.disconnected.connect(self._disconnected)
+        self.webSocket.errorOccurred.connect(self._socketErrorOccurred)
+        self.webSocket.textMessageReceived.connect(self._processMessage)
+
+        self.nextId = 1
+        self.pending = {} # id: request
+        self.unsent = [] # Messages waiting for the connection
+
+    def open(self, host):
+        self.host = host
+        self.status = {}
+
+        # Subscribe before any other request is sent
+        subscription = self.call('printer.objects.subscribe', {'objects': {name: None for name in self.SUBSCRIBED_OBJECTS}})
+        subscription.finished.connect(self._subscribed)
+
+        self.webSocket.open(QtCore.QUrl(f'ws://{host}/websocket'))
+
+    def close(self):
+        self.host = None
+        self.webSocket.close()
+        self._failPending('Connection closed.')
+
+    def isConnected(self):
+        return self.webSocket.state() == QtNetwork.QAbstractSocket.ConnectedState
+
+    def queryObjects(self, *objects, cached=False):
+        if cached and all(name in self.status for name in objects):
+            status = {name: dict(self.status[name]) for name in objects}
+            return self.completedRequest(f'printer.objects.query {list(objects)} (cached)', {'status': status})
+
+        return self.call('printer.objects.query', {'objects': {name: None for name in objects}})
+
+    def runGCode(self, script):
+        return self.call('printer.gcode.script', {'script': script})
+
+    def call(self, method, params=None):
+        request = self._createRequest(method, params)
+
+        message = {'jsonrpc': '2.0', 'method': method, 'id': request.id_}
+        if params is not None:
+            message['params'] = params
+        message = json.dumps(message)
+
+        if self.isConnected():
+            self._sendText(message)
+        elif self.host is not None: # Opening
+            self.unsent.append(message)
+        else:
+            QtCore.QTimer.singleShot(0, functools.partial(self._finishRequest, request.id_, None, 'Not connected.'))
+
+        return request
+
+    def _createRequest(self, method, params):
+        request = Request(self, method if params is None else f'{method} {json.dumps(params)}', method)
+        request.id_ = self.nextId
+        self.nextId += 1
+        self.pending[request.id_] = request
+        return request
+
+    def _sendText(self, message):
+        self.logger.debug('Sending: %s', message)
+        self.webSocket.sendTextMessage(message)
+
+    def _abortRequest(self, request):
+        # The reply is still received, but ignored
+        self.pending.pop(request.id_, None)
+
+    def _finishRequest(self, id_, result, error):
+        request = self.pending.pop(id_, None)
+        if request is not None:
+            request._finish(result=result, error=error)
+
+    def _failPending(self, message):
+        self.unsent.clear()
+        for id_ in list(self.pending):
+            self._finishRequest(id_, None, message)
+
+    def _connected(self):
+        unsent = self.unsent
+        self.unsent = []
+        for message in unsent:
+            self._sendText(message)
+
+    def _disconnected(self):
+        self.host = None
+        self._failPending('Connection closed.')
+
+    def _socketErrorOccurred(self, error):
+        message = f'WebSocket error occurred ({self.webSocket.errorString()}).'
+        self.logger.error(message)
+        self.host = None
+        self._failPending(message)
+        self.errorOccurred.emit(message)
+
+    def _subscribed(self, request):
+        if request.error is None and isinstance(request.result, dict):
+            self._updateStatus(request.result.get('status', {}))
+
+    def _updateStatus(self, status):
+        for name, fields in status.items():
+            self.status.setdefault(name, {}).update(fields)
+        self.statusUpdated.emit(status)
+
+    def _processMessage(self, text):
+        self.logger.debug('Received: %s', text)
+
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            self.logger.warning(f'Ignoring invalid message: {text}')
+            return
+
+        if not isinstance(message, dict):
+            self.logger.warning(f'Ignoring invalid message: {text}')
+        elif 'id' in message:
+            error = message.get('error')
+            if error is not None:
+                self._finishRequest(message['id'], None, error.get('message', str(error)) if isinstance(error, dict) else str(error))
+            else:
+                self._finishRequest(message['id'], message.get('result'), None)
+        elif message.get('method') == 'notify_status_update':
+            params = message.get('params')
+            if isinstance(params, list) and len(params) > 0 and isinstance(params[0], dict):
+                self._updateStatus(params[0])
+        elif message.get('method') in ['notify_klippy_ready', 'notify_klippy_disconnected']:
+            self.klippyRestarted.emit()
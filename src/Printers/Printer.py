@@ -1,7 +1,7 @@
 from Common.LoggedFunction import loggedFunction
+from Common.Log import getLogger
 from PySide6 import QtCore
 import abc
-import logging
 
 class Printer(QtCore.QObject):
     __metaclass__ = abc.ABCMeta
@@ -10,7 +10,7 @@ class Printer(QtCore.QObject):
         super().__init__(parent)
 
         # Create logger
-        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger = getLogger(self)
 
     def connected(self, *args, **kwargs):
         return self._connected(*args, **kwargs)
@@ -82,7 +82,26 @@ class MeshWidget(QtWidgets.QWidget):
         self.mesh3DWidget.setPoint(row, column, z)
 
         self.mesh[row][column] = z
+        self.__updateStatistics()
 
+    def setMesh(self, mesh):
+        """ Sets every point at once, mesh is indexed by [row][column] and
+            None values are left empty. """
+
+        assert(len(mesh) == self.rowCount())
+        assert(all(len(values) == self.columnCount() for values in mesh))
+
+        for row, values in enumerate(mesh):
+            for column, z in enumerate(values):
+                if z is None:
+                    continue
+                self.meshNumberWidget.setPoint(row, column, z)
+                self.mesh3DWidget.setPoint(row, column, z)
+
+        self.mesh = [list(values) for values in mesh]
+        self.__updateStatistics()
+
+    def __updateStatistics(self):
         # Find min/max values
         minValue = None
         maxValue = None
@@ -94,6 +113,10 @@ class MeshWidget(QtWidgets.QWidget):
 
                 minValue = meshZ if minValue is None else min(minValue, meshZ)
                 maxValue = meshZ if maxValue is None else max(maxValue, meshZ)
+
+        if minValue is None:
+            return
+
         self.minLineEdit.setText(f'{minValue:.3f}')
         self.maxLineEdit.setText(f'{maxValue:.3f}')
         self.rangeLineEdit.setText(f'{maxValue - minValue:.3f}')
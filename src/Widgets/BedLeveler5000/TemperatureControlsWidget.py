@@ -67,6 +67,22 @@ class TemperatureControlsWidget(QtWidgets.QWidget):
         self.nozzleHeaterOffButton.setChecked(True)
         self.bedHeaterOffButton.setChecked(True)
 
+    def setBedTemperature(self, temp):
+        """ Shows the bed heater as on at temp without requesting a change. """
+        self._setHeater(self.bedTempSpinBox, self.bedHeaterOnButton, temp)
+
+    def setNozzleTemperature(self, temp):
+        """ Shows the nozzle heater as on at temp without requesting a change. """
+        self._setHeater(self.nozzleTempSpinBox, self.nozzleHeaterOnButton, temp)
+
+    def _setHeater(self, spinBox, onButton, temp):
+        for widget in [spinBox, onButton]:
+            widget.blockSignals(True)
+        spinBox.setValue(temp)
+        onButton.setChecked(True)
+        for widget in [spinBox, onButton]:
+            widget.blockSignals(False)
+
     def _requestBedHeaterChange(self):
         self.bedHeaterChanged.emit(self.bedHeaterOnButton.isChecked(),
                                    self.bedTempSpinBox.value())
@@ -254,6 +254,10 @@ class PrinterConnectWidget(QtWidgets.QWidget):
         index = self.printerComboBox.currentIndex() if index is None else index
         return self.printerComboBox.itemData(index).printerInfo
 
+    def printerPath(self, index=None):
+        index = self.printerComboBox.currentIndex() if index is None else index
+        return self.printerComboBox.itemData(index).path
+
     def connectionMode(self, index=None):
         return self.printerInfo(index).connectionMode
 